@@ -0,0 +1,210 @@
+# backtest.py
+#
+# Прогон исторических цен через ту же проверку условий, что и в
+# check_price_changes (evaluate_tick, format_notification, окна, индикаторы,
+# ценовые уровни из БД с --users-from), без Telegram и сети. Уведомления
+# только считаются: по пользователям, по часам и по тикам - чтобы оценить
+# нагрузку на лимиты Telegram перед волатильным днем и подобрать пороги по
+# умолчанию.
+#
+#   python backtest.py prices.csv --users-from users.db
+#   python backtest.py prices.csv --users 1000 --thresholds 0.5,1,2,3
+#   python backtest.py prices.csv --convert prices.bin      # CSV -> двоичный формат
+#
+# CSV: заголовок timestamp,symbol,price[,quote]; timestamp - unix-время или ISO 8601.
+# Двоичный формат: заголовок BIN_MAGIC и записи BIN_RECORD (время, символ, котировка, цена).
+
+import argparse
+import asyncio
+import csv
+import os
+import statistics
+import struct
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Бэктест уведомлений на исторических ценах")
+    parser.add_argument("prices", help="файл цен: .csv или двоичный (.bin)")
+    parser.add_argument("--convert", metavar="OUT", help="только сконвертировать CSV в двоичный формат")
+    parser.add_argument("--tick", type=int, default=180, help="длина тика, с (как в check_price_changes)")
+    parser.add_argument("--users-from", metavar="DB", help="взять пользователей и настройки из БД бота")
+    parser.add_argument("--users", type=int, default=1000, help="синтетические пользователи (без --users-from)")
+    parser.add_argument("--symbols", help="валюты синтетических пользователей через запятую (по умолчанию все из файла)")
+    parser.add_argument("--format", default="classic", help="формат уведомлений синтетических пользователей")
+    parser.add_argument("--window", type=int, default=0, help="окно синтетических пользователей, мин (0 - выкл.)")
+    parser.add_argument("--indicators", default="off", help="сигналы индикаторов синтетических пользователей")
+    parser.add_argument("--thresholds", help="прогнать для каждого порога через запятую (%%) вместо порогов пользователей")
+    return parser
+
+
+ARGS = build_parser().parse_args()
+
+# Конфигурация читается при импорте модулей бота - задаем ее до импортов
+if ARGS.users_from:
+    os.environ["DATABASE_PATH"] = ARGS.users_from
+os.environ.update({"STATE_BACKEND": "memory", "LOG_FILE": ""})
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TELEGRAM_TOKEN", "123456789:BACKTEST-token-aaaaaaaaaaaaaaaaaaaaa")
+os.environ.setdefault("CRYPTO_API_KEY", "backtest")
+os.environ.setdefault("ADMIN_ID", "1")
+
+from services import notifications  # noqa: E402
+from services.fanout import MAX_MESSAGES_PER_SECOND  # noqa: E402
+from services.price_levels import load_price_levels, price_levels  # noqa: E402
+from utils.currency import DEFAULT_QUOTE  # noqa: E402
+
+BIN_MAGIC = b"CWTPRICES1\n"
+BIN_RECORD = struct.Struct("<d8s4sd")
+
+
+def _parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+def load_prices(path):
+    """Записи (ts, symbol, quote, price) из CSV или двоичного файла"""
+    with open(path, "rb") as f:
+        head = f.read(len(BIN_MAGIC))
+        if head == BIN_MAGIC:
+            return [
+                (ts, symbol.rstrip(b"\0").decode(), quote.rstrip(b"\0").decode(), price)
+                for ts, symbol, quote, price in BIN_RECORD.iter_unpack(f.read())
+            ]
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            (_parse_time(row["timestamp"]), row["symbol"].upper(),
+             (row.get("quote") or DEFAULT_QUOTE).upper(), float(row["price"]))
+            for row in csv.DictReader(f)
+        ]
+
+def save_binary(records, path):
+    with open(path, "wb") as f:
+        f.write(BIN_MAGIC)
+        for ts, symbol, quote, price in records:
+            f.write(BIN_RECORD.pack(ts, symbol.encode(), quote.encode(), price))
+
+def build_ticks(records, tick_seconds):
+    """Снимки цен по тикам: [(ts, {(symbol, quote): price})], в тике - последняя цена пары"""
+    ticks = {}
+    for ts, symbol, quote, price in sorted(records):
+        ticks.setdefault(ts - ts % tick_seconds, {})[(symbol, quote)] = price
+    return sorted(ticks.items())
+
+def synthetic_users(count, symbols, args):
+    """Пользователи в формате load_user_tracking с одинаковыми настройками"""
+    return {
+        user_id: {
+            'username': f"user{user_id}", 'interval': 5, 'threshold': 1.0, 'format': args.format,
+            'window': args.window, 'window_threshold': 3.0, 'indicators': args.indicators,
+            'quote': DEFAULT_QUOTE, 'symbols': [(symbol, None) for symbol in symbols],
+        }
+        for user_id in range(1, count + 1)
+    }
+
+
+class RecordingBot:
+    """Вместо Telegram: уведомления считаются по пользователям, часам и тикам"""
+
+    def __init__(self):
+        self.now = 0
+        self.per_user = Counter()
+        self.per_hour = Counter()
+        self.per_tick = Counter()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.per_user[chat_id] += 1
+        self.per_hour[int(self.now // 3600)] += 1
+        self.per_tick[self.now] += 1
+
+
+async def replay(ticks, base_users, threshold=None):
+    """Прогнать тики через evaluate_tick, вернуть (бот со счетчиками, проверено записей, секунды)"""
+    notifications.reset_tick_state()
+    if ARGS.users_from:
+        # Уровни - заново на каждый прогон: сработавшие извлекаются из индекса
+        load_price_levels()
+    users = {
+        user_id: {**data, 'threshold': threshold if threshold is not None else data['threshold'],
+                  'symbols': list(data['symbols'])}
+        for user_id, data in base_users.items()
+    }
+    last_prices = {}
+
+    def save_prices(updates):
+        for price, user_id, symbol, _ in updates:
+            last_prices[(user_id, symbol)] = price
+
+    bot = RecordingBot()
+    rows = 0
+    started = time.perf_counter()
+    for ts, prices in ticks:
+        bot.now = ts
+        # Срабатывание уровней не записывается в БД бота: уровни считаются активными
+        await notifications.evaluate_tick(bot, prices, ts, users, save_prices=save_prices,
+                                          mark_triggered=lambda alert_ids: alert_ids)
+        # Как перечитывание tracking из БД перед следующим тиком
+        for user_id, data in users.items():
+            data['symbols'] = [(symbol, last_prices.get((user_id, symbol), last)) for symbol, last in data['symbols']]
+            rows += len(data['symbols'])
+    return bot, rows, time.perf_counter() - started
+
+
+def report(title, bot, users, ticks, rows, elapsed, tick_seconds):
+    days = max((ticks[-1][0] - ticks[0][0] + tick_seconds) / 86400, 1e-9)
+    total = sum(bot.per_tick.values())
+    per_user = [bot.per_user.get(user_id, 0) / days for user_id in users]
+    print(f"\n{title}: уведомлений {total} за {days:.2f} сут.")
+    print(f"  на пользователя в сутки: в среднем {statistics.mean(per_user):.2f}, "
+          f"медиана {statistics.median(per_user):.2f}, max {max(per_user):.2f}")
+    if total:
+        peak_hour, peak_count = bot.per_hour.most_common(1)[0]
+        peak_at = datetime.fromtimestamp(peak_hour * 3600, timezone.utc).strftime("%Y-%m-%d %H:00 UTC")
+        hours = max(days * 24, 1)
+        burst = max(bot.per_tick.values())
+        print(f"  в час: в среднем {total / hours:.1f}, пик {peak_count} ({peak_at})")
+        print(f"  пик за тик: {burst} - отправка займет не меньше {burst / MAX_MESSAGES_PER_SECOND:.1f} с "
+              f"при {MAX_MESSAGES_PER_SECOND} сообщ./с (тик {tick_seconds} с)")
+    print(f"  скорость: {len(ticks)} тиков, {rows} записей за {elapsed:.2f} с "
+          f"({len(ticks) / elapsed:.0f} тиков/с, {rows / elapsed:.0f} записей/с)")
+
+
+def main():
+    records = load_prices(ARGS.prices)
+    if ARGS.convert:
+        save_binary(records, ARGS.convert)
+        print(f"Записано {len(records)} цен в {ARGS.convert}")
+        return
+    if not records:
+        sys.exit("В файле нет цен")
+
+    ticks = build_ticks(records, ARGS.tick)
+    if ARGS.users_from:
+        users = notifications.load_user_tracking()
+    else:
+        symbols = ARGS.symbols.upper().split(",") if ARGS.symbols else sorted({symbol for _, symbol, _, _ in records})
+        users = synthetic_users(ARGS.users, symbols, ARGS)
+    print(f"Цен: {len(records)}, тиков: {len(ticks)}, пользователей: {len(users)}")
+    if ARGS.users_from:
+        load_price_levels()
+        print(f"Ценовых уровней: {len(price_levels)} (их срабатывания входят в отчет)")
+    else:
+        print("Ценовые уровни есть только в БД (--users-from): в отчете их срабатываний нет")
+
+    thresholds = [float(value) for value in ARGS.thresholds.split(",")] if ARGS.thresholds else [None]
+    for threshold in thresholds:
+        bot, rows, elapsed = asyncio.run(replay(ticks, users, threshold))
+        title = f"Порог {threshold}%" if threshold is not None else "Пороги пользователей"
+        report(title, bot, users, ticks, rows, elapsed, ARGS.tick)
+
+
+if __name__ == "__main__":
+    main()
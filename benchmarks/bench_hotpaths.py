@@ -0,0 +1,193 @@
+# benchmarks/bench_hotpaths.py
+#
+# Микробенчмарки горячих путей: запросы database.py на таблицах разного
+# размера, форматирование уведомлений, проверка условий за тик (evaluate_tick)
+# и сборка клавиатур keyboards/main.py. Результаты сохраняются в JSON, чтобы
+# сравнивать релизы:
+#
+#   python benchmarks/bench_hotpaths.py --output bench-new.json --compare bench-old.json
+#
+# В сравнении отмечаются замеры, ставшие медленнее на --tolerance (по умолчанию 10%).
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-")
+# Конфигурация читается при импорте модулей бота - задаем ее до импортов
+os.environ.update({"DATABASE_PATH": os.path.join(WORKDIR, "users.db"), "STATE_BACKEND": "memory", "LOG_FILE": ""})
+os.environ.setdefault("TELEGRAM_TOKEN", "123456789:BENCH-token-aaaaaaaaaaaaaaaaaaaaaaaa")
+os.environ.setdefault("CRYPTO_API_KEY", "bench")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import database  # noqa: E402
+from keyboards import main as keyboards  # noqa: E402
+from services.notifications import evaluate_tick, format_notification, load_user_tracking  # noqa: E402
+
+FIRST_USER_ID = 1_000_000
+SYMBOLS = ("BTC", "ETH", "BNB", "SOL", "XRP")
+START_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "BNB": 550.0, "SOL": 150.0, "XRP": 0.5}
+FORMATS = ("classic", "compact", "detailed")
+# Аргументы клавиатур, которым они нужны
+KEYBOARD_ARGS = {
+    "invoice_keyboard": ("https://t.me/CryptoBot?start=IVbench",),
+    "price_alerts_keyboard": ([(i, "BTC", 60000.0 + i * 1000, "above", "USD") for i in range(10)],),
+    "subscription_periods_keyboard": ({"day": 1.0, "week": 5.0, "month": 15.0},),
+}
+
+
+class NullBot:
+    """Бот без сети: evaluate_tick отправляет уведомления, замер их не учитывает"""
+
+    async def send_message(self, **kwargs):
+        return None
+
+
+def measure(name, func, number, repeat=5):
+    """Лучшее из repeat время одного вызова func (усреднено по number вызовам)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<48} {best * 1e6:12.2f} мкс")
+    return {"seconds": best, "number": number, "repeat": repeat}
+
+
+def seed(path, users, symbols_per_user=3):
+    """Отдельная БД на размер таблицы: пользователи с подпиской и отслеживаниями"""
+    database.DATABASE_PATH = path
+    database.init_db()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO users (user_id, username, subscribed, subscription_end) VALUES (?, ?, 1, '2099-01-01 00:00:00')",
+        ((FIRST_USER_ID + i, f"user{i}") for i in range(users))
+    )
+    conn.executemany(
+        "INSERT INTO tracking (user_id, symbol, initial_price, last_price) VALUES (?, ?, ?, ?)",
+        ((FIRST_USER_ID + i, symbol, START_PRICES[symbol], START_PRICES[symbol])
+         for i in range(users) for symbol in SYMBOLS[:symbols_per_user])
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench_database(size, results):
+    seed(os.path.join(WORKDIR, f"users-{size}.db"), size)
+    user_id = FIRST_USER_ID + size // 2
+    # Полная выборка растет с таблицей - меньше повторов на больших размерах
+    results[f"db.get_users_with_settings[{size}]"] = measure(
+        f"get_users_with_settings ({size} польз.)", database.get_users_with_settings, max(1, 2000 // size))
+    results[f"db.set_tracking[{size}]"] = measure(
+        f"set_tracking ({size} польз.)", lambda: database.set_tracking(user_id, "BTC", 60123.0), 200)
+    results[f"db.is_subscribed[{size}]"] = measure(
+        f"is_subscribed ({size} польз.)", lambda: database.is_subscribed(user_id), 500)
+    results[f"db.get_tracking[{size}]"] = measure(
+        f"get_tracking ({size} польз.)", lambda: database.get_tracking(user_id), 500)
+
+
+def bench_evaluate(size, results):
+    """Один тик проверки условий без сети: цены сдвинуты на 0.1% (ниже порога - без отправок)"""
+    database.DATABASE_PATH = os.path.join(WORKDIR, f"users-{size}.db")
+    user_tracking = load_user_tracking()
+    prices = {(symbol, "USD"): price * 1.001 for symbol, price in START_PRICES.items()}
+    bot = NullBot()
+    loop = asyncio.new_event_loop()
+    try:
+        results[f"evaluate_tick[{size}]"] = measure(
+            f"evaluate_tick ({size} польз.)",
+            lambda: loop.run_until_complete(evaluate_tick(bot, prices, time.time(), user_tracking)),
+            max(1, 1000 // size), repeat=3
+        )
+    finally:
+        loop.close()
+
+
+def bench_formatting(results):
+    for format_type in FORMATS:
+        results[f"format_notification[{format_type}]"] = measure(
+            f"format_notification ({format_type})",
+            lambda: format_notification("BTC", 60000.0, 61234.5, 2.06, format_type, quote="EUR"), 20000)
+
+
+def bench_keyboards(results):
+    for name, builder in inspect.getmembers(keyboards, inspect.isfunction):
+        if builder.__module__ != keyboards.__name__ or not name.endswith("_keyboard"):
+            continue
+        args = KEYBOARD_ARGS.get(name, ())
+        results[f"keyboard.{name}"] = measure(f"keyboards.{name}", lambda: builder(*args), 2000)
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Сравнить с сохраненным прогоном, вернуть число замеров, ставших медленнее"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nСравнение с {baseline_path} (коммит {baseline['meta'].get('commit')}):")
+    regressions = 0
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  <-- медленнее"
+            regressions += 1
+        print(f"{name:<48} {ratio:6.2f}x{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей")
+    parser.add_argument("--sizes", default="100,1000,10000", help="размеры таблицы пользователей через запятую")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(value) for value in args.sizes.split(",")):
+        bench_database(size, results)
+        bench_evaluate(size, results)
+    bench_formatting(results)
+    bench_keyboards(results)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": metadata(), "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {args.output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
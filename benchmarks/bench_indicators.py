@@ -0,0 +1,89 @@
+# benchmarks/bench_indicators.py
+#
+# Микробенчмарк потоковых индикаторов: сверяет результат с наивным расчетом
+# и измеряет стоимость обновления на одну цену.
+# Запуск: python benchmarks/bench_indicators.py
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.indicators import EMA, RollingStats, SymbolIndicators  # noqa: E402
+
+
+def random_walk(n, start=60000.0, seed=42):
+    rnd = random.Random(seed)
+    price = start
+    prices = []
+    for _ in range(n):
+        price *= 1 + rnd.gauss(0, 0.003)
+        prices.append(price)
+    return prices
+
+
+def check_rolling_stats(prices, window=30):
+    """Скользящий Welford совпадает с statistics.stdev по тому же окну"""
+    stats = RollingStats(window)
+    for i, price in enumerate(prices):
+        stats.push(price)
+        if i >= window and i % 97 == 0:
+            expected = statistics.stdev(prices[i - window + 1:i + 1])
+            assert abs(stats.std - expected) <= 1e-6 * expected, (i, stats.std, expected)
+
+
+def check_ema(prices, period=20):
+    ema = EMA(period)
+    alpha = 2 / (period + 1)
+    expected = prices[0]
+    for price in prices:
+        ema.update(price)
+    for price in prices[1:]:
+        expected += alpha * (price - expected)
+    assert abs(ema.value - expected) <= 1e-6 * expected
+
+
+def bench(name, func, prices, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(prices)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<28} {best / len(prices) * 1e9:8.0f} нс/цена ({len(prices)} цен)")
+    return best
+
+
+def run_ema(prices):
+    ema = EMA(20)
+    for price in prices:
+        ema.update(price)
+
+
+def run_rolling(prices):
+    stats = RollingStats(30)
+    for price in prices:
+        stats.push(price)
+
+
+def run_symbol(prices):
+    indicators = SymbolIndicators()
+    for price in prices:
+        indicators.update(price)
+
+
+def main():
+    prices = random_walk(200_000)
+    check_rolling_stats(prices[:20_000])
+    check_ema(prices[:20_000])
+    print("Проверка корректности: OK")
+    bench("EMA.update", run_ema, prices)
+    bench("RollingStats.push", run_rolling, prices)
+    bench("SymbolIndicators.update", run_symbol, prices)
+
+
+if __name__ == "__main__":
+    main()
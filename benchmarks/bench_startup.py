@@ -0,0 +1,165 @@
+# benchmarks/bench_startup.py
+#
+# Время холодного старта бота:
+#   1. импорт bot.py по `python -X importtime` - суммарно, модули проекта и
+#      самые долгие модули (с учетом вложенных импортов);
+#   2. время от запуска процесса `python bot.py` до первого запроса getUpdates
+#      к заглушке Bot API (tools/fake_bot_api.py), цены - от tools/fake_price_api.py.
+#
+#   python benchmarks/bench_startup.py --runs 5 --output startup.json
+#
+# Первый прогон стартует без снимка кэшей, следующие - со снимком, который
+# записал предыдущий процесс при остановке (services/snapshot.py).
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="startup-")
+# Окружение процесса бота; заглушки - в этом процессе
+BOT_ENV = {
+    "TELEGRAM_TOKEN": "123456789:STARTUP-token-aaaaaaaaaaaaaaaaaaaaaa",
+    "CRYPTO_API_KEY": "startup",
+    "ADMIN_ID": "1",
+    "DATABASE_PATH": os.path.join(WORKDIR, "users.db"),
+    "SNAPSHOT_PATH": os.path.join(WORKDIR, "warm_start.snap"),
+    "STATE_BACKEND": "memory",
+    "LOG_FILE": "",
+    "LOG_LEVEL": "WARNING",
+}
+# Модули проекта в выводе -X importtime
+PROJECT_PACKAGES = ("bot", "config", "database", "handlers", "keyboards", "middlewares", "services", "utils")
+
+os.environ.update({key: value for key, value in BOT_ENV.items() if key not in ("DATABASE_PATH", "SNAPSHOT_PATH")})
+
+from aiohttp import web  # noqa: E402
+
+from tools.fake_bot_api import BotApiStub, create_app as create_bot_app  # noqa: E402
+from tools.fake_price_api import PricePaths, create_app as create_price_app  # noqa: E402
+
+
+def parse_importtime(stderr):
+    """Строки -X importtime: [(модуль, собственное время, с вложенными), мкс]"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def bench_imports(module, top):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH"))))}
+    # Первый запуск прогревает .pyc, замер - по второму
+    for _ in range(2):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=WORKDIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(f"Импорт {module} завершился ошибкой:\n{result.stderr[-2000:]}")
+    modules = parse_importtime(result.stderr)
+    total = next(cumulative for name, _, cumulative in modules if name == module)
+    project = [item for item in modules if item[0].split(".")[0] in PROJECT_PACKAGES]
+    slowest = sorted(modules, key=lambda item: item[2], reverse=True)[:top]
+
+    print(f"Импорт {module}: {total / 1000:.1f} мс, модули проекта (собственное время): "
+          f"{sum(self_us for _, self_us, _ in project) / 1000:.1f} мс")
+    for name, self_us, cumulative in slowest:
+        print(f"  {name:<48} {cumulative / 1000:9.1f} мс (собственное {self_us / 1000:.1f})")
+    return {
+        "total_ms": total / 1000,
+        "project_self_ms": sum(self_us for _, self_us, _ in project) / 1000,
+        "project": {name: cumulative / 1000 for name, _, cumulative in project},
+        "slowest": {name: cumulative / 1000 for name, _, cumulative in slowest},
+    }
+
+
+async def start_site(app, port):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+async def first_get_updates(stub, env, timeout):
+    """Секунды от запуска bot.py до первого getUpdates; процесс останавливается штатно (SIGINT)"""
+    stub.first_seen.clear()
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT, "bot.py"), cwd=WORKDIR, env=env)
+    try:
+        while "getUpdates" not in stub.first_seen:
+            if process.returncode is not None or time.perf_counter() - started > timeout:
+                raise RuntimeError(f"bot.py не дошел до getUpdates (код {process.returncode})")
+            await asyncio.sleep(0.005)
+        return stub.first_seen["getUpdates"] - started, {
+            method: round(seen - started, 4) for method, seen in sorted(stub.first_seen.items(), key=lambda item: item[1])
+        }
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            await asyncio.wait_for(process.wait(), timeout)
+
+async def bench_first_update(args):
+    stub = BotApiStub(verbose=False)
+    runners = [
+        await start_site(create_bot_app(stub), args.bot_port),
+        await start_site(create_price_app(PricePaths()), args.price_port),
+    ]
+    env = {
+        **os.environ, **BOT_ENV,
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{args.bot_port}",
+        "CRYPTOCOMPARE_API_URL": f"http://127.0.0.1:{args.price_port}/data",
+        "RUN_BACKGROUND_TASKS": "0" if args.no_background else "1",
+        "PYTHONPATH": os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH")))),
+    }
+    runs = []
+    try:
+        for run in range(args.runs):
+            seconds, timeline = await first_get_updates(stub, env, args.timeout)
+            runs.append(seconds)
+            print(f"Запуск {run + 1}: первый getUpdates через {seconds * 1000:.0f} мс, запросы: {timeline}")
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+    print(f"До первого getUpdates: медиана {statistics.median(runs) * 1000:.0f} мс, "
+          f"min {min(runs) * 1000:.0f} мс ({args.runs} запусков)")
+    return {"runs_ms": [round(value * 1000, 1) for value in runs],
+            "median_ms": round(statistics.median(runs) * 1000, 1), "min_ms": round(min(runs) * 1000, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта бота")
+    parser.add_argument("--runs", type=int, default=5, help="запусков bot.py до первого getUpdates")
+    parser.add_argument("--top", type=int, default=15, help="самых долгих импортов в отчете")
+    parser.add_argument("--module", default="bot", help="модуль для -X importtime")
+    parser.add_argument("--no-background", action="store_true", help="RUN_BACKGROUND_TASKS=0 (фоновые задачи в воркере)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--bot-port", type=int, default=18092)
+    parser.add_argument("--price-port", type=int, default=18093)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {"python": platform.python_version(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "background": not args.no_background},
+        "imports": bench_imports(args.module, args.top),
+    }
+    if args.runs:
+        results["first_get_updates"] = asyncio.run(bench_first_update(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
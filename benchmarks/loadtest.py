@@ -0,0 +1,257 @@
+# benchmarks/loadtest.py
+#
+# Нагрузочный тест без сети: заглушки Bot API (tools/fake_bot_api.py) и
+# CryptoCompare (tools/fake_price_api.py) поднимаются в этом же процессе,
+# временная БД заполняется пользователями и отслеживаниями, затем идут тики
+# проверки цен (process_tick - тело check_price_changes) и параллельно поток
+# нажатий кнопок через Dispatcher.
+#
+#   python benchmarks/loadtest.py --users 5000 --symbols 3 --ticks 5 --rps 50 --script spike
+#
+# Отчет: длительность тиков, скорость отправки, задержка обработки нажатий,
+# задержка event loop (насколько позже срабатывает таймер на 10 мс) и пиковая
+# память процесса. С --chaos внешние API деградируют по файлу отказов
+# (services/chaos.py), в отчет добавляются внесенные отказы:
+#
+#   python benchmarks/loadtest.py --users 2000 --chaos chaos.json
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест проверки цен и обработчиков")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--symbols", type=int, default=3, help="отслеживаемых валют на пользователя (1-5)")
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--rps", type=float, default=20, help="нажатий кнопок в секунду во время тиков (0 - без них)")
+    parser.add_argument("--script", choices=("random", "trend", "spike"), default="random")
+    parser.add_argument("--threshold", type=float, default=1.0, help="порог уведомления пользователей, %%")
+    parser.add_argument("--latency-ms", type=float, default=20, help="задержка заглушки Bot API")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля отправок с ответом 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--bot-port", type=int, default=18090)
+    parser.add_argument("--price-port", type=int, default=18091)
+    parser.add_argument("--chaos", metavar="JSON", help="файл отказов внешних API (CHAOS_CONFIG)")
+    return parser
+
+
+ARGS = build_parser().parse_args() if __name__ == "__main__" else build_parser().parse_args([])
+WORKDIR = tempfile.mkdtemp(prefix="loadtest-")
+
+# Конфигурация читается при импорте модулей бота - задаем ее до импортов
+os.environ.update({
+    "DATABASE_PATH": os.path.join(WORKDIR, "users.db"),
+    "TELEGRAM_API_URL": f"http://127.0.0.1:{ARGS.bot_port}",
+    "CRYPTOCOMPARE_API_URL": f"http://127.0.0.1:{ARGS.price_port}/data",
+    "STATE_BACKEND": "memory",
+    "LOG_FILE": "",
+})
+if ARGS.chaos:
+    os.environ["CHAOS_CONFIG"] = ARGS.chaos
+os.environ.setdefault("TELEGRAM_TOKEN", "123456789:LOADTEST-token-aaaaaaaaaaaaaaaaaaaaaa")
+os.environ.setdefault("CRYPTO_API_KEY", "loadtest")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from aiogram import Dispatcher  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from config import DATABASE_PATH  # noqa: E402
+from database import init_db  # noqa: E402
+from handlers import start, tracking, alerts, admin  # noqa: E402
+from services.http import close_session  # noqa: E402
+from services.notifications import process_tick  # noqa: E402
+from services.telegram import create_bot  # noqa: E402
+from tools.fake_bot_api import BotApiStub, BOT_USER, create_app as create_bot_app  # noqa: E402
+from tools.fake_price_api import PricePaths, START_PRICES, create_app as create_price_app  # noqa: E402
+from utils.metrics import CHAOS_FAULTS  # noqa: E402
+
+FIRST_USER_ID = 1_000_000
+CALLBACKS = ("my_tracking", "settings", "track_BTC", "profile")
+
+
+def seed(users, symbols_per_user, threshold):
+    """Пользователи с подпиской и отслеживаниями одной транзакцией (через init_db-схему)"""
+    init_db()
+    symbols = list(START_PRICES)[:max(1, min(symbols_per_user, len(START_PRICES)))]
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.executemany(
+        "INSERT INTO users (user_id, username, subscribed, price_threshold) VALUES (?, ?, 1, ?)",
+        ((FIRST_USER_ID + i, f"user{i}", threshold) for i in range(users))
+    )
+    conn.executemany(
+        "INSERT INTO tracking (user_id, symbol, initial_price, last_price) VALUES (?, ?, ?, ?)",
+        ((FIRST_USER_ID + i, symbol, START_PRICES[symbol], START_PRICES[symbol])
+         for i in range(users) for symbol in symbols)
+    )
+    conn.commit()
+    conn.close()
+    return users * len(symbols)
+
+
+def callback_update(update_id, user_id, data):
+    user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": "loadtest",
+            "data": data,
+            "message": {
+                "message_id": 1, "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER, "caption": "menu",
+            },
+        },
+    }
+
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    """Задержка event loop: насколько позже запланированного просыпается таймер"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - expected)
+
+
+async def drive_callbacks(bot, dp, rps, users, stop, latencies, errors):
+    """Поток нажатий кнопок с заданной частотой, каждое обновление - отдельная задача"""
+    rnd = random.Random(7)
+    tasks = set()
+    update_id = 1
+
+    async def handle(update):
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        latencies.append(time.perf_counter() - started)
+
+    while not stop.is_set():
+        user_id = FIRST_USER_ID + rnd.randrange(users)
+        update = Update.model_validate(callback_update(update_id, user_id, rnd.choice(CALLBACKS)), context={"bot": bot})
+        task = asyncio.create_task(handle(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        update_id += 1
+        await asyncio.sleep(1 / rps)
+    await asyncio.gather(*tasks)
+
+
+async def start_site(app, port):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def _percentiles(values, scale=1.0):
+    if not values:
+        return {"p50": 0, "p95": 0, "p99": 0, "max": 0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale
+    return {"p50": round(pick(0.5), 3), "p95": round(pick(0.95), 3), "p99": round(pick(0.99), 3),
+            "max": round(ordered[-1] * scale, 3)}
+
+
+async def run(args=ARGS):
+    """Прогнать тест и вернуть результаты (словарь)"""
+    stub = BotApiStub(args.latency_ms / 1000, args.rate_429, args.retry_after, verbose=False)
+    paths = PricePaths(args.script)
+    runners = [
+        await start_site(create_bot_app(stub), args.bot_port),
+        await start_site(create_price_app(paths), args.price_port),
+    ]
+    rows = seed(args.users, args.symbols, args.threshold)
+
+    bot = create_bot()
+    dp = Dispatcher()
+    dp.include_routers(start.router, tracking.router, alerts.router, admin.router)
+
+    stop = asyncio.Event()
+    lag, callback_latencies, errors, tick_durations, tick_errors = [], [], {}, [], {}
+    background = [asyncio.create_task(monitor_loop_lag(lag, stop))]
+    if args.rps > 0:
+        background.append(asyncio.create_task(
+            drive_callbacks(bot, dp, args.rps, args.users, stop, callback_latencies, errors)
+        ))
+
+    started = time.perf_counter()
+    try:
+        for _ in range(args.ticks):
+            tick_started = time.perf_counter()
+            try:
+                await process_tick(bot)
+            except Exception as e:
+                # Как в check_price_changes: ошибка тика не останавливает следующие
+                tick_errors[type(e).__name__] = tick_errors.get(type(e).__name__, 0) + 1
+            tick_durations.append(time.perf_counter() - tick_started)
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*background)
+        await bot.session.close()
+        await close_session()
+        for runner in runners:
+            await runner.cleanup()
+
+    sends = stub.calls.get("sendMessage", 0)
+    return {
+        "users": args.users,
+        "tracking_rows": rows,
+        "ticks": args.ticks,
+        "script": args.script,
+        "tick_seconds": {**_percentiles(tick_durations), "mean": round(statistics.mean(tick_durations), 3)},
+        "rows_per_second": round(rows * args.ticks / sum(tick_durations), 1),
+        "notifications_sent": sends,
+        "sends_per_second": round(sends / elapsed, 1),
+        "throttled_429": sum(stub.throttled.values()),
+        "bot_api_calls": dict(stub.calls),
+        "callbacks": len(callback_latencies),
+        "callback_errors": errors,
+        "callback_ms": _percentiles(callback_latencies, 1000),
+        "loop_lag_ms": _percentiles(lag, 1000),
+        "tick_errors": tick_errors,
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "chaos_faults": {f"{provider}.{fault}": count for (provider, fault), count in CHAOS_FAULTS.series().items()},
+    }
+
+
+def print_report(results):
+    print(f"Пользователей: {results['users']}, записей отслеживания: {results['tracking_rows']}, "
+          f"тиков: {results['ticks']} ({results['script']})")
+    tick = results["tick_seconds"]
+    print(f"Тик, с:            p50 {tick['p50']}  p95 {tick['p95']}  max {tick['max']}  "
+          f"({results['rows_per_second']} записей/с), ошибки: {results['tick_errors'] or 'нет'}")
+    print(f"Уведомления:       {results['notifications_sent']} ({results['sends_per_second']}/с), "
+          f"ответов 429: {results['throttled_429']}")
+    callbacks = results["callback_ms"]
+    print(f"Нажатия, мс:       {results['callbacks']} шт., p50 {callbacks['p50']}  p95 {callbacks['p95']}  "
+          f"max {callbacks['max']}, ошибки: {results['callback_errors'] or 'нет'}")
+    lag = results["loop_lag_ms"]
+    print(f"Задержка loop, мс: p50 {lag['p50']}  p99 {lag['p99']}  max {lag['max']}")
+    print(f"Вызовы Bot API:    {results['bot_api_calls']}")
+    print(f"Пиковая память:    {results['peak_rss_mb']} МБ")
+    if results["chaos_faults"]:
+        print(f"Внесенные отказы:  {results['chaos_faults']}")
+
+
+if __name__ == "__main__":
+    print_report(asyncio.run(run()))
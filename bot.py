@@ -1,14 +1,29 @@
 # bot.py
+#
+# Процесс обработки обновлений Telegram. Фоновые задачи запускаются здесь же
+# (RUN_BACKGROUND_TASKS=1, по умолчанию) или отдельным процессом: python worker.py
+#
+# Подсистемы, нужные не в каждой конфигурации (фоновые задачи, сервер метрик,
+# режим вебхука), импортируются при включении: до первого getUpdates
+# загружается только то, что понадобится. Время старта - benchmarks/bench_startup.py
 
 import asyncio
 import sys
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-from config import TELEGRAM_TOKEN
-from handlers import start, tracking, admin
+from aiogram import Dispatcher
+from config import (
+    BOT_MODE, UPDATE_CONCURRENCY_LIMIT, RUN_BACKGROUND_TASKS, WORKER_SOCKET_PATH,
+    BACKGROUND_SHUTDOWN_TIMEOUT, METRICS_PORT
+)
+from handlers import start, tracking, alerts, admin
 from database import init_db
-from services.notifications import check_price_changes
+from services import events
+from services.http import close_session
+from services.snapshot import load_snapshot, write_snapshot
+from services.supervisor import supervisor
+from services.storage import create_fsm_storage
+from services.telegram import create_bot
+from middlewares.concurrency import ConcurrencyLimitMiddleware
+from middlewares.tracing import setup_tracing
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -17,25 +32,55 @@ async def main():
     try:
         init_db()
         
-        # Добавляем параметры для бота
-        bot = Bot(
-            token=TELEGRAM_TOKEN,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-        )
+        bot = create_bot()
+        # Кэши с прошлого запуска (цены, подписки, file_id медиа) - до приема обновлений
+        try:
+            load_snapshot(bot.id)
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить снимок кэшей: {e}")
         
-        dp = Dispatcher()
-        dp.include_routers(start.router, tracking.router, admin.router)
+        # Состояния FSM в общем хранилище: следующий шаг диалога может попасть на другую реплику
+        dp = Dispatcher(storage=create_fsm_storage())
+        # Ограничение одновременно обрабатываемых обновлений
+        limiter = ConcurrencyLimitMiddleware(UPDATE_CONCURRENCY_LIMIT)
+        dp.update.outer_middleware(limiter)
+        # Время обработчиков (после лимита: ожидание очереди не входит в замер)
+        setup_tracing(dp)
+        # alerts подключается до admin: в admin есть обработчик любых чисел без фильтра состояния
+        dp.include_routers(start.router, tracking.router, alerts.router, admin.router)
 
-        # Запускаем фоновую задачу для проверки цен
-        logger.info("Запуск фоновой задачи проверки цен...")
-        asyncio.create_task(check_price_changes(bot))
+        if RUN_BACKGROUND_TASKS:
+            from services.background import start_background_tasks
+            await start_background_tasks(bot)
+        else:
+            # Фоновые задачи в отдельном процессе: изменения отправляются ему по сокету
+            client = events.connect(WORKER_SOCKET_PATH)
+            supervisor.on_shutdown(client.close)
+        if METRICS_PORT:
+            from services.monitoring import start_metrics_server
+            metrics_runner = await start_metrics_server()
+            supervisor.on_shutdown(metrics_runner.cleanup)
+        # После остановки задач: сохранить снимок кэшей, закрыть пул HTTP-соединений, затем сессию бота
+        supervisor.on_shutdown(lambda: write_snapshot(bot.id))
+        supervisor.on_shutdown(close_session)
+        supervisor.on_shutdown(bot.session.close)
         
-        logger.info("Бот запущен")
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            from services.telegram_webhook import run_webhook
+            logger.info("Бот запущен в режиме вебхука")
+            await run_webhook(bot, dp, limiter)
+        else:
+            logger.info("Бот запущен")
+            # Вебхук, оставшийся от режима webhook, мешает getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
         
     except Exception as e:
         logger.error(f"Критическая ошибка при запуске бота: {e}")
         sys.exit(1)
+    finally:
+        # Фоновые задачи завершают текущую итерацию (отправки, запись в БД)
+        await supervisor.shutdown(BACKGROUND_SHUTDOWN_TIMEOUT)
 
 if __name__ == "__main__":
     try:
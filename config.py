@@ -9,11 +9,114 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 CRYPTO_API_KEY = os.getenv("CRYPTO_API_KEY")
 CRYPTO_BOT_TOKEN = os.getenv("CRYPTO_BOT_TOKEN")  # Токен для CryptoBot API
 ADMIN_ID = int(os.getenv("ADMIN_ID", 0))
+# Файл SQLite, общий для процесса бота и воркера
+DATABASE_PATH = os.getenv("DATABASE_PATH", "users.db")
+
+# Логи: уровень, формат (text или json), файл с ротацией по размеру ("" - только stderr)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_FILE = os.getenv("LOG_FILE", "logs/bot.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 20 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+# Очередь записей к потоку логирования; при переполнении записи отбрасываются
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Не чаще одного сообщения в N секунд для однотипных строк горячего пути (проверка каждой записи за тик)
+LOG_SAMPLE_INTERVAL = int(os.getenv("LOG_SAMPLE_INTERVAL", 60))
+
+# Фоновые задачи (опрос цен, сводки, инвойсы) в процессе бота. 0 - они запускаются отдельно: python worker.py
+RUN_BACKGROUND_TASKS = os.getenv("RUN_BACKGROUND_TASKS", "1") == "1"
+# Unix-сокет, через который процесс бота сообщает воркеру об изменениях
+WORKER_SOCKET_PATH = os.getenv("WORKER_SOCKET_PATH", "worker.sock")
+# Количество процессов-шардов проверки цен (пользователи делятся по user_id % N). 1 - без шардов
+WORKER_SHARDS = int(os.getenv("WORKER_SHARDS", 1))
+# Выбор лидера: при нескольких репликах фоновые задачи (опрос цен, инвойсы, сводки)
+# выполняет только держатель аренды. Хранилище аренды: sqlite (общая БД) или memory (один процесс)
+LEADER_ELECTION = os.getenv("LEADER_ELECTION", "0") == "1"
+LEADER_BACKEND = os.getenv("LEADER_BACKEND", "sqlite")
+# Срок аренды в секундах, продление - каждую треть срока
+LEADER_LEASE_TTL = int(os.getenv("LEADER_LEASE_TTL", 30))
+# Шард, не подтвердивший тик за столько секунд, считается зависшим и перезапускается
+SHARD_TIMEOUT = int(os.getenv("SHARD_TIMEOUT", 600))
+
+# Режим получения обновлений: "polling" (по умолчанию) или "webhook" (несколько реплик за балансировщиком)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")  # публичный адрес, например https://bot.example.com
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+TELEGRAM_WEBHOOK_HOST = os.getenv("TELEGRAM_WEBHOOK_HOST", "0.0.0.0")
+TELEGRAM_WEBHOOK_PORT = int(os.getenv("TELEGRAM_WEBHOOK_PORT", 8080))
+# Сколько секунд при остановке ждать обновления в работе
+TELEGRAM_SHUTDOWN_TIMEOUT = int(os.getenv("TELEGRAM_SHUTDOWN_TIMEOUT", 30))
+# Максимум одновременно обрабатываемых обновлений (в обоих режимах)
+UPDATE_CONCURRENCY_LIMIT = int(os.getenv("UPDATE_CONCURRENCY_LIMIT", 40))
+# Общее состояние реплик (FSM и кэш цен): memory (одна реплика), sqlite или redis
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Сколько секунд обработчики используют цену из кэша вместо запроса к API
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", 120))
+# Сколько секунд проверенная в БД активная подписка используется без повторного запроса
+SUBSCRIBER_CACHE_TTL = int(os.getenv("SUBSCRIBER_CACHE_TTL", 300))
+# Снимок кэшей (цены, подписки, file_id медиа) для быстрого старта после перезапуска бота.
+# Пишется при штатной остановке, при старте старше SNAPSHOT_MAX_AGE секунд не загружается. Пусто - выключен
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "warm_start.snap")
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", 600))
+# Общий пул HTTP-соединений к внешним API: размер и таймаут запроса (секунды)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 100))
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", 30))
+# Таймаут запроса цены из обработчика (пользователь ждет ответа - меньше общего HTTP_TIMEOUT)
+PRICE_REQUEST_TIMEOUT = float(os.getenv("PRICE_REQUEST_TIMEOUT", 10))
+# Таймаут запроса к Bot API, секунды
+TELEGRAM_TIMEOUT = int(os.getenv("TELEGRAM_TIMEOUT", 60))
+# Сколько секунд при остановке фоновые задачи могут завершать текущую итерацию
+BACKGROUND_SHUTDOWN_TIMEOUT = int(os.getenv("BACKGROUND_SHUTDOWN_TIMEOUT", 30))
+# Адрес Bot API (для локального Bot API сервера или тестовой заглушки tools/fake_bot_api.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Адрес API CryptoCompare (для заглушки tools/fake_price_api.py при нагрузочном тесте)
+CRYPTOCOMPARE_API_URL = os.getenv("CRYPTOCOMPARE_API_URL", "https://min-api.cryptocompare.com/data")
+# Окно (в секундах), по которому распределяется отправка ежедневных сводок
+DIGEST_SEND_WINDOW = int(os.getenv("DIGEST_SEND_WINDOW", 600))
+# Пауза (в секундах) фоновой сверки инвойсов: на каждый пакет открытых счетов и без счетов
+INVOICE_RECONCILE_INTERVAL = int(os.getenv("INVOICE_RECONCILE_INTERVAL", 10))
+INVOICE_RECONCILE_IDLE_INTERVAL = int(os.getenv("INVOICE_RECONCILE_IDLE_INTERVAL", 60))
+# Неоплаченные инвойсы старше INVOICE_EXPIRY_HOURS отменяются раз в INVOICE_SWEEP_INTERVAL секунд,
+# закрытые инвойсы старше INVOICE_ARCHIVE_DAYS переносятся в архив
+INVOICE_EXPIRY_HOURS = int(os.getenv("INVOICE_EXPIRY_HOURS", 24))
+INVOICE_SWEEP_INTERVAL = int(os.getenv("INVOICE_SWEEP_INTERVAL", 3600))
+INVOICE_CANCEL_CONCURRENCY = int(os.getenv("INVOICE_CANCEL_CONCURRENCY", 5))
+INVOICE_ARCHIVE_DAYS = int(os.getenv("INVOICE_ARCHIVE_DAYS", 30))
+
+# Вебхук Crypto Pay (invoice_paid). Порт 0 - вебхук выключен
+CRYPTO_PAY_WEBHOOK_HOST = os.getenv("CRYPTO_PAY_WEBHOOK_HOST", "0.0.0.0")
+CRYPTO_PAY_WEBHOOK_PORT = int(os.getenv("CRYPTO_PAY_WEBHOOK_PORT", 0))
+CRYPTO_PAY_WEBHOOK_PATH = os.getenv("CRYPTO_PAY_WEBHOOK_PATH", "/crypto-pay/webhook")
+# При включенном вебхуке сверка через getInvoices остается только страховкой
+CRYPTO_PAY_WEBHOOK_FALLBACK_INTERVAL = int(os.getenv("CRYPTO_PAY_WEBHOOK_FALLBACK_INTERVAL", 300))
+
+# Метрики Prometheus (GET /metrics). Порт 0 - сервер метрик выключен
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Показатели из БД в /metrics пересчитываются не чаще раза в столько секунд
+METRICS_CACHE_TTL = int(os.getenv("METRICS_CACHE_TTL", 60))
+# Трассировка обработчиков: обновления дольше TRACE_SLOW_SECONDS попадают в /slow
+# и (если задан TRACE_FILE) в файл трасс с ротацией
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", 1.0))
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024))
+# Каталог результатов профилирования по командам администратора (/profile_ticks, /profile_updates)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# JSON-файл слоя отказов внешних API (services/chaos.py) для экспериментов. Пусто - выключен
+CHAOS_CONFIG = os.getenv("CHAOS_CONFIG", "")
 
 # Проверка обязательных переменных
 if not TELEGRAM_TOKEN:
     raise ValueError("TELEGRAM_TOKEN не найден в .env файле")
 if not CRYPTO_API_KEY:
     raise ValueError("CRYPTO_API_KEY не найден в .env файле")
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE должен быть polling или webhook")
+if STATE_BACKEND not in ("memory", "sqlite", "redis"):
+    raise ValueError("STATE_BACKEND должен быть memory, sqlite или redis")
+if LOG_FORMAT not in ("text", "json"):
+    raise ValueError("LOG_FORMAT должен быть text или json")
 if not ADMIN_ID:
     raise ValueError("ADMIN_ID не найден в .env файле")
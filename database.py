@@ -1,14 +1,54 @@
 # database.py
 
+import json
+import math
 import sqlite3
-from utils.logger import get_logger
+import sys
+import time
+from config import ADMIN_ID, DATABASE_PATH, LOG_SAMPLE_INTERVAL, SUBSCRIBER_CACHE_TTL
+from utils.logger import get_logger, LogSampler
+from utils.metrics import DB_QUERY_SECONDS
+from utils.tracing import add_span
 from datetime import datetime, timedelta
 
 logger = get_logger(__name__)
+# set_tracking вызывается для каждой записи в каждом тике - его строка пишется выборочно
+_tracking_log = LogSampler(LOG_SAMPLE_INTERVAL)
+# Активные подписки, уже проверенные в БД: user_id -> (окончание, время проверки), unix-время.
+# Изменения подписок в этом процессе сбрасывают запись сразу, в других процессах
+# (отзыв в другой реплике) - видны не позже чем через SUBSCRIBER_CACHE_TTL секунд
+_active_subscribers = {}
+
+class _TimedConnection(sqlite3.Connection):
+    """Соединение, которое при закрытии записывает время работы вызвавшей функции"""
+
+    def close(self):
+        super().close()
+        elapsed = time.perf_counter() - self.opened_at
+        DB_QUERY_SECONDS.observe(self.function, value=elapsed)
+        add_span("db", self.function, elapsed)
+
+def _connect(**kwargs):
+    """Соединение с БД (общей для процесса бота и воркера)"""
+    # timeout - ожидание блокировки записи другим процессом
+    conn = sqlite3.connect(DATABASE_PATH, timeout=30, factory=_TimedConnection, **kwargs)
+    # Метка метрики - функция database.py, открывшая соединение
+    conn.function = sys._getframe(1).f_code.co_name
+    conn.opened_at = time.perf_counter()
+    return conn
+
+def _add_column_if_missing(cur, table, column, definition):
+    """Добавить колонку в таблицу, если ее еще нет"""
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cur.fetchall()]:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"В таблицу {table} добавлена колонка {column}")
 
 def init_db():
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
+    # WAL: читатели не блокируют писателя, БД используют несколько процессов
+    cur.execute("PRAGMA journal_mode=WAL")
     cur.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY,
@@ -19,9 +59,22 @@ def init_db():
             notification_interval INTEGER DEFAULT 5,
             price_threshold REAL DEFAULT 1.0,
             notification_format TEXT DEFAULT 'classic',
+            window_minutes INTEGER DEFAULT 0,
+            window_threshold REAL DEFAULT 3.0,
+            indicator_alerts TEXT DEFAULT 'off',
+            digest_hour INTEGER, -- час ежедневной сводки (NULL - выключена)
+            digest_sent_on TEXT, -- дата последней отправленной сводки
+            quote_currency TEXT DEFAULT 'USD', -- валюта котировки цен
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Колонки, добавленные после первого релиза (для существующих БД)
+    _add_column_if_missing(cur, 'users', 'window_minutes', 'INTEGER DEFAULT 0')
+    _add_column_if_missing(cur, 'users', 'window_threshold', 'REAL DEFAULT 3.0')
+    _add_column_if_missing(cur, 'users', 'indicator_alerts', "TEXT DEFAULT 'off'")
+    _add_column_if_missing(cur, 'users', 'digest_hour', 'INTEGER')
+    _add_column_if_missing(cur, 'users', 'digest_sent_on', 'TEXT')
+    _add_column_if_missing(cur, 'users', 'quote_currency', "TEXT DEFAULT 'USD'")
     cur.execute('''
         CREATE TABLE IF NOT EXISTS tracking (
             id INTEGER PRIMARY KEY,
@@ -43,11 +96,80 @@ def init_db():
             hash TEXT UNIQUE,
             amount REAL,
             currency TEXT,
-            status TEXT DEFAULT 'active',
+            status TEXT DEFAULT 'active', -- 'active' -> 'paid' -> 'applied' / 'cancelled' / 'expired'
+            period TEXT, -- 'day', 'week', 'month'
+            period_days INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            applied_at TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (user_id)
         )
     ''')
+    _add_column_if_missing(cur, 'invoices', 'period', 'TEXT')
+    _add_column_if_missing(cur, 'invoices', 'period_days', 'INTEGER')
+    _add_column_if_missing(cur, 'invoices', 'applied_at', 'TIMESTAMP')
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_invoices_user_status ON invoices (user_id, status, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices (status, created_at)")
+    # Архив закрытых инвойсов: основная таблица содержит только недавние счета
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS invoices_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            invoice_id INTEGER UNIQUE,
+            hash TEXT,
+            amount REAL,
+            currency TEXT,
+            status TEXT,
+            period TEXT,
+            period_days INTEGER,
+            created_at TIMESTAMP,
+            applied_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Таблица ценовых уровней ("уведомить, когда BTC пересечет $70,000")
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS price_alerts (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            symbol TEXT,
+            target_price REAL,
+            quote TEXT DEFAULT 'USD', -- валюта котировки уровня
+            direction TEXT, -- 'above' / 'below'
+            status TEXT DEFAULT 'active', -- 'active' / 'triggered' / 'deleted'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            triggered_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    _add_column_if_missing(cur, 'price_alerts', 'quote', "TEXT DEFAULT 'USD'")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_price_alerts_user ON price_alerts (user_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_price_alerts_status ON price_alerts (status)")
+    # Аренды (лидерство среди реплик): держатель и время истечения (unix time)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    # Состояния FSM (общие для реплик при STATE_BACKEND=sqlite)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT
+        )
+    ''')
+    # Последние цены по парам (общий кэш при STATE_BACKEND=sqlite)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS price_cache (
+            symbol TEXT,
+            quote TEXT,
+            price REAL,
+            updated_at REAL, -- unix time
+            PRIMARY KEY (symbol, quote)
+        )
+    ''')
     # Таблица для хранения цен на подписку
     cur.execute('''
         CREATE TABLE IF NOT EXISTS subscription_prices (
@@ -74,7 +196,7 @@ def init_db():
 
 def add_user(user_id, username):
     """Добавить или обновить пользователя"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     # Проверяем, существует ли пользователь
     cur.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
@@ -93,7 +215,7 @@ def add_user(user_id, username):
 
 def set_subscription(user_id, status, period_days=30):
     """Установить статус подписки и дату окончания"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     if status == 1:
         # Устанавливаем дату окончания подписки
@@ -110,15 +232,19 @@ def set_subscription(user_id, status, period_days=30):
         )
     conn.commit()
     conn.close()
+    _active_subscribers.pop(user_id, None)
     logger.info(f"Подписка пользователя {user_id} изменена на {status} на {period_days} дней")
 
 def is_subscribed(user_id):
     """Проверить, есть ли активная подписка"""
-    from config import ADMIN_ID
     # Админ всегда имеет доступ
     if user_id == ADMIN_ID:
         return True
-    conn = sqlite3.connect('users.db')
+    now = time.time()
+    cached = _active_subscribers.get(user_id)
+    if cached and now < cached[0] and now - cached[1] < SUBSCRIBER_CACHE_TTL:
+        return True
+    conn = _connect()
     cur = conn.cursor()
     cur.execute(
         "SELECT subscribed, subscription_end FROM users WHERE user_id = ?", 
@@ -131,17 +257,32 @@ def is_subscribed(user_id):
         if row[1]:
             end_date = datetime.fromisoformat(row[1])
             if datetime.now() < end_date:
+                _active_subscribers[user_id] = (end_date.timestamp(), now)
                 return True
             else:
                 # Подписка истекла, сбрасываем статус
                 set_subscription(user_id, 0)
                 return False
+        # Подписка без даты окончания
+        _active_subscribers[user_id] = (math.inf, now)
         return True
+    _active_subscribers.pop(user_id, None)
     return False
 
+def get_active_subscribers():
+    """Проверенные активные подписки {user_id: (окончание, время проверки)} (для снимка)"""
+    return dict(_active_subscribers)
+
+def restore_active_subscribers(subscribers):
+    """Загрузить проверенные подписки из снимка; истекшие и устаревшие проверки пропускаются"""
+    now = time.time()
+    for user_id, (end, checked_at) in subscribers.items():
+        if now < end and now - checked_at < SUBSCRIBER_CACHE_TTL:
+            _active_subscribers[user_id] = (end, checked_at)
+
 def get_subscription_prices():
     """Получить все цены на подписку"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("SELECT period, price_usdt FROM subscription_prices ORDER BY period")
     rows = cur.fetchall()
@@ -150,7 +291,7 @@ def get_subscription_prices():
 
 def set_subscription_price(period, price_usdt):
     """Установить цену на подписку для определенного периода"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute(
         "UPDATE subscription_prices SET price_usdt = ?, updated_at = CURRENT_TIMESTAMP WHERE period = ?",
@@ -168,7 +309,7 @@ def set_subscription_price(period, price_usdt):
 
 def get_subscription_end_date(user_id):
     """Получить дату окончания подписки"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("SELECT subscription_end FROM users WHERE user_id = ?", (user_id,))
     row = cur.fetchone()
@@ -179,7 +320,7 @@ def get_subscription_end_date(user_id):
 
 def set_tracking(user_id, symbol, price):
     """Установить или обновить отслеживание валюты"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     # Проверяем, существует ли запись
     cur.execute(
@@ -203,11 +344,29 @@ def set_tracking(user_id, symbol, price):
         )
     conn.commit()
     conn.close()
-    logger.info(f"Валюта {symbol} обновлена для пользователя {user_id}")
+    if _tracking_log.allow():
+        logger.info(f"Валюта {symbol} обновлена для пользователя {user_id}")
+
+def update_last_prices(updates):
+    """Записать последние цены тика одной транзакцией: updates [(price, user_id, symbol, quote)]
+
+    Цена записывается, только если котировка пользователя не сменилась за время тика
+    (иначе цены, уже пересчитанные в новую котировку, затерлись бы ценами в старой).
+    """
+    if not updates:
+        return
+    conn = _connect()
+    conn.executemany("""
+        UPDATE tracking SET last_price = ?
+        WHERE user_id = ? AND symbol = ?
+          AND (SELECT COALESCE(u.quote_currency, 'USD') FROM users u WHERE u.user_id = tracking.user_id) = ?
+    """, updates)
+    conn.commit()
+    conn.close()
 
 def get_tracking(user_id):
     """Получить отслеживаемые валюты пользователя"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute(
         "SELECT symbol, initial_price, last_price FROM tracking WHERE user_id = ?", 
@@ -217,9 +376,22 @@ def get_tracking(user_id):
     conn.close()
     return rows
 
+def rebase_tracking(user_id, factors, quote):
+    """Сменить котировку пользователя и пересчитать цены отслеживания ({symbol: коэффициент}) одной транзакцией"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.executemany(
+        "UPDATE tracking SET initial_price = initial_price * ?, last_price = last_price * ? WHERE user_id = ? AND symbol = ?",
+        [(factor, factor, user_id, symbol) for symbol, factor in factors.items()]
+    )
+    cur.execute("UPDATE users SET quote_currency = ? WHERE user_id = ?", (quote, user_id))
+    conn.commit()
+    conn.close()
+    logger.info(f"Котировка пользователя {user_id} изменена на {quote}, цены отслеживания пересчитаны ({len(factors)} валют)")
+
 def get_all_users():
     """Получить всех пользователей"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("SELECT user_id, username, subscribed FROM users")
     rows = cur.fetchall()
@@ -228,7 +400,7 @@ def get_all_users():
 
 def get_user_stats():
     """Получить статистику пользователей"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("SELECT COUNT(*) FROM users")
     total = cur.fetchone()[0]
@@ -242,27 +414,63 @@ def get_user_stats():
         'unsubscribed': unsubscribed
     }
 
-def get_users_with_settings():
-    """Получить всех пользователей с их настройками и отслеживаниями"""
-    conn = sqlite3.connect('users.db')
+def get_tracking_count():
+    """Количество отслеживаемых пар у всех пользователей"""
+    conn = _connect()
     cur = conn.cursor()
-    cur.execute("""
-        SELECT u.user_id, u.username, u.notification_interval, u.price_threshold, u.notification_format, t.symbol, t.last_price
+    cur.execute("SELECT COUNT(*) FROM tracking")
+    count = cur.fetchone()[0]
+    conn.close()
+    return count
+
+def _shard_filter(column, shard):
+    """Условие выборки для шарда (index, count): column % count = index"""
+    if shard is None:
+        return "", ()
+    index, count = shard
+    return f" AND {column} % ? = ?", (count, index)
+
+def get_users_with_settings(shard=None):
+    """Получить пользователей с их настройками и отслеживаниями (все или одного шарда)"""
+    condition, params = _shard_filter("u.user_id", shard)
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT u.user_id, u.username, u.notification_interval, u.price_threshold, u.notification_format,
+               u.window_minutes, u.window_threshold, u.indicator_alerts, u.quote_currency,
+               t.symbol, t.last_price
         FROM users u
         LEFT JOIN tracking t ON u.user_id = t.user_id
-        WHERE u.subscribed = 1 OR u.user_id = (SELECT user_id FROM users WHERE user_id = u.user_id LIMIT 1)
-    """)
+        WHERE (u.subscribed = 1 OR u.user_id = (SELECT user_id FROM users WHERE user_id = u.user_id LIMIT 1)){condition}
+    """, params)
     rows = cur.fetchall()
     conn.close()
     logger.info(f"Получено {len(rows)} записей из базы данных")
     return rows
 
+def get_tracked_pairs():
+    """Получить все пары (symbol, quote), нужные на тике: отслеживания и ценовые уровни"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT t.symbol, COALESCE(u.quote_currency, 'USD')
+        FROM tracking t
+        JOIN users u ON u.user_id = t.user_id
+        UNION
+        SELECT DISTINCT symbol, quote FROM price_alerts WHERE status = 'active'
+    """)
+    rows = cur.fetchall()
+    conn.close()
+    return set(rows)
+
 def get_user_settings(user_id):
     """Получить настройки пользователя"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("""
-        SELECT notification_interval, price_threshold, notification_format 
+        SELECT notification_interval, price_threshold, notification_format,
+               window_minutes, window_threshold, indicator_alerts, digest_hour,
+               quote_currency
         FROM users 
         WHERE user_id = ?
     """, (user_id,))
@@ -272,23 +480,38 @@ def get_user_settings(user_id):
         return {
             'interval': int(row[0]) if row[0] else 5,
             'threshold': float(row[1]) if row[1] else 1.0,
-            'format': row[2] if row[2] else 'classic'
+            'format': row[2] if row[2] else 'classic',
+            'window': int(row[3]) if row[3] else 0,
+            'window_threshold': float(row[4]) if row[4] else 3.0,
+            'indicators': row[5] if row[5] else 'off',
+            'digest_hour': row[6],
+            'quote': row[7] if row[7] else 'USD'
         }
     return {
         'interval': 5,
         'threshold': 1.0,
-        'format': 'classic'
+        'format': 'classic',
+        'window': 0,
+        'window_threshold': 3.0,
+        'indicators': 'off',
+        'digest_hour': None,
+        'quote': 'USD'
     }
 
 def update_user_setting(user_id, setting_name, value):
     """Обновить настройку пользователя"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     
     setting_map = {
         'interval': 'notification_interval',
         'threshold': 'price_threshold',
-        'format': 'notification_format'
+        'format': 'notification_format',
+        'window': 'window_minutes',
+        'window_threshold': 'window_threshold',
+        'indicators': 'indicator_alerts',
+        'digest': 'digest_hour',
+        'quote': 'quote_currency'
     }
     
     if setting_name in setting_map:
@@ -299,15 +522,41 @@ def update_user_setting(user_id, setting_name, value):
     
     conn.close()
 
-def add_invoice(user_id, invoice_id, hash, amount, currency):
-    """Добавить инвойс в базу данных"""
-    conn = sqlite3.connect('users.db')
+def get_digest_recipients(hour, today):
+    """Получить подписчиков, которым сводка в этот час еще не отправлялась сегодня"""
+    conn = _connect()
+    cur = conn.cursor()
+    # Флаг subscribed сбрасывается только при обращении пользователя, поэтому проверяется и срок
+    cur.execute("""
+        SELECT user_id, notification_format, quote_currency
+        FROM users
+        WHERE digest_hour = ? AND (digest_sent_on IS NULL OR digest_sent_on != ?)
+          AND ((subscribed = 1 AND (subscription_end IS NULL OR subscription_end > ?)) OR user_id = ?)
+    """, (hour, today, datetime.now(), ADMIN_ID))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def mark_digest_sent(user_ids, today):
+    """Отметить отправку сводки пользователям одним запросом"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.executemany(
+        "UPDATE users SET digest_sent_on = ? WHERE user_id = ?",
+        [(today, user_id) for user_id in user_ids]
+    )
+    conn.commit()
+    conn.close()
+
+def add_invoice(user_id, invoice_id, hash, amount, currency, period=None, period_days=None):
+    """Добавить инвойс в базу данных вместе с оплачиваемым периодом"""
+    conn = _connect()
     cur = conn.cursor()
     try:
         cur.execute("""
-            INSERT INTO invoices (user_id, invoice_id, hash, amount, currency, status) 
-            VALUES (?, ?, ?, ?, ?, 'active')
-        """, (user_id, invoice_id, hash, amount, currency))
+            INSERT INTO invoices (user_id, invoice_id, hash, amount, currency, status, period, period_days) 
+            VALUES (?, ?, ?, ?, ?, 'active', ?, ?)
+        """, (user_id, invoice_id, hash, amount, currency, period, period_days))
         conn.commit()
         logger.info(f"Инвойс {invoice_id} добавлен для пользователя {user_id}")
     except Exception as e:
@@ -317,7 +566,7 @@ def add_invoice(user_id, invoice_id, hash, amount, currency):
 
 def get_user_invoices(user_id):
     """Получить все инвойсы пользователя"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("""
         SELECT invoice_id, hash, amount, currency, status, created_at 
@@ -331,7 +580,7 @@ def get_user_invoices(user_id):
 
 def get_active_invoice(user_id):
     """Получить последний активный инвойс пользователя"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("""
         SELECT invoice_id, hash, amount, currency 
@@ -344,24 +593,297 @@ def get_active_invoice(user_id):
     conn.close()
     return row
 
-def update_invoice_status(invoice_id, status):
-    """Обновить статус инвойса"""
-    conn = sqlite3.connect('users.db')
+def get_active_invoices():
+    """Получить все неприменённые инвойсы (для фоновой сверки)"""
+    conn = _connect()
+    cur = conn.cursor()
+    # 'paid' - оплата зафиксирована, но подписка еще не активирована
+    cur.execute("""
+        SELECT user_id, invoice_id, amount
+        FROM invoices
+        WHERE status IN ('active', 'paid')
+        ORDER BY created_at
+    """)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_stale_invoices(max_age_hours):
+    """Получить ID активных инвойсов старше max_age_hours часов"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT invoice_id
+        FROM invoices
+        WHERE status = 'active' AND created_at < datetime('now', ?)
+        ORDER BY created_at
+    """, (f"-{int(max_age_hours)} hours",))
+    rows = [row[0] for row in cur.fetchall()]
+    conn.close()
+    return rows
+
+def archive_invoices(older_than_days):
+    """Перенести закрытые инвойсы старше older_than_days дней в архив, вернуть количество"""
+    # id не переносится: после удаления из invoices он может достаться новому инвойсу,
+    # архив нумерует свои строки сам и уникален по invoice_id
+    columns = "user_id, invoice_id, hash, amount, currency, status, period, period_days, created_at, applied_at"
+    conn = _connect()
+    cur = conn.cursor()
+    # Граница считается один раз: обе команды отбирают одни и те же инвойсы
+    cur.execute("SELECT datetime('now', ?)", (f"-{int(older_than_days)} days",))
+    cutoff = cur.fetchone()[0]
+    condition = "status IN ('applied', 'cancelled', 'expired') AND created_at < ?"
+    cur.execute(
+        f"INSERT OR IGNORE INTO invoices_archive ({columns}) SELECT {columns} FROM invoices WHERE {condition}",
+        (cutoff,)
+    )
+    # Удаляются только инвойсы, которые действительно есть в архиве
+    cur.execute(
+        f"DELETE FROM invoices WHERE invoice_id IN (SELECT invoice_id FROM invoices_archive) AND {condition}",
+        (cutoff,)
+    )
+    archived = cur.rowcount
+    conn.commit()
+    conn.close()
+    if archived:
+        logger.info(f"В архив перенесено инвойсов: {archived}")
+    return archived
+
+def update_invoice_status(invoice_id, status, expected=None):
+    """Обновить статус инвойса (если задан expected - только из этого статуса), вернуть успех"""
+    conn = _connect()
     cur = conn.cursor()
-    cur.execute("UPDATE invoices SET status = ? WHERE invoice_id = ?", (status, invoice_id))
+    if expected is None:
+        cur.execute("UPDATE invoices SET status = ? WHERE invoice_id = ?", (status, invoice_id))
+    else:
+        cur.execute(
+            "UPDATE invoices SET status = ? WHERE invoice_id = ? AND status = ?",
+            (status, invoice_id, expected)
+        )
+    updated = cur.rowcount > 0
     conn.commit()
     conn.close()
-    logger.info(f"Статус инвойса {invoice_id} обновлен на {status}")
+    if updated:
+        logger.info(f"Статус инвойса {invoice_id} обновлен на {status}")
+    return updated
+
+def apply_invoice(invoice_id, fallback_days=30):
+    """Атомарно перевести инвойс в 'applied' и продлить подписку
+
+    Переход active/paid -> applied - это compare-and-set по уникальному индексу
+    invoice_id в одной транзакции с обновлением подписки, поэтому параллельные
+    проверки (кнопка, фоновая сверка, вебхук) активируют подписку ровно один раз.
+    Возвращает (user_id, period, period_days) или None, если инвойс уже применен.
+    """
+    conn = _connect(isolation_level=None)
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            "SELECT user_id, period, period_days FROM invoices WHERE invoice_id = ? AND status IN ('active', 'paid')",
+            (invoice_id,)
+        )
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("ROLLBACK")
+            return None
+        user_id, period, period_days = row
+        period_days = period_days or fallback_days
+        cur.execute(
+            "UPDATE invoices SET status = 'applied', applied_at = CURRENT_TIMESTAMP WHERE invoice_id = ? AND status IN ('active', 'paid')",
+            (invoice_id,)
+        )
+        end_date = datetime.now() + timedelta(days=period_days)
+        cur.execute(
+            "UPDATE users SET subscribed = 1, subscription_end = ? WHERE user_id = ?",
+            (end_date, user_id)
+        )
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    _active_subscribers.pop(user_id, None)
+    logger.info(f"Инвойс {invoice_id} применен: подписка пользователя {user_id} на {period_days} дней")
+    return user_id, period, period_days
 
 def get_invoice_by_id(invoice_id):
     """Получить инвойс по ID"""
-    conn = sqlite3.connect('users.db')
+    conn = _connect()
     cur = conn.cursor()
     cur.execute("""
-        SELECT user_id, invoice_id, hash, amount, currency, status 
+        SELECT user_id, invoice_id, hash, amount, currency, status, period, period_days 
         FROM invoices 
         WHERE invoice_id = ?
     """, (invoice_id,))
     row = cur.fetchone()
     conn.close()
     return row
+
+def add_price_alert(user_id, symbol, target_price, direction, quote='USD'):
+    """Добавить ценовой уровень, вернуть его ID"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO price_alerts (user_id, symbol, target_price, quote, direction, status)
+        VALUES (?, ?, ?, ?, ?, 'active')
+    """, (user_id, symbol, target_price, quote, direction))
+    alert_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+    logger.info(f"Ценовой уровень {alert_id} ({symbol} {direction} {target_price} {quote}) добавлен для пользователя {user_id}")
+    return alert_id
+
+def get_user_price_alerts(user_id):
+    """Получить активные ценовые уровни пользователя"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, symbol, target_price, direction, quote
+        FROM price_alerts
+        WHERE user_id = ? AND status = 'active'
+        ORDER BY symbol, target_price
+    """, (user_id,))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def get_active_price_alerts(shard=None, after_id=0):
+    """Получить активные ценовые уровни с id > after_id, все или одного шарда (для построения индекса)"""
+    condition, params = _shard_filter("user_id", shard)
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT id, user_id, symbol, quote, target_price, direction
+        FROM price_alerts
+        WHERE status = 'active' AND id > ?{condition}
+    """, (after_id, *params))
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def mark_price_alerts_triggered(alert_ids):
+    """Пометить сработавшие ценовые уровни в одной транзакции, вернуть ID тех, что еще были активны"""
+    if not alert_ids:
+        return []
+    conn = _connect()
+    cur = conn.cursor()
+    triggered = []
+    for alert_id in alert_ids:
+        # Уровень мог быть удален пользователем, а индекс еще не узнал об этом
+        cur.execute(
+            "UPDATE price_alerts SET status = 'triggered', triggered_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'active'",
+            (alert_id,)
+        )
+        if cur.rowcount:
+            triggered.append(alert_id)
+    conn.commit()
+    conn.close()
+    logger.info(f"Сработало ценовых уровней: {len(triggered)}")
+    return triggered
+
+def delete_price_alert(alert_id, user_id):
+    """Удалить ценовой уровень пользователя"""
+    conn = _connect()
+    cur = conn.cursor()
+    # Строка остается со статусом 'deleted': ID не переиспользуется, и индекс
+    # другой реплики, догружающий уровни по ID, не спутает новый уровень со старым
+    cur.execute(
+        "UPDATE price_alerts SET status = 'deleted' WHERE id = ? AND user_id = ? AND status = 'active'",
+        (alert_id, user_id)
+    )
+    deleted = cur.rowcount > 0
+    conn.commit()
+    conn.close()
+    if deleted:
+        logger.info(f"Ценовой уровень {alert_id} удален пользователем {user_id}")
+    return deleted
+
+def acquire_lease(name, holder, ttl):
+    """Захватить или продлить аренду name на ttl секунд, вернуть True если она у holder"""
+    now = time.time()
+    conn = _connect()
+    cur = conn.cursor()
+    # Одна атомарная операция: запись создается, продлевается своим держателем
+    # или перехватывается, только если аренда другого держателя истекла
+    cur.execute("""
+        INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+        WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+    """, (name, holder, now + ttl, now))
+    acquired = cur.rowcount > 0
+    conn.commit()
+    conn.close()
+    return acquired
+
+def release_lease(name, holder):
+    """Освободить аренду, если она принадлежит holder"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+    conn.commit()
+    conn.close()
+
+def get_fsm_record(key):
+    """Получить (state, data) FSM по ключу"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("SELECT state, data FROM fsm_storage WHERE key = ?", (key,))
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None, {}
+    return row[0], json.loads(row[1]) if row[1] else {}
+
+def set_fsm_state(key, state):
+    """Сохранить состояние FSM"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO fsm_storage (key, state) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET state = excluded.state
+    """, (key, state))
+    conn.commit()
+    conn.close()
+
+def set_fsm_data(key, data):
+    """Сохранить данные FSM"""
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO fsm_storage (key, data) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET data = excluded.data
+    """, (key, json.dumps(data) if data else None))
+    conn.commit()
+    conn.close()
+
+def get_cached_prices(pairs, max_age):
+    """Получить цены пар (symbol, quote) не старше max_age секунд одним запросом"""
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    conn = _connect()
+    cur = conn.cursor()
+    placeholders = ",".join(["(?, ?)"] * len(pairs))
+    cur.execute(f"""
+        SELECT symbol, quote, price FROM price_cache
+        WHERE (symbol, quote) IN (VALUES {placeholders}) AND updated_at >= ?
+    """, (*[value for pair in pairs for value in pair], time.time() - max_age))
+    rows = cur.fetchall()
+    conn.close()
+    return {(symbol, quote): price for symbol, quote, price in rows}
+
+def set_cached_prices(prices):
+    """Сохранить цены {(symbol, quote): price} в одной транзакции"""
+    if not prices:
+        return
+    now = time.time()
+    conn = _connect()
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO price_cache (symbol, quote, price, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(symbol, quote) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at
+    """, [(symbol, quote, price, now) for (symbol, quote), price in prices.items()])
+    conn.commit()
+    conn.close()
@@ -5,7 +5,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from config import ADMIN_ID
+from config import ADMIN_ID, TRACE_SLOW_SECONDS
 from database import ( 
     set_subscription, get_all_users, get_user_stats,
     update_invoice_status, get_invoice_by_id,
@@ -19,7 +19,12 @@ from keyboards.admin import (
     admin_subscription_back_keyboard,
     admin_broadcast_keyboard 
 )
+from keyboards.main import payment_keyboard
+from middlewares.tracing import slow_traces
+from services import profiling
+from services.events import publish
 from utils.logger import get_logger
+from utils.metrics import HANDLER_SECONDS, HANDLER_SPAN_SECONDS
 
 logger = get_logger(__name__)
 router = Router()
@@ -267,7 +272,6 @@ async def admin_stats_handler(callback: CallbackQuery):
     if callback.from_user.id != ADMIN_ID:
         return
         
-    from database import get_user_stats
     stats = get_user_stats()
     
     text = (
@@ -279,6 +283,78 @@ async def admin_stats_handler(callback: CallbackQuery):
     
     await callback.message.edit_text(text, parse_mode="HTML", reply_markup=admin_back_keyboard())
 
+@router.message(Command("slow"))
+async def slow_handlers(message: Message):
+    """Самые медленные обработчики (p95 по гистограмме) и последние медленные обновления"""
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    rows = [
+        (HANDLER_SECONDS.quantile(0.95, handler), handler, count, total)
+        for (handler,), (count, total) in HANDLER_SECONDS.series().items()
+    ]
+    if not rows:
+        await message.answer("Обновлений с начала работы процесса еще не было.")
+        return
+
+    rows.sort(reverse=True)
+    spans = HANDLER_SPAN_SECONDS.series()
+    lines = ["🐢 <b>Медленные обработчики</b>", "p95 / среднее, из него БД / HTTP / Bot API (секунды)\n"]
+    for p95, handler, count, total in rows[:10]:
+        p95_text = f"≤{p95}" if p95 != float("inf") else f">{HANDLER_SECONDS.buckets[-1]}"
+        parts = " / ".join(
+            f"{spans.get((handler, kind), (0, 0.0))[1] / count:.2f}" for kind in ("db", "http", "telegram")
+        )
+        lines.append(f"<code>{handler}</code>: {p95_text} / {total / count:.2f}, {parts} ({count} шт.)")
+
+    if slow_traces:
+        lines.append(f"\n<b>Последние обновления дольше {TRACE_SLOW_SECONDS} с</b>")
+        for trace in list(slow_traces)[-5:]:
+            totals = ", ".join(f"{kind} {seconds:.2f}" for kind, seconds in trace.totals.items())
+            lines.append(f"<code>{trace.handler}</code>: {trace.duration:.2f} с ({totals or 'без внешних вызовов'})")
+
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+def _profile_args(message: Message, default_amount, max_amount):
+    """Аргументы /profile_*: [количество] [cprofile|sample]"""
+    parts = message.text.split()[1:]
+    amount = int(parts[0]) if parts else default_amount
+    kind = parts[1] if len(parts) > 1 else "cprofile"
+    if not 0 < amount <= max_amount or kind not in profiling.PROFILER_KINDS:
+        raise ValueError
+    return amount, kind
+
+@router.message(Command("profile_ticks"))
+async def profile_ticks_command(message: Message):
+    """Профилировать следующие N тиков проверки цен (там, где они выполняются)"""
+    if message.from_user.id != ADMIN_ID:
+        return
+    try:
+        ticks, kind = _profile_args(message, 3, 20)
+    except ValueError:
+        await message.answer("❌ Используйте формат: /profile_ticks [1-20] [cprofile|sample]")
+        return
+
+    # Тики могут идти в отдельном воркере - команда уходит туда, результат придет сообщением
+    await publish("profile_ticks", ticks=ticks, kind=kind)
+    await message.answer(f"🔬 Профилирование следующих {ticks} тиков ({kind}) запрошено, результат придет сообщением.")
+
+@router.message(Command("profile_updates"))
+async def profile_updates_command(message: Message):
+    """Профилировать процесс бота (обработку обновлений) N секунд"""
+    if message.from_user.id != ADMIN_ID:
+        return
+    try:
+        seconds, kind = _profile_args(message, 30, 300)
+    except ValueError:
+        await message.answer("❌ Используйте формат: /profile_updates [1-300 секунд] [cprofile|sample]")
+        return
+
+    await message.answer(f"🔬 Профилирование обработки обновлений на {seconds} с ({kind})...")
+    if not await profiling.profile_for(seconds, kind, message.answer):
+        await message.answer("⏳ Профилирование уже идет, дождитесь результата")
+
 
 @router.callback_query(F.data == "check_payment")
 async def check_payment_handler(callback: CallbackQuery):
@@ -286,14 +362,12 @@ async def check_payment_handler(callback: CallbackQuery):
         # Здесь должна быть логика проверки оплаты
         # Пока показываем демонстрационное сообщение
         
-        from handlers.admin import SUBSCRIPTION_PRICE
         check_text = (
             "🔄 <b>Проверка оплаты</b>\n\n"
             "⏳ Проверяем статус вашего платежа...\n\n"
             "Если вы уже оплатили подписку, доступ будет предоставлен в течение нескольких минут."
         )
         
-        from keyboards.main import payment_keyboard
         await callback.message.edit_text(
             text=check_text,
             parse_mode="HTML",
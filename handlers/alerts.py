@@ -0,0 +1,164 @@
+# handlers/alerts.py
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from database import (
+    is_subscribed, add_price_alert, get_user_price_alerts, delete_price_alert,
+    get_user_settings
+)
+from keyboards.main import (
+    price_alerts_keyboard, alert_currency_keyboard, alert_cancel_keyboard
+)
+from services.crypto_api import get_crypto_price
+from services.events import publish
+from services.price_levels import MAX_ALERTS_PER_USER
+from utils.currency import format_price
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+router = Router()
+
+# Машина состояний для ввода ценового уровня
+class PriceAlertStates(StatesGroup):
+    waiting_for_price = State()
+
+
+async def _edit(callback: CallbackQuery, text, reply_markup):
+    """Редактировать сообщение с фото или текстовое сообщение"""
+    try:
+        await callback.message.edit_caption(caption=text, parse_mode="HTML", reply_markup=reply_markup)
+    except Exception:
+        await callback.message.edit_text(text=text, parse_mode="HTML", reply_markup=reply_markup)
+
+def _alerts_text(alerts):
+    """Текст со списком ценовых уровней пользователя"""
+    if not alerts:
+        return (
+            "🎯 <b>Ценовые уровни</b>\n\n"
+            "❌ У вас нет активных уровней.\n\n"
+            "Добавьте уровень, и бот уведомит вас, когда цена его пересечет."
+        )
+    text = "🎯 <b>Ценовые уровни:</b>\n\n"
+    for _, symbol, target_price, direction, quote in alerts:
+        arrow = "📈 выше" if direction == 'above' else "📉 ниже"
+        text += f"• <b>{symbol}</b> {arrow} <code>{format_price(target_price, quote)}</code>\n"
+    text += "\nНажмите на уровень, чтобы удалить его."
+    return text
+
+@router.callback_query(F.data == "price_alerts")
+async def price_alerts_handler(callback: CallbackQuery, state: FSMContext):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+
+    await state.clear()
+    alerts = get_user_price_alerts(callback.from_user.id)
+    await _edit(callback, _alerts_text(alerts), price_alerts_keyboard(alerts))
+
+@router.callback_query(F.data == "alert_add")
+async def alert_add_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+
+    if len(get_user_price_alerts(callback.from_user.id)) >= MAX_ALERTS_PER_USER:
+        await callback.answer(f"⚠️ Можно установить не более {MAX_ALERTS_PER_USER} уровней", show_alert=True)
+        return
+
+    text = "🎯 <b>Новый ценовой уровень</b>\n\nВыберите криптовалюту:"
+    await _edit(callback, text, alert_currency_keyboard())
+
+@router.callback_query(F.data.startswith("alert_symbol_"))
+async def alert_symbol_handler(callback: CallbackQuery, state: FSMContext):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+
+    symbol = callback.data.split("_")[2]
+    quote = get_user_settings(callback.from_user.id)['quote']
+    price = await get_crypto_price(symbol, quote, use_cache=False)
+    if not price:
+        await callback.answer("❌ Ошибка получения цены", show_alert=True)
+        return
+
+    await state.update_data(alert_symbol=symbol, alert_price=price, alert_quote=quote)
+    await state.set_state(PriceAlertStates.waiting_for_price)
+
+    text = (
+        f"🎯 <b>Уровень для {symbol}</b>\n\n"
+        f"💰 Текущая цена: <b>{format_price(price, quote)}</b>\n\n"
+        "Введите цену, при пересечении которой нужно прислать уведомление "
+        "(например, <code>70000</code> или <code>0.55</code>):"
+    )
+    await _edit(callback, text, alert_cancel_keyboard())
+
+@router.message(PriceAlertStates.waiting_for_price)
+async def process_alert_price(message: Message, state: FSMContext):
+    try:
+        target_price = float((message.text or "").replace(" ", "").replace(",", "."))
+    except ValueError:
+        await message.answer("❌ Неверный формат цены. Введите число (например, 70000 или 0.55):")
+        return
+    if target_price <= 0:
+        await message.answer("❌ Цена должна быть положительной. Попробуйте еще раз:")
+        return
+
+    user_id = message.from_user.id
+    user_data = await state.get_data()
+    symbol = user_data.get('alert_symbol')
+    current_price = user_data.get('alert_price')
+    quote = user_data.get('alert_quote', 'USD')
+    if not symbol or not current_price:
+        await message.answer("❌ Ошибка состояния. Попробуйте снова через меню.")
+        await state.clear()
+        return
+
+    # Направление определяется относительно текущей цены: пока пользователь вводил
+    # уровень, цена могла пройти его, поэтому она запрашивается заново
+    fresh_price = await get_crypto_price(symbol, quote, use_cache=False)
+    if fresh_price:
+        current_price = fresh_price
+    direction = 'above' if target_price > current_price else 'below'
+    alert_id = add_price_alert(user_id, symbol, target_price, direction, quote)
+    # Индекс уровней живет в процессе фоновой проверки цен
+    await publish(
+        "price_alert_added", alert_id=alert_id, user_id=user_id, symbol=symbol,
+        quote=quote, target=target_price, direction=direction
+    )
+    await state.clear()
+
+    arrow = "поднимется до" if direction == 'above' else "опустится до"
+    alerts = get_user_price_alerts(user_id)
+    await message.answer(
+        f"✅ <b>Уровень добавлен!</b>\n\n"
+        f"Бот уведомит вас, когда <b>{symbol}</b> {arrow} <b>{format_price(target_price, quote)}</b>.",
+        parse_mode="HTML",
+        reply_markup=price_alerts_keyboard(alerts)
+    )
+    logger.info(f"Пользователь {user_id} добавил уровень {symbol} {direction} {target_price} {quote}")
+
+@router.callback_query(F.data == "alert_cancel")
+async def alert_cancel_handler(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    alerts = get_user_price_alerts(callback.from_user.id)
+    await _edit(callback, _alerts_text(alerts), price_alerts_keyboard(alerts))
+
+@router.callback_query(F.data.startswith("alert_del_"))
+async def alert_delete_handler(callback: CallbackQuery):
+    user_id = callback.from_user.id
+    try:
+        alert_id = int(callback.data.split("_")[2])
+        if delete_price_alert(alert_id, user_id):
+            await publish("price_alert_removed", alert_id=alert_id)
+            await callback.answer("✅ Уровень удален")
+        else:
+            await callback.answer("ℹ️ Уровень уже сработал или удален")
+
+        alerts = get_user_price_alerts(user_id)
+        await _edit(callback, _alerts_text(alerts), price_alerts_keyboard(alerts))
+
+    except Exception as e:
+        logger.error(f"Ошибка в alert_delete_handler: {e}")
+        await callback.answer("❌ Ошибка удаления уровня", show_alert=True)
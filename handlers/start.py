@@ -1,28 +1,49 @@
 # handlers/start.py
 
 import os
+from datetime import datetime
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, CommandStart 
 from keyboards.main import (
     welcome_keyboard, currency_keyboard, 
     subscription_success_keyboard, tracking_menu_keyboard,
     settings_keyboard, interval_settings_keyboard,
     threshold_settings_keyboard, format_settings_keyboard,
+    window_settings_keyboard, window_threshold_settings_keyboard,
+    indicator_settings_keyboard, digest_settings_keyboard,
+    quote_settings_keyboard,
     profile_keyboard, my_tracking_keyboard, 
-    subscription_periods_keyboard 
+    subscription_periods_keyboard, payment_keyboard, invoice_keyboard
 )
+from config import ADMIN_ID
 from database import (
     add_user, is_subscribed, set_subscription, 
     add_invoice, get_active_invoice, get_user_settings,
-    update_user_setting, get_tracking, get_subscription_end_date 
+    update_user_setting, get_tracking, get_subscription_end_date,
+    rebase_tracking, get_subscription_prices
 )    
 from services.crypto_bot import create_invoice, check_invoice_status, cancel_invoice
+from services.price_window import WINDOW_MINUTES
+from services.indicators import EMA_PERIOD
+from services.crypto_api import get_crypto_prices
+from services.payments import apply_paid_invoice, activation_text, PERIOD_NAMES
+from services.events import publish
+from services import media
+from utils.currency import QUOTE_CURRENCIES, format_price
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 router = Router()
 
+# Названия режимов уведомлений по индикаторам
+INDICATOR_MODE_NAMES = {
+    'off': 'выключены',
+    'ema': f'пересечение EMA({EMA_PERIOD})',
+    'volatility': 'всплеск волатильности',
+    'all': 'все сигналы'
+}
+
 # Путь к локальному изображению
 WELCOME_IMAGE_PATH = "assets/welcome.jpg"  # Убедитесь, что папка assets существует
 
@@ -45,13 +66,14 @@ async def start_handler(message: Message):
         
         # Проверяем существование файла изображения
         if os.path.exists(WELCOME_IMAGE_PATH):
-            photo = FSInputFile(WELCOME_IMAGE_PATH)
-            await message.answer_photo(
-                photo=photo,
+            # Файл загружается один раз, дальше отправляется по file_id
+            sent = await message.answer_photo(
+                photo=media.photo(WELCOME_IMAGE_PATH),
                 caption=welcome_text,
                 parse_mode="HTML",
                 reply_markup=welcome_keyboard(has_subscription)
             )
+            media.remember_photo(WELCOME_IMAGE_PATH, sent)
         else:
             # Если файл не найден, используем ссылку
             await message.answer_photo(
@@ -109,6 +131,7 @@ async def my_tracking_handler(callback: CallbackQuery):
             "Нажмите кнопку ниже, чтобы начать отслеживание."
         )
     else:
+        quote = get_user_settings(user_id)['quote']
         text = "📊 <b>Мои отслеживания:</b>\n\n"
         for symbol, initial_price, last_price in tracking_data:
             change_symbol = "📈" if last_price > initial_price else "📉" if last_price < initial_price else "➡️"
@@ -118,8 +141,8 @@ async def my_tracking_handler(callback: CallbackQuery):
             
             text += (
                 f"<b>{symbol}</b>\n"
-                f"🏁 Начальная цена: <code>${initial_price:.2f}</code>\n"
-                f"💵 Текущая цена: <code>${last_price:.2f}</code>\n"
+                f"🏁 Начальная цена: <code>{format_price(initial_price, quote)}</code>\n"
+                f"💵 Текущая цена: <code>{format_price(last_price, quote)}</code>\n"
                 f"📊 Изменение: <b>{change_symbol} {change_percent:.2f}%</b>\n\n"
             )
     
@@ -162,10 +185,22 @@ async def settings_handler(callback: CallbackQuery):
     
     user_settings = get_user_settings(callback.from_user.id)
     
+    if user_settings['window']:
+        window_info = f"{user_settings['window_threshold']}% за {user_settings['window']} минут"
+    else:
+        window_info = "выключено"
+    
+    digest_hour = user_settings['digest_hour']
+    digest_info = f"{digest_hour:02d}:00" if digest_hour is not None else "выключена"
+    
     text = (
         "⚙️ <b>Настройки уведомлений</b>\n\n"
         f"⏱ Интервал проверки: <b>{user_settings['interval']} минут</b>\n"
         f"📊 Порог изменения: <b>{user_settings['threshold']}%</b>\n"
+        f"🕒 Изменение за период: <b>{window_info}</b>\n"
+        f"📉 Индикаторы: <b>{INDICATOR_MODE_NAMES.get(user_settings['indicators'], user_settings['indicators'])}</b>\n"
+        f"📰 Ежедневная сводка: <b>{digest_info}</b>\n"
+        f"💱 Валюта котировки: <b>{user_settings['quote']}</b>\n"
         f"📝 Формат уведомлений: <b>{user_settings['format'].capitalize()}</b>\n\n"
         "Выберите параметр для настройки:"
     )
@@ -259,6 +294,245 @@ async def set_threshold_handler(callback: CallbackQuery):
         logger.error(f"Ошибка в set_threshold_handler: {e}")
         await callback.answer("❌ Ошибка установки порога", show_alert=True)
 
+@router.callback_query(F.data == "settings_window")
+async def settings_window_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    text = (
+        "🕒 <b>Изменение цены за период</b>\n\n"
+        "Бот уведомит, если цена сдвинется больше порога в пределах выбранного окна, "
+        "даже если каждый отдельный шаг был меньше основного порога.\n\n"
+        "Выберите длину окна:"
+    )
+    
+    await callback.message.edit_caption(
+        caption=text,
+        parse_mode="HTML",
+        reply_markup=window_settings_keyboard()
+    )
+
+@router.callback_query(F.data.startswith("set_window_"))
+async def set_window_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    try:
+        minutes = int(callback.data.split("_")[2])
+        if minutes and minutes not in WINDOW_MINUTES:
+            raise ValueError(f"Неподдерживаемая длина окна: {minutes}")
+            
+        update_user_setting(callback.from_user.id, 'window', minutes)
+        await publish("settings_changed", user_id=callback.from_user.id)
+        
+        if minutes:
+            text = (
+                f"✅ <b>Окно установлено: {minutes} минут</b>\n\n"
+                "Теперь выберите порог изменения цены за это окно:"
+            )
+            reply_markup = window_threshold_settings_keyboard()
+        else:
+            text = "✅ <b>Уведомления об изменении за период выключены.</b>"
+            reply_markup = settings_keyboard()
+        
+        await callback.message.edit_caption(
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=reply_markup
+        )
+        
+        logger.info(f"Пользователь {callback.from_user.id} установил окно {minutes} минут")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в set_window_handler: {e}")
+        await callback.answer("❌ Ошибка установки окна", show_alert=True)
+
+@router.callback_query(F.data.startswith("set_wthreshold_"))
+async def set_window_threshold_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    try:
+        threshold = float(callback.data.split("_")[2])
+        update_user_setting(callback.from_user.id, 'window_threshold', threshold)
+        await publish("settings_changed", user_id=callback.from_user.id)
+        
+        user_settings = get_user_settings(callback.from_user.id)
+        text = (
+            f"✅ <b>Порог за период обновлен!</b>\n\n"
+            f"Теперь вы будете получать уведомления при изменении цены более <b>{threshold}%</b> "
+            f"за <b>{user_settings['window']} минут</b>."
+        )
+        
+        await callback.message.edit_caption(
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=settings_keyboard()
+        )
+        
+        logger.info(f"Пользователь {callback.from_user.id} установил порог окна {threshold}%")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в set_window_threshold_handler: {e}")
+        await callback.answer("❌ Ошибка установки порога", show_alert=True)
+
+@router.callback_query(F.data == "settings_indicators")
+async def settings_indicators_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    text = (
+        "📉 <b>Уведомления по индикаторам</b>\n\n"
+        f"• <b>EMA</b> — цена пересекла свою среднюю EMA({EMA_PERIOD}) по тикам проверки\n"
+        "• <b>Волатильность</b> — изменение за тик намного больше обычного разброса\n\n"
+        "Выберите, какие сигналы получать по отслеживаемым валютам:"
+    )
+    
+    await callback.message.edit_caption(
+        caption=text,
+        parse_mode="HTML",
+        reply_markup=indicator_settings_keyboard()
+    )
+
+@router.callback_query(F.data.startswith("set_indicators_"))
+async def set_indicators_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    try:
+        mode = callback.data.split("_")[2]
+        if mode not in INDICATOR_MODE_NAMES:
+            raise ValueError(f"Неизвестный режим индикаторов: {mode}")
+            
+        update_user_setting(callback.from_user.id, 'indicators', mode)
+        
+        text = f"✅ <b>Индикаторы обновлены!</b>\n\nУведомления по индикаторам: <b>{INDICATOR_MODE_NAMES[mode]}</b>."
+        
+        await callback.message.edit_caption(
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=settings_keyboard()
+        )
+        
+        logger.info(f"Пользователь {callback.from_user.id} установил индикаторы {mode}")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в set_indicators_handler: {e}")
+        await callback.answer("❌ Ошибка установки индикаторов", show_alert=True)
+
+@router.callback_query(F.data == "settings_digest")
+async def settings_digest_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    text = (
+        "📰 <b>Ежедневная сводка</b>\n\n"
+        "Раз в день бот пришлет изменение за 24 часа, максимум и минимум "
+        "по вашим отслеживаемым валютам.\n\n"
+        "Выберите время (по времени сервера):"
+    )
+    
+    await callback.message.edit_caption(
+        caption=text,
+        parse_mode="HTML",
+        reply_markup=digest_settings_keyboard()
+    )
+
+@router.callback_query(F.data.startswith("set_digest_"))
+async def set_digest_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    try:
+        value = callback.data.split("_")[2]
+        hour = None if value == "off" else int(value)
+        if hour is not None and not 0 <= hour <= 23:
+            raise ValueError(f"Некорректный час сводки: {hour}")
+            
+        update_user_setting(callback.from_user.id, 'digest', hour)
+        
+        if hour is None:
+            text = "✅ <b>Ежедневная сводка выключена.</b>"
+        else:
+            text = f"✅ <b>Ежедневная сводка включена!</b>\n\nСводка будет приходить каждый день в <b>{hour:02d}:00</b>."
+        
+        await callback.message.edit_caption(
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=settings_keyboard()
+        )
+        
+        logger.info(f"Пользователь {callback.from_user.id} установил время сводки {value}")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в set_digest_handler: {e}")
+        await callback.answer("❌ Ошибка настройки сводки", show_alert=True)
+
+@router.callback_query(F.data == "settings_quote")
+async def settings_quote_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    text = "💱 <b>Выберите валюту котировки:</b>\n\nВ этой валюте будут показаны цены и рассчитаны уведомления:"
+    
+    await callback.message.edit_caption(
+        caption=text,
+        parse_mode="HTML",
+        reply_markup=quote_settings_keyboard()
+    )
+
+@router.callback_query(F.data.startswith("set_quote_"))
+async def set_quote_handler(callback: CallbackQuery):
+    if not is_subscribed(callback.from_user.id):
+        await callback.answer("⚠️ Сначала необходимо приобрести подписку!", show_alert=True)
+        return
+    
+    try:
+        user_id = callback.from_user.id
+        quote = callback.data.split("_")[2]
+        if quote not in QUOTE_CURRENCIES:
+            raise ValueError(f"Неподдерживаемая валюта котировки: {quote}")
+        
+        old_quote = get_user_settings(user_id)['quote']
+        if quote != old_quote:
+            # Пересчитываем сохраненные цены отслеживания по текущему кросс-курсу
+            symbols = {row[0] for row in get_tracking(user_id)}
+            factors = {}
+            if symbols:
+                prices = await get_crypto_prices(symbols, (old_quote, quote), use_cache=True)
+                factors = {
+                    symbol: prices[(symbol, quote)] / prices[(symbol, old_quote)]
+                    for symbol in symbols
+                    if prices.get((symbol, quote)) and prices.get((symbol, old_quote))
+                }
+                if len(factors) != len(symbols):
+                    await callback.answer("❌ Не удалось получить курс, попробуйте позже", show_alert=True)
+                    return
+            rebase_tracking(user_id, factors, quote)
+            await publish("settings_changed", user_id=user_id)
+        
+        text = f"✅ <b>Валюта котировки обновлена!</b>\n\nТеперь цены показываются в <b>{quote}</b>."
+        
+        await callback.message.edit_caption(
+            caption=text,
+            parse_mode="HTML",
+            reply_markup=settings_keyboard()
+        )
+        
+        logger.info(f"Пользователь {user_id} установил котировку {quote}")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в set_quote_handler: {e}")
+        await callback.answer("❌ Ошибка установки валюты", show_alert=True)
+
 @router.callback_query(F.data == "settings_format")
 async def settings_format_handler(callback: CallbackQuery):
     if not is_subscribed(callback.from_user.id):
@@ -310,7 +584,6 @@ async def buy_subscription_handler(callback: CallbackQuery):
         
         # Админу не нужно покупать подписку
         if user_id == ADMIN_ID:
-            from database import set_subscription
             set_subscription(user_id, 1)
             
             subscription_text = (
@@ -335,7 +608,6 @@ async def buy_subscription_handler(callback: CallbackQuery):
             return
         
         # Для обычных пользователей показываем цены из БД
-        from database import get_subscription_prices
         prices = get_subscription_prices()
         
         period_names = {'day': 'День', 'week': 'Неделя', 'month': 'Месяц'}
@@ -355,7 +627,6 @@ async def buy_subscription_handler(callback: CallbackQuery):
         )
         
         # Создаем клавиатуру с выбором периода
-        from keyboards.main import subscription_periods_keyboard
         try:
             await callback.message.edit_caption(
                 caption=subscription_text,
@@ -393,7 +664,6 @@ async def subscribe_period_handler(callback: CallbackQuery):
         period = callback.data.split("_")[1] # subscribe_day, subscribe_week, subscribe_month
         
         # Получаем цену из БД
-        from database import get_subscription_prices
         prices = get_subscription_prices()
         amount = prices.get(period, 1.0) # Дефолт 1.0 USDT если не найдено
         
@@ -414,7 +684,7 @@ async def subscribe_period_handler(callback: CallbackQuery):
             hash = invoice.get("hash")
             
             # Сохраняем инвойс в базу данных с информацией о периоде
-            add_invoice(user_id, invoice_id, hash, amount, "USDT")
+            add_invoice(user_id, invoice_id, hash, amount, "USDT", period, period_days)
             
             period_names = {'day': 'день', 'week': 'неделю', 'month': 'месяц'}
             period_name = period_names.get(period, period)
@@ -426,7 +696,6 @@ async def subscribe_period_handler(callback: CallbackQuery):
                 f"Нажмите кнопку ниже для оплаты:"
             )
             
-            from keyboards.main import invoice_keyboard
             try:
                 await callback.message.edit_caption(
                     caption=payment_text,
@@ -495,12 +764,13 @@ async def back_to_main_handler(callback: CallbackQuery):
 @router.callback_query(F.data == "pay_via_cryptobot")
 async def pay_via_cryptobot_handler(callback: CallbackQuery):
     try:
-        from handlers.admin import SUBSCRIPTION_PRICE
         user_id = callback.from_user.id
+        # Старая кнопка оплаты без выбора периода - оплачивается месяц
+        amount = get_subscription_prices().get('month', 1.0)
         
         # Создаем инвойс через CryptoBot
         invoice = await create_invoice(
-            amount=SUBSCRIPTION_PRICE,
+            amount=amount,
             currency="USDT",
             description="Подписка Crypto Tracker Bot"
         )
@@ -511,16 +781,15 @@ async def pay_via_cryptobot_handler(callback: CallbackQuery):
             hash = invoice.get("hash")
             
             # Сохраняем инвойс в базу данных
-            add_invoice(user_id, invoice_id, hash, SUBSCRIPTION_PRICE, "USDT")
+            add_invoice(user_id, invoice_id, hash, amount, "USDT", "month", 30)
             
             payment_text = (
                 f"💳 <b>Оплата подписки</b>\n\n"
-                f"💰 Сумма: <b>{SUBSCRIPTION_PRICE} USDT</b>\n"
+                f"💰 Сумма: <b>{amount} USDT</b>\n"
                 f"🆔 Номер заказа: <code>{invoice_id}</code>\n\n"
                 f"Нажмите кнопку ниже для оплаты:"
             )
             
-            from keyboards.main import invoice_keyboard
             try:
                 # Используем edit_caption, так как сообщение с фото
                 await callback.message.edit_caption(
@@ -605,7 +874,6 @@ async def check_payment_handler(callback: CallbackQuery):
                 "Пожалуйста, создайте новый платеж."
             )
             
-            from keyboards.main import welcome_keyboard
             has_subscription = is_subscribed(user_id)
             try:
                 await callback.message.edit_text(
@@ -633,7 +901,6 @@ async def check_payment_handler(callback: CallbackQuery):
                 "Пожалуйста, попробуйте позже."
             )
             
-            from keyboards.main import payment_keyboard
             try:
                 await callback.message.edit_text(
                     text=check_text,
@@ -653,33 +920,16 @@ async def check_payment_handler(callback: CallbackQuery):
         
         if status in ['paid', 'confirmed']:
             # Оплата прошла успешно - активируем подписку
-            # Определяем период подписки по сумме (упрощенный способ)
-            # В реальном приложении лучше хранить период в invoices таблице
-            from database import get_subscription_prices
-            prices = get_subscription_prices()
-            
-            # Находим период по сумме
-            period_days_map = {'day': 1, 'week': 7, 'month': 30}
-            period = 'month' # дефолт
-            for p, price in prices.items():
-                if abs(float(amount) - price) < 0.001: # Сравнение float
-                    period = p
-                    break
-                    
-            period_days = period_days_map.get(period, 30)
-            
-            set_subscription(user_id, 1, period_days)
+            # (та же логика, что и у фоновой сверки инвойсов и вебхука)
+            result = apply_paid_invoice(invoice_id)
+            if result is None:
+                # Инвойс уже применен фоновой сверкой или вебхуком
+                await callback.answer("✅ Подписка уже активирована", show_alert=True)
+                return
+            _, period, period_days = result
+            period_name = PERIOD_NAMES.get(period, period)
+            success_text = activation_text(period, period_days)
             
-            period_names = {'day': 'день', 'week': 'неделю', 'month': 'месяц'}
-            period_name = period_names.get(period, period)
-            
-            success_text = (
-                f"✅ <b>Подписка на {period_name} активирована!</b>\n\n"
-                "🎉 Поздравляем! Ваша подписка успешно активирована.\n"
-                f"Теперь вы можете отслеживать криптовалюты на протяжении {period_days} дней."
-            )
-            
-            from keyboards.main import subscription_success_keyboard
             try:
                 await callback.message.edit_text(
                     text=success_text,
@@ -701,8 +951,6 @@ async def check_payment_handler(callback: CallbackQuery):
             
             logger.info(f"Подписка на {period_name} ({period_days} дней) активирована для пользователя {user_id}")
             
-            logger.info(f"Подписка активирована для пользователя {user_id}")
-            
         elif status == 'active':
             # Платеж еще не оплачен
             check_text = (
@@ -711,7 +959,6 @@ async def check_payment_handler(callback: CallbackQuery):
                 "Пожалуйста, завершите оплату и нажмите кнопку проверки снова."
             )
             
-            from keyboards.main import invoice_keyboard
             pay_url = invoice_status.get("pay_url", "")
             try:
                 await callback.message.edit_text(
@@ -734,7 +981,6 @@ async def check_payment_handler(callback: CallbackQuery):
                 "Пожалуйста, создайте новый платеж."
             )
             
-            from keyboards.main import welcome_keyboard
             has_subscription = is_subscribed(user_id)
             try:
                 await callback.message.edit_text(
@@ -756,7 +1002,6 @@ async def check_payment_handler(callback: CallbackQuery):
                 "Пожалуйста, попробуйте позже."
             )
             
-            from keyboards.main import payment_keyboard
             try:
                 await callback.message.edit_text(
                     text=check_text,
@@ -799,7 +1044,6 @@ async def cancel_payment_handler(callback: CallbackQuery):
                 "Вы можете создать новый платеж в любое время."
             )
             
-            from keyboards.main import welcome_keyboard
             try:
                 await callback.message.edit_text(
                     text=cancel_text,
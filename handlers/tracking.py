@@ -5,6 +5,7 @@ from aiogram.types import CallbackQuery
 from database import set_tracking, get_user_settings, is_subscribed
 from services.crypto_api import get_crypto_price
 from keyboards.main import tracking_menu_keyboard
+from utils.currency import format_price
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -18,7 +19,10 @@ async def track_currency_handler(callback: CallbackQuery):
         return
         
     symbol = callback.data.split("_")[1]
-    price = await get_crypto_price(symbol)
+    user_settings = get_user_settings(callback.from_user.id)
+    quote = user_settings['quote']
+    # Начальная цена отслеживания - текущая, а не из снимка фоновой проверки
+    price = await get_crypto_price(symbol, quote, use_cache=False)
     
     if price:
         set_tracking(callback.from_user.id, symbol, price)
@@ -31,12 +35,10 @@ async def track_currency_handler(callback: CallbackQuery):
             "XRP": "Ripple"
         }
         
-        user_settings = get_user_settings(callback.from_user.id)
-        
         text = (
             f"✅ <b>Отслеживание начато!</b>\n\n"
             f"📊 Валюта: <b>{currency_names.get(symbol, symbol)} ({symbol})</b>\n"
-            f"💰 Текущая цена: <b>${price:.2f}</b>\n"
+            f"💰 Текущая цена: <b>{format_price(price, quote)}</b>\n"
             f"⏱ Интервал: <b>{user_settings['interval']} минут</b>\n"
             f"📊 Порог: <b>{user_settings['threshold']}%</b>\n\n"
             f"🔔 Вы будете получать уведомления в <b>{user_settings['format']}</b> формате."
@@ -60,7 +62,7 @@ async def track_currency_handler(callback: CallbackQuery):
                 logger.error(f"Ошибка при отправке нового сообщения: {e2}")
                 await callback.answer("✅ Отслеживание начато!", show_alert=True)
         
-        logger.info(f"Пользователь {callback.from_user.id} начал отслеживать {symbol} по цене ${price:.2f}")
+        logger.info(f"Пользователь {callback.from_user.id} начал отслеживать {symbol} по цене {format_price(price, quote)}")
     else:
         await callback.answer("❌ Ошибка получения цены", show_alert=True)
         logger.error(f"Ошибка получения цены для {symbol} у пользователя {callback.from_user.id}")
@@ -1,12 +1,23 @@
 # keyboards/main.py
 
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from utils.currency import QUOTE_CURRENCIES, format_price
+
+# Поддерживаемые криптовалюты: (название кнопки, символ)
+CURRENCIES = [
+    ("₿ Bitcoin (BTC)", "BTC"),
+    ("Ξ Ethereum (ETH)", "ETH"),
+    ("BNB Binance Coin (BNB)", "BNB"),
+    ("SOL Solana (SOL)", "SOL"),
+    ("XRP Ripple (XRP)", "XRP")
+]
 
 def welcome_keyboard(has_subscription=False):
     """Клавиатура для приветственного сообщения"""
     if has_subscription:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="📊 Выбрать валюту", callback_data="choose_currency")],
+            [InlineKeyboardButton(text="🎯 Ценовые уровни", callback_data="price_alerts")],
             [InlineKeyboardButton(text="👤 Профиль", callback_data="profile")],
             [InlineKeyboardButton(text="❓ Как это работает?", callback_data="how_it_works")],
             [InlineKeyboardButton(text="⚙️ Настройки", callback_data="settings")]
@@ -61,14 +72,7 @@ def invoice_keyboard(invoice_url: str):
 
 def currency_keyboard():
     """Клавиатура выбора валют"""
-    currencies = [
-        ("₿ Bitcoin (BTC)", "BTC"),
-        ("Ξ Ethereum (ETH)", "ETH"),
-        ("BNB Binance Coin (BNB)", "BNB"),
-        ("SOL Solana (SOL)", "SOL"),
-        ("XRP Ripple (XRP)", "XRP")
-    ]
-    buttons = [[InlineKeyboardButton(text=name, callback_data=f"track_{symbol}")] for name, symbol in currencies]
+    buttons = [[InlineKeyboardButton(text=name, callback_data=f"track_{symbol}")] for name, symbol in CURRENCIES]
     buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -92,11 +96,41 @@ def my_tracking_keyboard():
     ])
     return keyboard
 
+def price_alerts_keyboard(alerts):
+    """Клавиатура списка ценовых уровней с кнопками удаления"""
+    buttons = []
+    for alert_id, symbol, target_price, direction, quote in alerts:
+        sign = "≥" if direction == 'above' else "≤"
+        buttons.append([InlineKeyboardButton(
+            text=f"❌ {symbol} {sign} {format_price(target_price, quote)}",
+            callback_data=f"alert_del_{alert_id}"
+        )])
+    buttons.append([InlineKeyboardButton(text="➕ Добавить уровень", callback_data="alert_add")])
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def alert_currency_keyboard():
+    """Клавиатура выбора валюты для ценового уровня"""
+    buttons = [[InlineKeyboardButton(text=name, callback_data=f"alert_symbol_{symbol}")] for name, symbol in CURRENCIES]
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="price_alerts")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def alert_cancel_keyboard():
+    """Клавиатура отмены ввода ценового уровня"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="❌ Отменить", callback_data="alert_cancel")]
+    ])
+    return keyboard
+
 def settings_keyboard():
     """Клавиатура настроек"""
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="⏱ Интервал уведомлений", callback_data="settings_interval")],
         [InlineKeyboardButton(text="📊 Порог изменения цены", callback_data="settings_threshold")],
+        [InlineKeyboardButton(text="🕒 Изменение за период", callback_data="settings_window")],
+        [InlineKeyboardButton(text="📉 Индикаторы (EMA/волатильность)", callback_data="settings_indicators")],
+        [InlineKeyboardButton(text="📰 Ежедневная сводка", callback_data="settings_digest")],
+        [InlineKeyboardButton(text="💱 Валюта котировки", callback_data="settings_quote")],
         [InlineKeyboardButton(text="📝 Формат уведомлений", callback_data="settings_format")],
         [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main")]
     ])
@@ -129,6 +163,58 @@ def threshold_settings_keyboard():
     buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="settings")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def window_settings_keyboard():
+    """Клавиатура выбора длины окна для уведомлений об изменении за период"""
+    windows = [
+        ("15 минут", 15),
+        ("30 минут", 30),
+        ("1 час", 60),
+        ("4 часа", 240),
+        ("🚫 Выключить", 0)
+    ]
+    buttons = [[InlineKeyboardButton(text=name, callback_data=f"set_window_{minutes}")] for name, minutes in windows]
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="settings")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def window_threshold_settings_keyboard():
+    """Клавиатура выбора порога изменения за период"""
+    thresholds = [
+        ("1%", 1.0),
+        ("2%", 2.0),
+        ("3%", 3.0),
+        ("5%", 5.0),
+        ("10%", 10.0)
+    ]
+    buttons = [[InlineKeyboardButton(text=name, callback_data=f"set_wthreshold_{value}")] for name, value in thresholds]
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="settings_window")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def indicator_settings_keyboard():
+    """Клавиатура выбора уведомлений по индикаторам"""
+    modes = [
+        ("Пересечение EMA", "ema"),
+        ("Всплеск волатильности", "volatility"),
+        ("Все сигналы", "all"),
+        ("🚫 Выключить", "off")
+    ]
+    buttons = [[InlineKeyboardButton(text=name, callback_data=f"set_indicators_{mode}")] for name, mode in modes]
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="settings")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def digest_settings_keyboard():
+    """Клавиатура выбора времени ежедневной сводки"""
+    hours = [7, 9, 12, 18, 21]
+    buttons = [[InlineKeyboardButton(text=f"{hour:02d}:00", callback_data=f"set_digest_{hour}")] for hour in hours]
+    buttons.append([InlineKeyboardButton(text="🚫 Выключить", callback_data="set_digest_off")])
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="settings")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def quote_settings_keyboard():
+    """Клавиатура выбора валюты котировки"""
+    buttons = [[InlineKeyboardButton(text=quote, callback_data=f"set_quote_{quote}")] for quote in QUOTE_CURRENCIES]
+    buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data="settings")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 def format_settings_keyboard():
     """Клавиатура выбора формата уведомлений"""
     formats = [
@@ -0,0 +1,46 @@
+# middlewares/concurrency.py
+
+import asyncio
+from aiogram import BaseMiddleware
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничение числа одновременно обрабатываемых обновлений
+
+    Лишние обновления ждут своей очереди на семафоре. Счетчик обновлений
+    в работе позволяет дождаться их завершения при остановке бота.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    async def __call__(self, handler, event, data):
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+
+    async def wait_idle(self, timeout):
+        """Дождаться завершения обновлений в работе, вернуть True если успели"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Не дождались завершения {self._in_flight} обновлений за {timeout} с")
+            return False
@@ -0,0 +1,30 @@
+# middlewares/telegram_metrics.py
+
+import time
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from utils.metrics import TELEGRAM_REQUEST_SECONDS, TELEGRAM_REQUESTS
+from utils.tracing import add_span
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Число, результат и задержка запросов к Bot API по методам (sendMessage, getUpdates...)"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started_at = time.perf_counter()
+        try:
+            response = await make_request(bot, method)
+        except TelegramRetryAfter:
+            TELEGRAM_REQUESTS.inc(name, "retry_after")
+            raise
+        except Exception:
+            TELEGRAM_REQUESTS.inc(name, "error")
+            raise
+        else:
+            TELEGRAM_REQUESTS.inc(name, "ok")
+            return response
+        finally:
+            elapsed = time.perf_counter() - started_at
+            TELEGRAM_REQUEST_SECONDS.observe(name, value=elapsed)
+            add_span("telegram", name, elapsed)
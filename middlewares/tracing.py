@@ -0,0 +1,65 @@
+# middlewares/tracing.py
+
+import json
+from collections import deque
+from aiogram import BaseMiddleware
+from config import TRACE_SLOW_SECONDS, TRACE_FILE, TRACE_FILE_MAX_BYTES
+from utils.logger import get_file_logger
+from utils.metrics import HANDLER_SECONDS, HANDLER_SPAN_SECONDS
+from utils.tracing import start_trace, end_trace, current_trace
+
+# Последние медленные обновления для команды /slow
+slow_traces = deque(maxlen=50)
+
+# Файл медленных трасс (JSON по строке на обновление), отдельно от общего лога
+_trace_log = get_file_logger("traces", TRACE_FILE, TRACE_FILE_MAX_BYTES) if TRACE_FILE else None
+
+
+def _handler_name(handler_object):
+    callback = handler_object.callback
+    return f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Время обработки обновления по обработчикам с разбивкой на БД, HTTP и Bot API
+
+    Внешний middleware обновлений открывает трассу; имя обработчика в нее
+    записывает HandlerNameMiddleware, который видит выбранный обработчик.
+    """
+
+    def __init__(self, slow_threshold=TRACE_SLOW_SECONDS):
+        self.slow_threshold = slow_threshold
+
+    async def __call__(self, handler, event, data):
+        trace, token = start_trace(event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            end_trace(token)
+            duration = trace.finish()
+            HANDLER_SECONDS.observe(trace.handler, value=duration)
+            for kind, seconds in trace.totals.items():
+                HANDLER_SPAN_SECONDS.observe(trace.handler, kind, value=seconds)
+            if duration >= self.slow_threshold:
+                slow_traces.append(trace)
+                if _trace_log is not None:
+                    _trace_log.info(json.dumps(trace.to_dict(), ensure_ascii=False))
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Записать в текущую трассу имя выбранного обработчика"""
+
+    async def __call__(self, handler, event, data):
+        trace = current_trace()
+        if trace is not None:
+            trace.handler = _handler_name(data["handler"])
+        return await handler(event, data)
+
+
+def setup_tracing(dp):
+    """Подключить трассировку: обновления целиком и имена обработчиков сообщений и кнопок"""
+    dp.update.outer_middleware(TracingMiddleware())
+    # Внутренние middleware диспетчера действуют и во вложенных роутерах
+    name_middleware = HandlerNameMiddleware()
+    dp.message.middleware(name_middleware)
+    dp.callback_query.middleware(name_middleware)
@@ -0,0 +1,77 @@
+# services/background.py
+
+from aiogram import Bot
+from config import ADMIN_ID, CRYPTO_PAY_WEBHOOK_PORT, WORKER_SHARDS, LEADER_ELECTION
+from services import profiling
+from services.fanout import safe_send
+from services.notifications import check_price_changes, subscribe_events
+from services.digest import run_daily_digest
+from services.payments import reconcile_invoices, sweep_stale_invoices
+from services.price_levels import load_price_levels
+from services.supervisor import supervisor
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Шарды (multiprocessing), выбор лидера и вебхук Crypto Pay (aiohttp.web) импортируются,
+# только когда включены: остальным конфигурациям они не нужны при старте
+
+
+async def start_background_tasks(bot: Bot):
+    """Зарегистрировать и запустить фоновые задачи: опрос цен, сводки, сверку и очистку инвойсов"""
+    if WORKER_SHARDS == 1:
+        subscribe_events()
+
+    jobs = _leader_jobs(bot)
+    if LEADER_ELECTION:
+        from services.leader import LeaderElection, create_lease_backend
+        # Задачи выполняет только реплика, удерживающая аренду
+        election = LeaderElection(create_lease_backend())
+        _subscribe_profiling(bot, lambda: election.is_leader)
+        supervisor.add("leader_election", lambda: election.run(jobs))
+        # Задачи лидера работают в группе выбора лидера - в метриках они видны вместе с остальными
+        supervisor.add_health_source(election.health)
+    else:
+        _subscribe_profiling(bot)
+        for name, factory in jobs:
+            supervisor.add(name, factory)
+    supervisor.start()
+
+    # Встроенный сервер для вебхуков Crypto Pay (мгновенная активация оплаты).
+    # Активация идемпотентна, поэтому вебхук принимают все реплики
+    if CRYPTO_PAY_WEBHOOK_PORT:
+        from services.payment_webhook import start_payment_webhook
+        runner = await start_payment_webhook(bot)
+        supervisor.on_shutdown(runner.cleanup)
+
+def _subscribe_profiling(bot: Bot, runs_ticks=None):
+    """Профилирование тиков по команде администратора: тики идут в этом процессе"""
+    async def notify(text):
+        await safe_send(bot, ADMIN_ID, text)
+
+    # С шардами здесь только получение и рассылка снимка цен, проверку условий шарды профилируют сами
+    target = "ticks-coordinator" if WORKER_SHARDS > 1 else "ticks"
+    profiling.subscribe_tick_requests(notify, target, runs_ticks)
+
+def _leader_jobs(bot: Bot):
+    """Задачи, которые должны выполняться в одном экземпляре: [(имя, factory)]"""
+    if WORKER_SHARDS > 1:
+        from services.shards import run_sharded_poller
+        # Проверку условий выполняют процессы-шарды, здесь - только снимок цен и координация
+        poller = lambda: run_sharded_poller(WORKER_SHARDS)
+    else:
+        poller = _run_price_poller(bot)
+
+    return [
+        ("price_poller", poller),
+        ("daily_digest", lambda: run_daily_digest(bot)),
+        ("invoice_reconciler", lambda: reconcile_invoices(bot)),
+        ("invoice_sweeper", sweep_stale_invoices),
+    ]
+
+def _run_price_poller(bot: Bot):
+    async def run():
+        # Уровни перечитываются при каждом (пере)запуске: индекс мог устареть
+        load_price_levels()
+        await check_price_changes(bot)
+    return run
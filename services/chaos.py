@@ -0,0 +1,236 @@
+# services/chaos.py
+#
+# Слой отказов внешних API для экспериментов: задержки, таймауты, ответы
+# 429/5xx и испорченный JSON для CryptoCompare, Crypto Pay и Bot API.
+# Включается файлом CHAOS_CONFIG (JSON), без него ничего не подменяется:
+#
+#   {
+#     "seed": 1,
+#     "cryptocompare": {"latency": {"dist": "lognormal", "median": 0.2, "sigma": 1.0},
+#                       "timeout": 0.02, "status": {"429": 0.05, "502": 0.05}, "malformed": 0.02},
+#     "cryptopay": {"latency": {"dist": "uniform", "min": 0.1, "max": 2}},
+#     "telegram": {"latency": {"dist": "exponential", "mean": 0.05},
+#                  "status": {"429": 0.1, "500": 0.01}, "retry_after": 1, "hang": 5}
+#   }
+#
+# latency - распределение задержки: fixed (value), uniform (min, max),
+# lognormal (median, sigma) или exponential (mean). timeout, malformed и
+# status - вероятности отказа на запрос. timeout - запрос висит до таймаута
+# клиента (или hang секунд) и завершается ошибкой таймаута; malformed -
+# настоящий ответ с обрезанным телом.
+
+import asyncio
+import json
+import math
+import random
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    ClientDecodeError, TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+)
+from config import CHAOS_CONFIG
+from utils.logger import get_logger
+from utils.metrics import CHAOS_FAULTS
+
+logger = get_logger(__name__)
+
+PROVIDERS = ("cryptocompare", "cryptopay", "telegram")
+DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "exponential")
+
+
+class FaultSpec:
+    """Отказы одного внешнего API"""
+
+    def __init__(self, provider, spec, rnd):
+        self.provider = provider
+        self.latency = spec.get("latency")
+        self.timeout = float(spec.get("timeout", 0))
+        self.status = {int(code): float(p) for code, p in spec.get("status", {}).items()}
+        self.malformed = float(spec.get("malformed", 0))
+        self.hang = spec.get("hang")
+        self.retry_after = int(spec.get("retry_after", 1))
+        self._random = rnd
+        if self.latency is not None and self.latency.get("dist") not in DISTRIBUTIONS:
+            raise ValueError(f"CHAOS_CONFIG: неизвестное распределение задержки {provider}: {self.latency.get('dist')}")
+        if self.timeout + sum(self.status.values()) + self.malformed > 1:
+            raise ValueError(f"CHAOS_CONFIG: сумма вероятностей отказов {provider} больше 1")
+
+    def delay(self):
+        """Задержка запроса по распределению, секунды"""
+        latency = self.latency
+        if latency is None:
+            return 0.0
+        dist = latency["dist"]
+        if dist == "fixed":
+            return float(latency["value"])
+        if dist == "uniform":
+            return self._random.uniform(latency["min"], latency["max"])
+        if dist == "lognormal":
+            return self._random.lognormvariate(math.log(latency["median"]), latency.get("sigma", 1.0))
+        return self._random.expovariate(1 / latency["mean"])
+
+    def pick(self):
+        """Отказ для очередного запроса: None, "timeout", "malformed" или код статуса"""
+        roll = self._random.random()
+        for fault, probability in (("timeout", self.timeout), *self.status.items(), ("malformed", self.malformed)):
+            if roll < probability:
+                CHAOS_FAULTS.inc(self.provider, str(fault))
+                return fault
+            roll -= probability
+        return None
+
+
+def load_chaos(path=CHAOS_CONFIG):
+    """Отказы по внешним API {provider: FaultSpec} из JSON-файла (пусто - слой выключен)"""
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    unknown = set(config) - set(PROVIDERS) - {"seed"}
+    if unknown:
+        raise ValueError(f"CHAOS_CONFIG: неизвестные API {', '.join(sorted(unknown))}")
+    rnd = random.Random(config.get("seed"))
+    specs = {provider: FaultSpec(provider, config[provider], rnd) for provider in PROVIDERS if provider in config}
+    logger.warning(f"⚠️ Включен слой отказов внешних API ({path}): {', '.join(specs) or 'без отказов'}")
+    return specs
+
+
+faults = load_chaos()
+
+
+class _FaultResponse:
+    """Ответ с ошибкой вместо запроса к API"""
+
+    def __init__(self, status, retry_after):
+        self.status = status
+        self.ok = False
+        self.reason = "Chaos"
+        self.headers = {"Retry-After": str(retry_after)} if status == 429 else {}
+        self._body = json.dumps({"ok": False, "error_code": status, "description": "chaos"})
+
+    async def text(self, **kwargs):
+        return self._body
+
+    async def json(self, **kwargs):
+        return json.loads(self._body)
+
+    def release(self):
+        pass
+
+
+class _MalformedResponse:
+    """Настоящий ответ API с обрезанным телом"""
+
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    async def text(self, **kwargs):
+        body = await self._response.text(**kwargs)
+        return body[:len(body) // 2]
+
+    async def json(self, **kwargs):
+        return json.loads(await self.text())
+
+
+class _ChaosRequest:
+    """Запрос сессии с задержкой и отказами; используется как async with"""
+
+    def __init__(self, session, spec, method, url, kwargs):
+        self._session = session
+        self._spec = spec
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+        self._request = None
+
+    def _timeout(self):
+        timeout = self._kwargs.get("timeout") or self._session.timeout
+        return timeout.total
+
+    async def _enter(self):
+        spec = self._spec
+        fault = spec.pick()
+        await asyncio.sleep(spec.delay())
+        if fault == "timeout":
+            # Без hang запрос висит до таймаута клиента, как зависшее соединение
+            await asyncio.sleep(spec.hang if spec.hang is not None else math.inf)
+            raise asyncio.TimeoutError()
+        if isinstance(fault, int):
+            return _FaultResponse(fault, spec.retry_after)
+        self._request = self._session.request(self._method, self._url, **self._kwargs)
+        response = await self._request.__aenter__()
+        return _MalformedResponse(response) if fault == "malformed" else response
+
+    async def __aenter__(self):
+        # Задержка слоя входит в таймаут запроса
+        return await asyncio.wait_for(self._enter(), self._timeout())
+
+    async def __aexit__(self, *exc_info):
+        if self._request is not None:
+            await self._request.__aexit__(*exc_info)
+
+
+class ChaosSession:
+    """Обертка общей сессии aiohttp: запросы к API из CHAOS_CONFIG проходят через отказы"""
+
+    def __init__(self, session, provider_of):
+        self._session = session
+        self._provider_of = provider_of
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method, url, **kwargs):
+        spec = faults.get(self._provider_of(url))
+        if spec is None:
+            return self._session.request(method, url, **kwargs)
+        return _ChaosRequest(self._session, spec, method, url, kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+def wrap_session(session, provider_of):
+    """Сессия с отказами, если они настроены для API общей сессии, иначе сама сессия"""
+    if not faults.keys() - {"telegram"}:
+        return session
+    return ChaosSession(session, provider_of)
+
+
+class ChaosRequestMiddleware(BaseRequestMiddleware):
+    """Отказы Bot API: те же исключения, что aiogram выбрасывает на настоящие ответы"""
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    async def __call__(self, make_request, bot, method):
+        spec = self.spec
+        fault = spec.pick()
+        timeout = bot.session.timeout
+        delay = spec.delay()
+        if fault == "timeout" or delay >= timeout:
+            await asyncio.sleep(min(spec.hang if spec.hang is not None else timeout, timeout))
+            raise TelegramNetworkError(method=method, message="Request timeout error")
+        await asyncio.sleep(delay)
+        if fault == 429:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests (chaos)", retry_after=spec.retry_after)
+        if isinstance(fault, int) and fault >= 500:
+            raise TelegramServerError(method=method, message=f"Server error {fault} (chaos)")
+        if isinstance(fault, int):
+            raise TelegramBadRequest(method=method, message=f"Bad Request {fault} (chaos)")
+        response = await make_request(bot, method)
+        if fault == "malformed":
+            raise ClientDecodeError("Failed to deserialize object", ValueError("chaos"), None)
+        return response
+
+
+def setup_bot_chaos(bot):
+    """Подключить отказы Bot API к сессии бота, если они заданы в CHAOS_CONFIG"""
+    spec = faults.get("telegram")
+    if spec is not None:
+        bot.session.middleware(ChaosRequestMiddleware(spec))
@@ -1,28 +1,158 @@
 # services/crypto_api.py
 
+import asyncio
 import aiohttp
-from config import CRYPTO_API_KEY
-from utils.logger import get_logger
+from config import CRYPTO_API_KEY, CRYPTOCOMPARE_API_URL, LOG_SAMPLE_INTERVAL, PRICE_REQUEST_TIMEOUT
+from services.http import get_session
+from services.storage import create_price_cache
+from utils.currency import DEFAULT_QUOTE
+from utils.logger import get_logger, LogSampler
 
 logger = get_logger(__name__)
+_price_log = LogSampler(LOG_SAMPLE_INTERVAL)
 
-async def get_crypto_price(symbol):
-    url = f"https://min-api.cryptocompare.com/data/price?fsym={symbol}&tsyms=USD&api_key={CRYPTO_API_KEY}"
+# Цену в обработчике ждет пользователь: зависший запрос обрывается раньше общего HTTP_TIMEOUT
+_price_timeout = aiohttp.ClientTimeout(total=PRICE_REQUEST_TIMEOUT)
+
+# Последние полученные цены (общие для реплик при STATE_BACKEND=redis/sqlite)
+price_cache = create_price_cache()
+
+async def _cache_get(pairs):
+    """Цены из кэша; недоступный кэш не мешает запросу к API"""
+    try:
+        return await price_cache.get_many(pairs)
+    except Exception as e:
+        logger.warning(f"Кэш цен недоступен: {e}")
+        return {}
+
+async def _cache_set(prices):
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    price = data.get("USD")
-                    if price is not None:
-                        logger.info(f"Получена цена {symbol}: {price} USD")
-                        return float(price)
-                    else:
-                        logger.error(f"Некорректные данные для {symbol}: {data}")
-                        return None
+        await price_cache.set_many(prices)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить кэш цен: {e}")
+
+async def get_crypto_price(symbol, quote=DEFAULT_QUOTE, use_cache=True):
+    """Цена валюты; с use_cache=True - из последнего снимка фоновой проверки, если он есть
+
+    Снимок может быть старше на PRICE_CACHE_TTL: где от цены зависит сохраняемое
+    значение (направление уровня, начальная цена отслеживания), нужен use_cache=False.
+    """
+    if use_cache:
+        cached = await _cache_get([(symbol, quote)])
+        if cached:
+            return cached[(symbol, quote)]
+    
+    url = f"{CRYPTOCOMPARE_API_URL}/price?fsym={symbol}&tsyms={quote}&api_key={CRYPTO_API_KEY}"
+    try:
+        session = get_session()
+        async with session.get(url, timeout=_price_timeout) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                price = data.get(quote)
+                if price is not None:
+                    if _price_log.allow(symbol):
+                        logger.info(f"Получена цена {symbol}: {price} {quote}")
+                    await _cache_set({(symbol, quote): float(price)})
+                    return float(price)
                 else:
-                    logger.error(f"HTTP ошибка {resp.status} для {symbol}")
+                    logger.error(f"Некорректные данные для {symbol}: {data}")
                     return None
+            else:
+                logger.error(f"HTTP ошибка {resp.status} для {symbol}")
+                return None
+    except asyncio.TimeoutError:
+        logger.error(f"Таймаут запроса цены {symbol} ({PRICE_REQUEST_TIMEOUT} с)")
+        return None
     except Exception as e:
         logger.error(f"Ошибка получения цены для {symbol}: {e}")
         return None
+
+async def get_crypto_prices(symbols, quotes=(DEFAULT_QUOTE,), use_cache=False):
+    """Цены нескольких валют во всех котировках одним запросом pricemulti
+
+    Возвращает {(symbol, quote): price}. Если для пары нет прямой котировки,
+    она выводится локально через кросс-курс к USD. С use_cache=True ответ
+    берется из кэша, если в нем есть все пары. Полученные цены всегда
+    записываются в кэш.
+    """
+    if not symbols:
+        return {}
+    if use_cache:
+        cached = await _cache_get([(symbol, quote) for symbol in symbols for quote in quotes])
+        if len(cached) == len(symbols) * len(set(quotes)):
+            return cached
+    tsyms = sorted(set(quotes) | {DEFAULT_QUOTE})
+    fsyms = ",".join(sorted(symbols))
+    url = f"{CRYPTOCOMPARE_API_URL}/pricemulti?fsyms={fsyms}&tsyms={','.join(tsyms)}&api_key={CRYPTO_API_KEY}"
+    try:
+        session = get_session()
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                logger.error(f"HTTP ошибка {resp.status} для {fsyms}")
+                return {}
+            data = await resp.json()
+    except asyncio.TimeoutError:
+        logger.error(f"Таймаут запроса цен {fsyms}")
+        return {}
+    except Exception as e:
+        logger.error(f"Ошибка получения цен для {fsyms}: {e}")
+        return {}
+
+    if not isinstance(data, dict) or data.get("Response") == "Error":
+        logger.error(f"Некорректные данные для {fsyms}: {data}")
+        return {}
+
+    prices = {
+        (symbol, quote): float(price)
+        for symbol, row in data.items() if isinstance(row, dict)
+        for quote, price in row.items() if price
+    }
+    _fill_cross_rates(prices, symbols, tsyms)
+    await _cache_set(prices)
+    logger.info(f"Получены цены {fsyms} в {len(tsyms)} котировках")
+    return prices
+
+def _fill_cross_rates(prices, symbols, quotes):
+    """Дополнить отсутствующие пары через таблицу курсов USD -> котировка"""
+    usd_rates = {}
+    for (symbol, quote), price in prices.items():
+        usd_price = prices.get((symbol, DEFAULT_QUOTE))
+        if quote != DEFAULT_QUOTE and usd_price and quote not in usd_rates:
+            usd_rates[quote] = price / usd_price
+    for symbol in symbols:
+        usd_price = prices.get((symbol, DEFAULT_QUOTE))
+        if not usd_price:
+            continue
+        for quote in quotes:
+            if (symbol, quote) not in prices and quote in usd_rates:
+                prices[(symbol, quote)] = usd_price * usd_rates[quote]
+
+async def get_daily_stats(symbols, quotes=(DEFAULT_QUOTE,)):
+    """Статистика за 24 часа для нескольких валют и котировок одним запросом"""
+    if not symbols:
+        return {}
+    fsyms = ",".join(sorted(symbols))
+    tsyms = ",".join(sorted(set(quotes)))
+    url = f"{CRYPTOCOMPARE_API_URL}/pricemultifull?fsyms={fsyms}&tsyms={tsyms}&api_key={CRYPTO_API_KEY}"
+    try:
+        session = get_session()
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                logger.error(f"HTTP ошибка {resp.status} при получении статистики {fsyms}")
+                return {}
+            data = await resp.json()
+    except Exception as e:
+        logger.error(f"Ошибка получения статистики для {fsyms}: {e}")
+        return {}
+
+    stats = {}
+    for symbol, row in data.get("RAW", {}).items():
+        for quote, raw in row.items():
+            stats[(symbol, quote)] = {
+                'price': float(raw.get("PRICE", 0)),
+                'change': float(raw.get("CHANGEPCT24HOUR", 0)),
+                'high': float(raw.get("HIGH24HOUR", 0)),
+                'low': float(raw.get("LOW24HOUR", 0))
+            }
+    logger.info(f"Получена статистика за 24 часа: {len(stats)} пар")
+    return stats
@@ -1,8 +1,8 @@
 # services/crypto_bot.py
 
-import aiohttp
 import json
 from config import CRYPTO_BOT_TOKEN
+from services.http import get_session
 from database import update_invoice_status
 from utils.logger import get_logger
 
@@ -32,36 +32,38 @@ async def create_invoice(amount: float, currency: str = "USDT", description: str
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"Ответ от CryptoBot API: {data}")
-                    if data.get("ok"):
-                        invoice = data.get("result")
-                        # Очищаем URL от лишних пробелов
-                        if invoice.get("pay_url"):
-                            invoice["pay_url"] = invoice["pay_url"].strip()
-                        logger.info(f"Создан инвойс: {invoice.get('invoice_id')}")
-                        return invoice
-                    else:
-                        error_name = data.get('error', {}).get('name', 'Unknown')
-                        error_message = data.get('error', {}).get('message', 'No message')
-                        logger.error(f"Ошибка создания инвойса: {error_name} - {error_message}")
-                        return None
+        session = get_session()
+        async with session.post(url, headers=headers, json=payload) as response:
+            if response.status == 200:
+                data = await response.json()
+                logger.info(f"Ответ от CryptoBot API: {data}")
+                if data.get("ok"):
+                    invoice = data.get("result")
+                    # Очищаем URL от лишних пробелов
+                    if invoice.get("pay_url"):
+                        invoice["pay_url"] = invoice["pay_url"].strip()
+                    logger.info(f"Создан инвойс: {invoice.get('invoice_id')}")
+                    return invoice
                 else:
-                    text = await response.text()
-                    logger.error(f"HTTP ошибка {response.status} при создании инвойса: {text}")
+                    error_name = data.get('error', {}).get('name', 'Unknown')
+                    error_message = data.get('error', {}).get('message', 'No message')
+                    logger.error(f"Ошибка создания инвойса: {error_name} - {error_message}")
                     return None
+            else:
+                text = await response.text()
+                logger.error(f"HTTP ошибка {response.status} при создании инвойса: {text}")
+                return None
     except Exception as e:
         logger.error(f"Ошибка при создании инвойса: {e}")
         return None
 
-async def check_invoice_status(invoice_id: str):
-    """Проверка статуса инвойса"""
+async def get_invoices(invoice_ids):
+    """Получить несколько инвойсов одним запросом getInvoices"""
     if not CRYPTO_BOT_TOKEN:
         logger.error("CRYPTO_BOT_TOKEN не установлен")
         return None
+    if not invoice_ids:
+        return []
         
     url = f"{CRYPTO_BOT_API_URL}/getInvoices"
     headers = {
@@ -70,45 +72,51 @@ async def check_invoice_status(invoice_id: str):
     }
     
     params = {
-        "invoice_ids": str(invoice_id)
+        "invoice_ids": ",".join(str(invoice_id) for invoice_id in invoice_ids),
+        "count": str(len(invoice_ids))
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"Ответ от CryptoBot API при проверке инвойса: {data}")
-                    if data.get("ok"):
-                        invoices = data.get("result", {}).get("items", [])
-                        if invoices:
-                            invoice = invoices[0]
-                            status = invoice.get("status")
-                            logger.info(f"Статус инвойса {invoice_id}: {status}")
-                            
-                            # Обновляем статус в базе данных
-                            if status in ['paid', 'confirmed']:
-                                update_invoice_status(invoice_id, status)
-                            
-                            return invoice
-                        else:
-                            logger.warning(f"Инвойс {invoice_id} не найден")
-                            return None
-                    else:
-                        error_name = data.get('error', {}).get('name', 'Unknown')
-                        error_message = data.get('error', {}).get('message', 'No message')
-                        logger.error(f"Ошибка проверки инвойса: {error_name} - {error_message}")
-                        return None
+        session = get_session()
+        async with session.get(url, headers=headers, params=params) as response:
+            if response.status == 200:
+                data = await response.json()
+                if data.get("ok"):
+                    return data.get("result", {}).get("items", [])
                 else:
-                    text = await response.text()
-                    logger.error(f"HTTP ошибка {response.status} при проверке инвойса: {text}")
+                    error_name = data.get('error', {}).get('name', 'Unknown')
+                    error_message = data.get('error', {}).get('message', 'No message')
+                    logger.error(f"Ошибка получения инвойсов: {error_name} - {error_message}")
                     return None
+            else:
+                text = await response.text()
+                logger.error(f"HTTP ошибка {response.status} при получении инвойсов: {text}")
+                return None
     except Exception as e:
-        logger.error(f"Ошибка при проверке инвойса: {e}")
+        logger.error(f"Ошибка при получении инвойсов: {e}")
+        return None
+
+async def check_invoice_status(invoice_id: str):
+    """Проверка статуса инвойса"""
+    invoices = await get_invoices([invoice_id])
+    if invoices is None:
+        return None
+    if not invoices:
+        logger.warning(f"Инвойс {invoice_id} не найден")
         return None
+        
+    invoice = invoices[0]
+    status = invoice.get("status")
+    logger.info(f"Статус инвойса {invoice_id}: {status}")
+    
+    # Фиксируем оплату в базе данных (active -> paid), применение - отдельным шагом
+    if status in ['paid', 'confirmed']:
+        update_invoice_status(invoice_id, 'paid', expected='active')
+    
+    return invoice
 
-async def cancel_invoice(invoice_id: str):
-    """Отмена инвойса"""
+async def cancel_invoice(invoice_id: str, local_status: str = 'cancelled'):
+    """Отмена инвойса (в БД ставится local_status, например 'expired' при очистке)"""
     if not CRYPTO_BOT_TOKEN:
         logger.error("CRYPTO_BOT_TOKEN не установлен")
         return False
@@ -124,24 +132,24 @@ async def cancel_invoice(invoice_id: str):
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"Ответ от CryptoBot API при отмене инвойса: {data}")
-                    if data.get("ok"):
-                        update_invoice_status(invoice_id, 'cancelled')
-                        logger.info(f"Инвойс {invoice_id} отменен")
-                        return True
-                    else:
-                        error_name = data.get('error', {}).get('name', 'Unknown')
-                        error_message = data.get('error', {}).get('message', 'No message')
-                        logger.error(f"Ошибка отмены инвойса: {error_name} - {error_message}")
-                        return False
+        session = get_session()
+        async with session.post(url, headers=headers, json=payload) as response:
+            if response.status == 200:
+                data = await response.json()
+                logger.info(f"Ответ от CryptoBot API при отмене инвойса: {data}")
+                if data.get("ok"):
+                    update_invoice_status(invoice_id, local_status, expected='active')
+                    logger.info(f"Инвойс {invoice_id} отменен")
+                    return True
                 else:
-                    text = await response.text()
-                    logger.error(f"HTTP ошибка {response.status} при отмене инвойса: {text}")
+                    error_name = data.get('error', {}).get('name', 'Unknown')
+                    error_message = data.get('error', {}).get('message', 'No message')
+                    logger.error(f"Ошибка отмены инвойса: {error_name} - {error_message}")
                     return False
+            else:
+                text = await response.text()
+                logger.error(f"HTTP ошибка {response.status} при отмене инвойса: {text}")
+                return False
     except Exception as e:
         logger.error(f"Ошибка при отмене инвойса: {e}")
         return False
@@ -0,0 +1,102 @@
+# services/digest.py
+
+from datetime import datetime
+from aiogram import Bot
+from config import DIGEST_SEND_WINDOW
+from database import get_digest_recipients, mark_digest_sent, get_tracking
+from services.crypto_api import get_daily_stats
+from services.fanout import send_spread
+from services import supervisor
+from utils.currency import format_price
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Сколько отправленных сводок отмечается в БД одним запросом
+MARK_BATCH_SIZE = 50
+
+
+async def run_daily_digest(bot: Bot):
+    """Фоновая задача ежедневной сводки по рынку"""
+    while True:
+        try:
+            await send_digests(bot, datetime.now())
+        except Exception as e:
+            logger.error(f"❌ Ошибка в задаче ежедневной сводки: {e}")
+        if await supervisor.sleep(60):
+            return
+
+async def send_digests(bot: Bot, now):
+    """Отправить сводку всем, у кого выбран текущий час и сводка еще не отправлена"""
+    today = now.date().isoformat()
+    recipients = get_digest_recipients(now.hour, today)
+    if not recipients:
+        return
+
+    user_symbols = {user_id: [row[0] for row in get_tracking(user_id)] for user_id, *_ in recipients}
+    symbols = {symbol for user_symbols_list in user_symbols.values() for symbol in user_symbols_list}
+    quotes = {quote or 'USD' for *_, quote in recipients}
+    stats = await get_daily_stats(symbols, quotes)
+
+    # Блок по символу строится один раз для каждой пары (котировка, формат)
+    blocks = {}
+    messages = []
+    for user_id, format_type, quote in recipients:
+        format_type = format_type or 'classic'
+        quote = quote or 'USD'
+        parts = []
+        for symbol in user_symbols[user_id]:
+            if (symbol, quote) not in stats:
+                continue
+            key = (symbol, quote, format_type)
+            if key not in blocks:
+                blocks[key] = format_digest_block(symbol, stats[(symbol, quote)], format_type, quote)
+            parts.append(blocks[key])
+        messages.append((user_id, assemble_digest(parts, now)))
+
+    logger.info(f"Ежедневная сводка: {len(messages)} получателей, {len(blocks)} блоков")
+
+    # Отправка отмечается пачками по мере рассылки: если задачу остановят посреди окна,
+    # следующий проход возьмет только тех, кому сводка еще не ушла. Неудачная отправка
+    # тоже отмечается - safe_send уже повторял попытку, заблокировавшим бота не пишем каждую минуту
+    done = []
+
+    def on_done(user_id, ok):
+        done.append(user_id)
+        if len(done) >= MARK_BATCH_SIZE:
+            mark_digest_sent(done, today)
+            done.clear()
+
+    try:
+        await send_spread(bot, messages, DIGEST_SEND_WINDOW, on_done=on_done)
+    finally:
+        if done:
+            mark_digest_sent(done, today)
+
+def format_digest_block(symbol, stat, format_type, quote='USD'):
+    """Блок сводки по одной валюте"""
+    change_symbol = "📈" if stat['change'] >= 0 else "📉"
+    if format_type == 'compact':
+        return f"{change_symbol} <b>{symbol}</b> {format_price(stat['price'], quote)} ({stat['change']:+.2f}%)"
+    if format_type == 'detailed':
+        # Подробный формат: отдельные строки и ширина диапазона за сутки
+        spread = (stat['high'] - stat['low']) / stat['low'] * 100 if stat['low'] else 0.0
+        return (
+            f"{change_symbol} <b>{symbol}</b>\n"
+            f"   💵 Цена: <code>{format_price(stat['price'], quote)}</code>\n"
+            f"   📊 За 24 часа: <b>{stat['change']:+.2f}%</b>\n"
+            f"   ⬆️ Макс: <code>{format_price(stat['high'], quote)}</code>\n"
+            f"   ⬇️ Мин: <code>{format_price(stat['low'], quote)}</code>\n"
+            f"   ↕️ Диапазон: {spread:.2f}%"
+        )
+    return (
+        f"{change_symbol} <b>{symbol}</b>: <code>{format_price(stat['price'], quote)}</code> ({stat['change']:+.2f}%)\n"
+        f"   ⬆️ Макс: <code>{format_price(stat['high'], quote)}</code>  ⬇️ Мин: <code>{format_price(stat['low'], quote)}</code>"
+    )
+
+def assemble_digest(parts, now):
+    """Собрать сводку пользователя из готовых блоков"""
+    header = f"📰 <b>Сводка по рынку за 24 часа</b> ({now.strftime('%d.%m.%Y')})\n\n"
+    if not parts:
+        return header + "ℹ️ Вы пока не отслеживаете ни одну валюту."
+    return header + "\n".join(parts)
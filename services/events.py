@@ -0,0 +1,117 @@
+# services/events.py
+#
+# Шина событий между процессом бота и воркером.
+#
+# Бот публикует события об изменениях, которые влияют на состояние воркера
+# в памяти (ценовые уровни, настройки пользователя). В одном процессе события
+# доставляются подписчикам напрямую, при разделении на бот и воркер - через
+# Unix-сокет (строки JSON). Данные при этом всегда лежат в SQLite, событие
+# лишь говорит воркеру обновить кэш.
+
+import asyncio
+import json
+import os
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Тип события -> список обработчиков
+_handlers = {}
+# Клиент сокета воркера (только в процессе бота при разделении)
+_client = None
+
+# Событие, после которого воркер перечитывает состояние из БД (мог пропустить события)
+RESYNC = "resync"
+
+
+def subscribe(event_type, handler):
+    """Подписать обработчик (обычную функцию или корутину) на событие"""
+    _handlers.setdefault(event_type, []).append(handler)
+
+def unsubscribe(event_type, handler):
+    """Отписать обработчик от события"""
+    handlers = _handlers.get(event_type, [])
+    if handler in handlers:
+        handlers.remove(handler)
+
+async def dispatch(event_type, data):
+    """Вызвать локальных подписчиков события"""
+    for handler in _handlers.get(event_type, ()):
+        try:
+            result = handler(**data)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки события {event_type}: {e}")
+
+async def publish(event_type, **data):
+    """Опубликовать событие: в воркер по сокету или локальным подписчикам"""
+    if _client is not None:
+        await _client.send(event_type, data)
+    else:
+        await dispatch(event_type, data)
+
+
+class EventClient:
+    """Отправка событий воркеру через Unix-сокет
+
+    Соединение открывается лениво и переоткрывается после обрыва. События,
+    которые не удалось доставить, не копятся: на каждое новое соединение воркер
+    отвечает RESYNC и перечитывает состояние из БД.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def send(self, event_type, data):
+        line = json.dumps({"type": event_type, "data": data}).encode() + b"\n"
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    _, self._writer = await asyncio.open_unix_connection(self.path)
+                self._writer.write(line)
+                await self._writer.drain()
+            except (OSError, ConnectionError) as e:
+                logger.warning(f"Воркер недоступен ({e}), событие {event_type} будет восполнено из БД")
+                self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def connect(path):
+    """Отправлять события воркеру через сокет path (процесс бота)"""
+    global _client
+    _client = EventClient(path)
+    logger.info(f"События отправляются воркеру через {path}")
+    return _client
+
+
+async def _serve_client(reader, writer):
+    # Новое соединение: бот мог перезапуститься и публиковать события без воркера
+    await dispatch(RESYNC, {})
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                event = json.loads(line)
+            except ValueError:
+                logger.warning("Пропущено некорректное событие")
+                continue
+            await dispatch(event.get("type"), event.get("data") or {})
+    finally:
+        writer.close()
+
+async def start_event_server(path):
+    """Принимать события от процессов бота на Unix-сокете path (процесс воркера)"""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(_serve_client, path=path)
+    logger.info(f"Воркер принимает события на {path}")
+    return server
@@ -0,0 +1,55 @@
+# services/fanout.py
+
+import asyncio
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Лимит Telegram на рассылку - около 30 сообщений в секунду
+MAX_MESSAGES_PER_SECOND = 25
+
+
+async def safe_send(bot: Bot, chat_id, text, reply_markup=None):
+    """Отправить сообщение, один раз повторив попытку после RetryAfter"""
+    for attempt in range(2):
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML", reply_markup=reply_markup)
+            return True
+        except TelegramRetryAfter as e:
+            logger.warning(f"Telegram просит подождать {e.retry_after} с (чат {chat_id})")
+            if attempt == 0:
+                await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            logger.error(f"❌ Ошибка отправки сообщения в чат {chat_id}: {e}")
+            return False
+    return False
+
+
+async def send_spread(bot: Bot, messages, window_seconds, max_per_second=MAX_MESSAGES_PER_SECOND, on_done=None):
+    """Разослать сообщения [(chat_id, text)], равномерно распределив их по окну
+
+    Интервал между отправками не меньше 1/max_per_second, поэтому при большом
+    количестве получателей рассылка может выйти за пределы окна. on_done(chat_id, ok)
+    вызывается после каждой попытки отправки.
+    """
+    if not messages:
+        return 0, 0
+    loop = asyncio.get_running_loop()
+    interval = max(window_seconds / len(messages), 1 / max_per_second)
+    start = loop.time()
+    sent = failed = 0
+    for i, (chat_id, text) in enumerate(messages):
+        delay = start + i * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        ok = await safe_send(bot, chat_id, text)
+        if ok:
+            sent += 1
+        else:
+            failed += 1
+        if on_done is not None:
+            on_done(chat_id, ok)
+    logger.info(f"Рассылка завершена: отправлено {sent}, ошибок {failed}")
+    return sent, failed
@@ -0,0 +1,72 @@
+# services/http.py
+
+import time
+import aiohttp
+from yarl import URL
+from config import HTTP_POOL_SIZE, HTTP_TIMEOUT, CRYPTOCOMPARE_API_URL
+from services import chaos
+from utils.metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_REQUESTS
+from utils.tracing import add_span
+
+# Общая сессия aiohttp: одно соединение на хост переиспользуется между запросами
+_session = None
+# Сессия для запросов: сама _session или ее обертка со слоем отказов (CHAOS_CONFIG)
+_client = None
+
+# Имена внешних API в метриках и CHAOS_CONFIG по хосту (включая заглушку CryptoCompare)
+PROVIDERS = {
+    URL(CRYPTOCOMPARE_API_URL).host: "cryptocompare",
+    "pay.crypt.bot": "cryptopay",
+}
+
+
+def _request_labels(url):
+    # Метод API - последний сегмент пути (без параметров запроса и ключей)
+    return PROVIDERS.get(url.host, url.host), url.path.rsplit("/", 1)[-1]
+
+async def _on_request_start(session, context, params):
+    context.started_at = time.perf_counter()
+
+async def _on_request_end(session, context, params):
+    provider, endpoint = _request_labels(params.url)
+    elapsed = time.perf_counter() - context.started_at
+    UPSTREAM_REQUEST_SECONDS.observe(provider, endpoint, value=elapsed)
+    add_span("http", f"{provider}.{endpoint}", elapsed)
+    UPSTREAM_REQUESTS.inc(provider, endpoint, str(params.response.status))
+
+async def _on_request_exception(session, context, params):
+    provider, endpoint = _request_labels(params.url)
+    elapsed = time.perf_counter() - context.started_at
+    UPSTREAM_REQUEST_SECONDS.observe(provider, endpoint, value=elapsed)
+    add_span("http", f"{provider}.{endpoint}", elapsed)
+    UPSTREAM_REQUESTS.inc(provider, endpoint, "error")
+
+def _provider(url):
+    return _request_labels(URL(url))[0]
+
+def _metrics_trace():
+    """Задержка и статусы запросов общей сессии для /metrics"""
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_request_end.append(_on_request_end)
+    trace.on_request_exception.append(_on_request_exception)
+    return trace
+
+def get_session():
+    """Общая сессия HTTP-клиента (создается при первом запросе)"""
+    global _session, _client
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            trace_configs=[_metrics_trace()]
+        )
+        _client = chaos.wrap_session(_session, _provider)
+    return _client
+
+async def close_session():
+    """Закрыть общую сессию (при остановке процесса)"""
+    global _session, _client
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = _client = None
@@ -0,0 +1,118 @@
+# services/indicators.py
+
+import math
+from collections import deque
+
+# Период EMA в тиках (тик = 3 минуты, EMA(20) ≈ 1 час)
+EMA_PERIOD = 20
+# Окно для стандартного отклонения доходностей (в тиках)
+VOLATILITY_WINDOW = 30
+# Всплеск: доходность тика больше VOLATILITY_SIGMA стандартных отклонений
+VOLATILITY_SIGMA = 3.0
+# Минимум наблюдений до первого сигнала волатильности
+VOLATILITY_MIN_SAMPLES = 10
+
+
+class EMA:
+    """Экспоненциальное скользящее среднее, обновление за O(1)"""
+
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, period):
+        self.alpha = 2 / (period + 1)
+        self.value = None
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class RollingStats:
+    """Среднее и дисперсия по скользящему окну (Welford с удалением), O(1) на точку"""
+
+    __slots__ = ("size", "_values", "mean", "_m2")
+
+    def __init__(self, size):
+        self.size = size
+        self._values = deque()
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def push(self, x):
+        values = self._values
+        if len(values) < self.size:
+            values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(values)
+            self._m2 += delta * (x - self.mean)
+        else:
+            # Окно заполнено: заменяем самую старую точку новой
+            old = values.popleft()
+            values.append(x)
+            old_mean = self.mean
+            self.mean += (x - old) / self.size
+            self._m2 += (x - old) * (x - self.mean + old - old_mean)
+            if self._m2 < 0:  # погрешность округления
+                self._m2 = 0.0
+
+    @property
+    def std(self):
+        n = len(self._values)
+        if n < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (n - 1))
+
+
+class SymbolIndicators:
+    """Потоковые индикаторы одного символа, обновляются один раз за тик"""
+
+    __slots__ = ("ema", "returns", "last_price", "period")
+
+    def __init__(self, period=EMA_PERIOD, window=VOLATILITY_WINDOW):
+        self.period = period
+        self.ema = EMA(period)
+        self.returns = RollingStats(window)
+        self.last_price = None
+
+    def update(self, price):
+        """Обновить индикаторы и вернуть сигналы: [(kind, old_price, new_price, change_percent, note)]"""
+        events = []
+        last_price = self.last_price
+        ema = self.ema.value
+
+        # Пересечение EMA: цена перешла на другую сторону средней
+        if ema is not None and last_price is not None:
+            if (last_price - ema) * (price - ema) < 0:
+                change_percent = abs((price - ema) / ema) * 100
+                events.append(('ema', ema, price, change_percent, f"— пересечение EMA({self.period})"))
+
+        # Всплеск волатильности сравниваем с распределением до текущего тика
+        if last_price:
+            ret = (price - last_price) / last_price * 100
+            std = self.returns.std
+            if len(self.returns) >= VOLATILITY_MIN_SAMPLES and std > 0 and abs(ret - self.returns.mean) > VOLATILITY_SIGMA * std:
+                events.append(('volatility', last_price, price, abs(ret), f"— всплеск волатильности (σ {std:.2f}%)"))
+            self.returns.push(ret)
+
+        self.ema.update(price)
+        self.last_price = price
+        return events
+
+
+class IndicatorEngine:
+    """Индикаторы по всем символам, общие для всех подписанных пользователей"""
+
+    def __init__(self):
+        self._symbols = {}
+
+    def update(self, symbol, price):
+        indicators = self._symbols.get(symbol)
+        if indicators is None:
+            indicators = self._symbols[symbol] = SymbolIndicators()
+        return indicators.update(price)
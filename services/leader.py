@@ -0,0 +1,117 @@
+# services/leader.py
+#
+# Выбор лидера среди реплик по аренде (lease). Лидер периодически продлевает
+# аренду; если он перестал это делать, по истечении срока аренду перехватывает
+# другая реплика. Фоновые задачи работают только пока аренда у этой реплики.
+
+import os
+import socket
+import time
+import uuid
+from config import LEADER_BACKEND, LEADER_LEASE_TTL, BACKGROUND_SHUTDOWN_TIMEOUT
+from database import acquire_lease, release_lease
+from services.supervisor import TaskSupervisor, sleep
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Имя аренды фоновых задач
+BACKGROUND_LEASE = "background"
+
+
+class SqliteLeaseBackend:
+    """Аренда в общей БД SQLite (реплики на одной машине или с общим томом)"""
+
+    def acquire(self, name, holder, ttl):
+        return acquire_lease(name, holder, ttl)
+
+    def release(self, name, holder):
+        release_lease(name, holder)
+
+
+class MemoryLeaseBackend:
+    """Аренда в памяти процесса: локальная замена для одного процесса и проверок"""
+
+    def __init__(self):
+        self._leases = {}  # name -> (holder, expires_at)
+
+    def acquire(self, name, holder, ttl):
+        now = time.time()
+        current = self._leases.get(name)
+        if current is None or current[0] == holder or current[1] < now:
+            self._leases[name] = (holder, now + ttl)
+            return True
+        return False
+
+    def release(self, name, holder):
+        if self._leases.get(name, (None,))[0] == holder:
+            del self._leases[name]
+
+
+LEASE_BACKENDS = {
+    "sqlite": SqliteLeaseBackend,
+    "memory": MemoryLeaseBackend,
+}
+
+
+def create_lease_backend(name=LEADER_BACKEND):
+    """Хранилище аренды по имени из конфигурации"""
+    if name not in LEASE_BACKENDS:
+        raise ValueError(f"Неизвестное хранилище аренды: {name}")
+    return LEASE_BACKENDS[name]()
+
+
+class LeaderElection:
+    """Удержание аренды и запуск задач лидера, пока аренда у этой реплики"""
+
+    def __init__(self, backend, name=BACKGROUND_LEASE, ttl=LEADER_LEASE_TTL, holder=None):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.group = None  # задачи лидера, пока аренда у этой реплики
+
+    def _try_acquire(self):
+        try:
+            return self.backend.acquire(self.name, self.holder, self.ttl)
+        except Exception as e:
+            # Не можем подтвердить аренду - считаем, что ее нет (лучше пропуск, чем дубли)
+            logger.error(f"❌ Ошибка продления аренды {self.name}: {e}")
+            return False
+
+    async def run(self, jobs):
+        """Пытаться стать лидером и держать задачи jobs [(имя, factory)] запущенными, пока аренда наша"""
+        try:
+            while True:
+                acquired = self._try_acquire()
+                if acquired and not self.is_leader:
+                    logger.info(f"Реплика {self.holder} стала лидером ({self.name})")
+                    self.is_leader = True
+                    self.group = TaskSupervisor(self.name)
+                    for name, factory in jobs:
+                        self.group.add(name, factory)
+                    self.group.start()
+                elif not acquired and self.is_leader:
+                    logger.warning(f"Реплика {self.holder} потеряла лидерство ({self.name}), задачи остановлены")
+                    self.is_leader = False
+                    # Новый лидер появится не раньше истечения аренды - успеваем остановиться
+                    await self.group.shutdown(timeout=self.ttl / 3)
+                    self.group = None
+                if await sleep(self.ttl / 3):
+                    break
+        finally:
+            if self.group is not None:
+                await self.group.shutdown(timeout=BACKGROUND_SHUTDOWN_TIMEOUT)
+                self.group = None
+            if self.is_leader:
+                self.is_leader = False
+                # Освобождаем аренду сразу, чтобы другая реплика не ждала истечения срока
+                try:
+                    self.backend.release(self.name, self.holder)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка освобождения аренды {self.name}: {e}")
+
+    def health(self):
+        """Состояние задач лидера (пусто, если реплика не лидер)"""
+        return {} if self.group is None else self.group.health()
@@ -0,0 +1,22 @@
+# services/media.py
+
+import os
+from aiogram.types import FSInputFile
+
+# file_id файлов, уже загруженных в Telegram: ключ - путь, время изменения и размер файла,
+# поэтому после замены файла он загружается заново
+file_ids = {}
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return f"{path}@{stat.st_mtime_ns}:{stat.st_size}"
+
+def photo(path):
+    """file_id загруженного ранее файла или сам файл для первой загрузки"""
+    return file_ids.get(_file_key(path)) or FSInputFile(path)
+
+def remember_photo(path, message):
+    """Запомнить file_id фото из отправленного сообщения"""
+    if message is not None and message.photo:
+        file_ids[_file_key(path)] = message.photo[-1].file_id
@@ -0,0 +1,51 @@
+# services/monitoring.py
+#
+# HTTP-сервер метрик Prometheus. Счетчики и гистограммы пишут модули
+# (utils.metrics), здесь - показатели, которые считаются при чтении метрик.
+
+import time
+from aiohttp import web
+from config import METRICS_HOST, METRICS_PORT, METRICS_CACHE_TTL
+from database import get_user_stats, get_tracking_count
+from services.price_levels import price_levels
+from services.supervisor import supervisor
+from utils.logger import get_logger
+from utils.metrics import Gauge, render_metrics
+
+logger = get_logger(__name__)
+
+
+def _cached(func, ttl=METRICS_CACHE_TTL):
+    """func() не чаще раза в ttl секунд: запросы к БД не выполняются на каждое чтение метрик"""
+    cache = [None, 0.0]  # значение, время расчета
+
+    def get():
+        now = time.monotonic()
+        if cache[0] is None or now - cache[1] >= ttl:
+            cache[0], cache[1] = func(), now
+        return cache[0]
+    return get
+
+
+Gauge("active_subscribers", "Пользователи с активной подпиской",
+      callback=_cached(lambda: get_user_stats()['subscribed']))
+Gauge("tracked_pairs_rows", "Строки отслеживания валют у всех пользователей",
+      callback=_cached(get_tracking_count))
+Gauge("price_levels_loaded", "Ценовые уведомления в памяти процесса",
+      callback=lambda: len(price_levels))
+Gauge("background_job_restarts", "Перезапуски фоновых задач процесса", ("job",),
+      callback=lambda: {(name,): job['restarts'] for name, job in supervisor.health().items()})
+
+
+async def metrics_handler(request: web.Request):
+    return web.Response(text=render_metrics(), content_type="text/plain; version=0.0.4", charset="utf-8")
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Запустить сервер /metrics, вернуть runner для остановки"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики Prometheus: http://{host}:{port}/metrics")
+    return runner
@@ -1,118 +1,295 @@
 # services/notifications.py
 
-import asyncio
+import time
+from datetime import datetime
 from aiogram import Bot
-from database import get_users_with_settings, set_tracking, get_tracking
-from services.crypto_api import get_crypto_price
-from utils.logger import get_logger
+from config import LOG_SAMPLE_INTERVAL
+from database import (
+    get_users_with_settings, update_last_prices,
+    get_user_settings, mark_price_alerts_triggered
+)
+from services.crypto_api import get_crypto_prices
+from services.price_window import PriceWindows
+from services.price_levels import price_levels, load_price_levels, sync_price_levels
+from services import events
+from services.indicators import IndicatorEngine
+from services.fanout import safe_send
+from services import supervisor, profiling
+from utils.currency import format_price
+from utils.logger import get_logger, LogSampler
+from utils.metrics import PRICE_TICK_SECONDS
 
 logger = get_logger(__name__)
+# Строки проверки отдельных записей пишутся выборочно: их тысячи за тик
+_row_log = LogSampler(LOG_SAMPLE_INTERVAL)
+
+# Окна цен по парам (symbol, quote), общие для всех пользователей
+price_windows = PriceWindows()
+# Индикаторы (EMA, волатильность) по парам (symbol, quote), общие для всех пользователей
+indicators = IndicatorEngine()
+# Время последнего оконного уведомления: (user_id, symbol) -> ts
+_window_alerts = {}
 
 async def check_price_changes(bot: Bot):
     """Фоновая задача для проверки изменений цен"""
     while True:
+        started_at = time.perf_counter()
+        profiler = profiling.begin_tick()
         try:
-            # Получаем всех пользователей с настройками
-            users_data = get_users_with_settings()
-            logger.info(f"Проверка цен для {len(users_data)} записей")
-            
-            # Группируем данные по пользователям
-            user_tracking = {}
-            for row in users_data:
-                user_id, username, interval, threshold, format_type, symbol, last_price = row
-                if symbol:  # Только если есть отслеживаемые валюты
-                    if user_id not in user_tracking:
-                        user_tracking[user_id] = {
-                            'username': username,
-                            'interval': interval,
-                            'threshold': float(threshold),  # Убедимся, что это float
-                            'format': format_type,
-                            'symbols': []
-                        }
-                    user_tracking[user_id]['symbols'].append((symbol, last_price))
-            
-            # Проверяем цены для каждого пользователя
-            for user_id, user_data in user_tracking.items():
-                try:
-                    for symbol, last_price_db in user_data['symbols']:
-                        current_price = await get_crypto_price(symbol)
-                        if current_price:
-                            # Обновляем цену в базе данных (только last_price)
-                            set_tracking(user_id, symbol, current_price)
-                            
-                            # Проверяем изменение цены
-                            if last_price_db is not None and last_price_db != '':
-                                last_price = float(last_price_db)
-                                if last_price != 0:
-                                    change_percent = abs((current_price - last_price) / last_price) * 100
-                                    logger.info(f"Проверка {symbol} для {user_id}: {last_price} -> {current_price} ({change_percent:.2f}%) Порог: {user_data['threshold']}%")
-                                    
-                                    # Используем пользовательский порог
-                                    if change_percent >= user_data['threshold']:
-                                        # Формируем уведомление в зависимости от формата
-                                        message = format_notification(
-                                            symbol, last_price, current_price, 
-                                            change_percent, user_data['format']
-                                        )
-                                        
-                                        try:
-                                            await bot.send_message(
-                                                chat_id=user_id,
-                                                text=message,
-                                                parse_mode="HTML"
-                                            )
-                                            logger.info(f"✅ Уведомление ОТПРАВЛЕНО пользователю {user_data['username']} ({user_id}) о изменении {symbol}")
-                                        except Exception as e:
-                                            logger.error(f"❌ Ошибка отправки уведомления пользователю {user_id}: {e}")
-                                    else:
-                                        logger.info(f"ℹ️ Изменение {symbol} для {user_id}: {change_percent:.2f}% (меньше порога {user_data['threshold']}%)")
-                                else:
-                                    logger.info(f"ℹ️ Нулевая цена для {symbol} пользователя {user_id}")
-                            else:
-                                logger.info(f"ℹ️ Нет предыдущей цены для {symbol} пользователя {user_id} (last_price_db: {last_price_db})")
-                        else:
-                            logger.error(f"❌ Не удалось получить цену для {symbol}")
-                            
-                except Exception as e:
-                    logger.error(f"❌ Ошибка проверки цен для пользователя {user_id}: {e}")
+            await process_tick(bot)
             
             # Ждем 1 минуту перед следующей проверкой (минимальный интервал)
             logger.info("Ожидание 3 минуты до следующей проверки...")
-            await asyncio.sleep(180)
             
         except Exception as e:
             logger.error(f"❌ Ошибка в фоновой задаче проверки цен: {e}")
-            await asyncio.sleep(180)
+        PRICE_TICK_SECONDS.observe(value=time.perf_counter() - started_at)
+        if profiler is not None:
+            await profiling.end_tick(profiler)
+        # Остановка прерывает только ожидание, а не начатую проверку
+        if await supervisor.sleep(180):
+            return
+
+async def process_tick(bot: Bot):
+    """Один проход проверки цен для всех пользователей"""
+    user_tracking = load_user_tracking()
+    sync_price_levels()
+    
+    # Все нужные пары (symbol, quote) запрашиваются одним вызовом pricemulti за тик
+    pairs = {(symbol, data['quote']) for data in user_tracking.values() for symbol, _ in data['symbols']}
+    pairs |= price_levels.pairs()
+    prices = await fetch_prices(pairs)
+    await evaluate_tick(bot, prices, time.time(), user_tracking)
+
+def load_user_tracking(shard=None):
+    """Пользователи с настройками и отслеживаемыми валютами (все или одного шарда)"""
+    # Получаем всех пользователей с настройками
+    users_data = get_users_with_settings(shard)
+    logger.info(f"Проверка цен для {len(users_data)} записей")
+    
+    # Группируем данные по пользователям
+    user_tracking = {}
+    for row in users_data:
+        (user_id, username, interval, threshold, format_type,
+         window_minutes, window_threshold, indicator_mode, quote, symbol, last_price) = row
+        if symbol:  # Только если есть отслеживаемые валюты
+            if user_id not in user_tracking:
+                user_tracking[user_id] = {
+                    'username': username,
+                    'interval': interval,
+                    'threshold': float(threshold),  # Убедимся, что это float
+                    'format': format_type,
+                    'window': int(window_minutes or 0),
+                    'window_threshold': float(window_threshold or 3.0),
+                    'indicators': indicator_mode or 'off',
+                    'quote': quote or 'USD',
+                    'symbols': []
+                }
+            user_tracking[user_id]['symbols'].append((symbol, last_price))
+    return user_tracking
+
+async def fetch_prices(pairs):
+    """Снимок цен тика {(symbol, quote): price} одним запросом pricemulti"""
+    all_prices = await get_crypto_prices(
+        {symbol for symbol, _ in pairs}, {quote for _, quote in pairs}
+    )
+    prices = {}
+    for pair in pairs:
+        price = all_prices.get(pair)
+        if price:
+            prices[pair] = price
+        else:
+            logger.error(f"❌ Не удалось получить цену для {pair[0]}/{pair[1]}")
+    return prices
+
+async def evaluate_tick(bot: Bot, prices, now, user_tracking, save_prices=update_last_prices,
+                        mark_triggered=mark_price_alerts_triggered):
+    """Проверка условий и отправка уведомлений по снимку цен тика
+
+    Новые last_price собираются за тик и передаются в save_prices одним
+    вызовом (в БД - одной транзакцией; бэктест хранит их в памяти), в том
+    числе если тик прерван. Сработавшие уровни отмечаются через mark_triggered.
+    """
+    # Окна и индикаторы обновляются по всем парам снимка: у каждого шарда одна и та же история
+    indicator_events = {}
+    for pair, price in prices.items():
+        price_windows.push(pair, now, price)
+        indicator_events[pair] = indicators.update(pair, price)
+    
+    # Проверяем пересечение ценовых уровней (только пересеченные уровни)
+    await _check_price_levels(bot, prices, mark_triggered)
+    
+    # Сообщения по индикаторам форматируются один раз на (символ, котировка, сигнал, формат)
+    indicator_messages = {}
+    # Новые last_price: (price, user_id, symbol, котировка тика)
+    last_prices = []
+    
+    # Цены записываются и при прерванном тике (отмена при остановке): иначе после
+    # перезапуска уже уведомленные в этом тике пользователи получили бы то же уведомление
+    try:
+        # Проверяем цены для каждого пользователя
+        for user_id, user_data in user_tracking.items():
+            try:
+                quote = user_data['quote']
+                for symbol, last_price_db in user_data['symbols']:
+                    current_price = prices.get((symbol, quote))
+                    if not current_price:
+                        continue
+                
+                    # Новая last_price (запишется в конце тика)
+                    last_prices.append((current_price, user_id, symbol, quote))
+                
+                    # Проверяем изменение цены
+                    if last_price_db is not None and last_price_db != '':
+                        last_price = float(last_price_db)
+                        if last_price != 0:
+                            change_percent = abs((current_price - last_price) / last_price) * 100
+                            if _row_log.allow("check"):
+                                logger.info(f"Проверка {symbol} для {user_id}: {last_price} -> {current_price} ({change_percent:.2f}%) Порог: {user_data['threshold']}%")
+                        
+                            # Используем пользовательский порог
+                            if change_percent >= user_data['threshold']:
+                                # Формируем уведомление в зависимости от формата
+                                message = format_notification(
+                                    symbol, last_price, current_price, 
+                                    change_percent, user_data['format'], quote=quote
+                                )
+                                await _send_notification(bot, user_id, symbol, message, user_data['username'])
+                            elif _row_log.allow("below_threshold"):
+                                logger.info(f"ℹ️ Изменение {symbol} для {user_id}: {change_percent:.2f}% (меньше порога {user_data['threshold']}%)")
+                        elif _row_log.allow("zero_price"):
+                            logger.info(f"ℹ️ Нулевая цена для {symbol} пользователя {user_id}")
+                    elif _row_log.allow("no_previous"):
+                        logger.info(f"ℹ️ Нет предыдущей цены для {symbol} пользователя {user_id} (last_price_db: {last_price_db})")
+                
+                    # Проверяем изменение за скользящее окно
+                    if user_data['window']:
+                        await _check_window(bot, user_id, user_data, symbol, current_price, now)
+                
+                    # Сигналы индикаторов, рассчитанные один раз для символа
+                    if user_data['indicators'] != 'off':
+                        for event in indicator_events.get((symbol, quote), ()):
+                            kind = event[0]
+                            if user_data['indicators'] not in ('all', kind):
+                                continue
+                            key = (symbol, quote, kind, user_data['format'])
+                            message = indicator_messages.get(key)
+                            if message is None:
+                                _, old_price, new_price, change_percent, note = event
+                                message = indicator_messages[key] = format_notification(
+                                    symbol, old_price, new_price, change_percent,
+                                    user_data['format'], note=note, quote=quote
+                                )
+                            await _send_notification(bot, user_id, symbol, message, user_data['username'])
+                    
+            except Exception as e:
+                logger.error(f"❌ Ошибка проверки цен для пользователя {user_id}: {e}")
+    finally:
+        save_prices(last_prices)
+
+async def _check_price_levels(bot, prices, mark_triggered=mark_price_alerts_triggered):
+    """Уведомления о пересечении ценовых уровней"""
+    crossed = []
+    for pair, price in prices.items():
+        for alert_id, user_id, target, direction in price_levels.pop_crossed(pair, price):
+            crossed.append((alert_id, user_id, pair, target, price))
+    if not crossed:
+        return
+    
+    # Сначала фиксируем срабатывание в БД, чтобы не отправить уведомление повторно.
+    # Уведомляем только по уровням, которые в БД еще были активны (не удалены пользователем)
+    triggered = set(mark_triggered([alert_id for alert_id, *_ in crossed]))
+    
+    for alert_id, user_id, (symbol, quote), target, price in crossed:
+        if alert_id not in triggered:
+            continue
+        user_settings = get_user_settings(user_id)
+        change_percent = abs((price - target) / target) * 100
+        message = format_notification(
+            symbol, target, price, change_percent, user_settings['format'],
+            note=f"— уровень {format_price(target, quote)}", quote=quote
+        )
+        await _send_notification(bot, user_id, symbol, message)
+
+async def _check_window(bot, user_id, user_data, symbol, current_price, now):
+    """Проверка изменения цены за последние N минут"""
+    minutes = user_data['window']
+    window = price_windows.get((symbol, user_data['quote']), minutes)
+    if window is None:
+        return
+    
+    reference_price, change_percent = window.change(current_price)
+    if reference_price is None or change_percent < user_data['window_threshold']:
+        return
+    
+    # Не повторяем уведомление, пока окно не сдвинется полностью
+    key = (user_id, symbol)
+    if now - _window_alerts.get(key, 0) < minutes * 60:
+        return
+    _window_alerts[key] = now
+    
+    message = format_notification(
+        symbol, reference_price, current_price,
+        change_percent, user_data['format'],
+        note=f"за {minutes} мин", quote=user_data['quote']
+    )
+    await _send_notification(bot, user_id, symbol, message, user_data['username'])
+
+def subscribe_events(shard=None):
+    """Обновление кэшей проверки цен по событиям от обработчиков"""
+    events.subscribe("price_alert_added", price_levels.add)
+    events.subscribe("price_alert_removed", price_levels.remove)
+    events.subscribe("settings_changed", forget_user_windows)
+    events.subscribe(events.RESYNC, lambda: load_price_levels(shard))
+
+def forget_user_windows(user_id):
+    """Сбросить паузы оконных уведомлений пользователя (после смены настроек)"""
+    for key in [key for key in _window_alerts if key[0] == user_id]:
+        del _window_alerts[key]
+
+def reset_tick_state():
+    """Сбросить окна, индикаторы, паузы оконных уведомлений и индекс уровней (перед новым прогоном истории)"""
+    global price_windows, indicators
+    price_windows = PriceWindows()
+    indicators = IndicatorEngine()
+    _window_alerts.clear()
+    price_levels.load([])
+
+async def _send_notification(bot, user_id, symbol, message, username=None):
+    """Отправка уведомления пользователю"""
+    if await safe_send(bot, user_id, message):
+        logger.info(f"✅ Уведомление ОТПРАВЛЕНО пользователю {username} ({user_id}) о изменении {symbol}")
 
-def format_notification(symbol, old_price, new_price, change_percent, format_type):
+def format_notification(symbol, old_price, new_price, change_percent, format_type, note=None, quote='USD'):
     """Форматирование уведомления в зависимости от выбранного формата"""
     change_symbol = "📈" if new_price > old_price else "📉"
+    # Дополнение к заголовку (например, период окна)
+    suffix = f" {note}" if note else ""
     
     if format_type == 'compact':
         # Компактный формат
         return (
-            f"{change_symbol} <b>{symbol}</b> ${new_price:.2f} "
+            f"{change_symbol} <b>{symbol}{suffix}</b> {format_price(new_price, quote)} "
             f"({change_symbol} {change_percent:.2f}%)"
         )
     elif format_type == 'detailed':
         # Подробный формат
         return (
-            f"{change_symbol} <b>Изменение цены {symbol}</b>\n\n"
-            f"💰 Предыдущая цена: <code>${old_price:.2f}</code>\n"
-            f"💵 Текущая цена: <code>${new_price:.2f}</code>\n"
+            f"{change_symbol} <b>Изменение цены {symbol}{suffix}</b>\n\n"
+            f"💰 Предыдущая цена: <code>{format_price(old_price, quote)}</code>\n"
+            f"💵 Текущая цена: <code>{format_price(new_price, quote)}</code>\n"
             f"📊 Изменение: <b>{change_symbol} {change_percent:.2f}%</b>\n"
             f"⏰ {get_time_string()}"
         )
     else:
         # Классический формат (по умолчанию)
         return (
-            f"{change_symbol} <b>Изменение цены {symbol}</b>\n\n"
-            f"💰 Старая цена: <code>${old_price:.2f}</code>\n"
-            f"💵 Новая цена: <code>${new_price:.2f}</code>\n"
+            f"{change_symbol} <b>Изменение цены {symbol}{suffix}</b>\n\n"
+            f"💰 Старая цена: <code>{format_price(old_price, quote)}</code>\n"
+            f"💵 Новая цена: <code>{format_price(new_price, quote)}</code>\n"
             f"📊 Изменение: <b>{change_symbol} {change_percent:.2f}%</b>"
         )
 
 def get_time_string():
     """Получить текущее время в формате строки"""
-    from datetime import datetime
     return datetime.now().strftime("%H:%M:%S")
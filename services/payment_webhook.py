@@ -0,0 +1,83 @@
+# services/payment_webhook.py
+
+import hashlib
+import hmac
+import json
+from aiohttp import web
+from aiogram import Bot
+from config import (
+    CRYPTO_BOT_TOKEN, CRYPTO_PAY_WEBHOOK_HOST,
+    CRYPTO_PAY_WEBHOOK_PORT, CRYPTO_PAY_WEBHOOK_PATH
+)
+from keyboards.main import subscription_success_keyboard
+from services.fanout import safe_send
+from services.payments import apply_paid_invoice, activation_text
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SIGNATURE_HEADER = "crypto-pay-api-signature"
+
+
+def sign_body(body: bytes, token=CRYPTO_BOT_TOKEN):
+    """Подпись тела запроса: HMAC-SHA256 с ключом SHA256(token)"""
+    secret = hashlib.sha256(token.encode()).digest()
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+def verify_signature(body: bytes, signature, token=CRYPTO_BOT_TOKEN):
+    """Проверить подпись вебхука Crypto Pay"""
+    if not token or not signature:
+        return False
+    return hmac.compare_digest(sign_body(body, token), signature)
+
+async def handle_invoice_paid(bot: Bot, invoice):
+    """Активировать подписку по оплаченному инвойсу (повторная доставка ничего не меняет)"""
+    result = apply_paid_invoice(invoice.get("invoice_id"))
+    if result is None:
+        return
+
+    user_id, period, period_days = result
+    await safe_send(
+        bot, user_id, activation_text(period, period_days),
+        reply_markup=subscription_success_keyboard()
+    )
+
+async def crypto_pay_webhook(request: web.Request):
+    """Обработчик вебхука Crypto Pay"""
+    body = await request.read()
+    if not verify_signature(body, request.headers.get(SIGNATURE_HEADER)):
+        logger.warning("Вебхук Crypto Pay с неверной подписью отклонен")
+        return web.Response(status=401)
+
+    try:
+        update = json.loads(body)
+    except ValueError:
+        return web.Response(status=400)
+
+    if update.get("update_type") == "invoice_paid":
+        try:
+            await handle_invoice_paid(request.app["bot"], update.get("payload") or {})
+        except Exception as e:
+            # 500 - Crypto Pay повторит доставку
+            logger.error(f"❌ Ошибка обработки вебхука Crypto Pay: {e}")
+            return web.Response(status=500)
+    else:
+        logger.info(f"Вебхук Crypto Pay: пропущено обновление {update.get('update_type')}")
+
+    return web.json_response({"ok": True})
+
+def create_webhook_app(bot: Bot):
+    """Приложение aiohttp с обработчиком вебхука Crypto Pay"""
+    app = web.Application()
+    app["bot"] = bot
+    app.router.add_post(CRYPTO_PAY_WEBHOOK_PATH, crypto_pay_webhook)
+    return app
+
+async def start_payment_webhook(bot: Bot):
+    """Запустить встроенный сервер вебхука, вернуть runner для остановки"""
+    runner = web.AppRunner(create_webhook_app(bot))
+    await runner.setup()
+    site = web.TCPSite(runner, CRYPTO_PAY_WEBHOOK_HOST, CRYPTO_PAY_WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Вебхук Crypto Pay слушает {CRYPTO_PAY_WEBHOOK_HOST}:{CRYPTO_PAY_WEBHOOK_PORT}{CRYPTO_PAY_WEBHOOK_PATH}")
+    return runner
@@ -0,0 +1,159 @@
+# services/payments.py
+
+import asyncio
+from aiogram import Bot
+from config import (
+    INVOICE_RECONCILE_INTERVAL, INVOICE_RECONCILE_IDLE_INTERVAL,
+    CRYPTO_PAY_WEBHOOK_PORT, CRYPTO_PAY_WEBHOOK_FALLBACK_INTERVAL,
+    INVOICE_EXPIRY_HOURS, INVOICE_SWEEP_INTERVAL, INVOICE_CANCEL_CONCURRENCY,
+    INVOICE_ARCHIVE_DAYS
+)
+from database import (
+    get_active_invoices, get_subscription_prices, get_invoice_by_id,
+    apply_invoice, update_invoice_status, get_stale_invoices, archive_invoices
+)
+from keyboards.main import subscription_success_keyboard
+from services.crypto_bot import get_invoices, cancel_invoice
+from services.fanout import safe_send
+from services import supervisor
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Количество инвойсов в одном запросе getInvoices
+INVOICE_BATCH_SIZE = 100
+# Верхняя граница паузы между проходами сверки
+INVOICE_RECONCILE_MAX_INTERVAL = 60
+
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+PERIOD_NAMES = {'day': 'день', 'week': 'неделю', 'month': 'месяц'}
+
+
+def resolve_period(amount):
+    """Определить период подписки по сумме (только для старых инвойсов без сохраненного периода)"""
+    prices = get_subscription_prices()
+    period = 'month'  # дефолт
+    for p, price in prices.items():
+        if abs(float(amount) - price) < 0.001:  # Сравнение float
+            period = p
+            break
+    return period, PERIOD_DAYS.get(period, 30)
+
+def apply_paid_invoice(invoice_id):
+    """Активировать подписку по оплаченному инвойсу ровно один раз
+
+    Возвращает (user_id, period, period_days) или None, если инвойс
+    уже применен другой проверкой (кнопка, фоновая сверка, вебхук).
+    """
+    row = get_invoice_by_id(invoice_id)
+    if row is None:
+        logger.warning(f"Инвойс {invoice_id} не найден в БД")
+        return None
+    amount, period = row[3], row[6]
+    fallback_days = 30
+    if period is None:
+        period, fallback_days = resolve_period(amount)
+
+    result = apply_invoice(invoice_id, fallback_days)
+    if result is None:
+        logger.info(f"Инвойс {invoice_id} уже применен ранее")
+        return None
+    user_id, stored_period, period_days = result
+    return user_id, stored_period or period, period_days
+
+def activation_text(period, period_days):
+    """Текст об успешной активации подписки"""
+    return (
+        f"✅ <b>Подписка на {PERIOD_NAMES.get(period, period)} активирована!</b>\n\n"
+        "🎉 Поздравляем! Ваша подписка успешно активирована.\n"
+        f"Теперь вы можете отслеживать криптовалюты на протяжении {period_days} дней."
+    )
+
+def reconcile_interval(open_count):
+    """Пауза до следующего прохода в зависимости от количества открытых инвойсов
+
+    Пока счетов мало, опрашиваем часто (пользователь ждет активации),
+    с ростом количества пакетов пауза растет, чтобы не упираться в лимиты API.
+    Если оплаты приходят через вебхук, сверка - только редкая страховка.
+    """
+    if CRYPTO_PAY_WEBHOOK_PORT:
+        return CRYPTO_PAY_WEBHOOK_FALLBACK_INTERVAL
+    if not open_count:
+        return INVOICE_RECONCILE_IDLE_INTERVAL
+    batches = -(-open_count // INVOICE_BATCH_SIZE)
+    return min(INVOICE_RECONCILE_INTERVAL * batches, INVOICE_RECONCILE_MAX_INTERVAL)
+
+async def reconcile_invoices(bot: Bot):
+    """Фоновая сверка открытых инвойсов с CryptoBot"""
+    while True:
+        open_count = 0
+        try:
+            open_count = await reconcile_once(bot)
+        except Exception as e:
+            logger.error(f"❌ Ошибка сверки инвойсов: {e}")
+        if await supervisor.sleep(reconcile_interval(open_count)):
+            return
+
+async def reconcile_once(bot: Bot):
+    """Один проход сверки, возвращает количество оставшихся открытых инвойсов"""
+    invoices = get_active_invoices()
+    if not invoices:
+        return 0
+
+    open_count = 0
+    for i in range(0, len(invoices), INVOICE_BATCH_SIZE):
+        batch = invoices[i:i + INVOICE_BATCH_SIZE]
+        invoice_ids = [int(invoice_id) for _, invoice_id, _ in batch]
+        items = await get_invoices(invoice_ids)
+        if items is None:
+            open_count += len(batch)
+            continue
+
+        statuses = {int(item.get("invoice_id")): item.get("status") for item in items}
+        for invoice_id in invoice_ids:
+            status = statuses.get(invoice_id)
+            if status in ('paid', 'confirmed'):
+                result = apply_paid_invoice(invoice_id)
+                if result:
+                    user_id, period, period_days = result
+                    await safe_send(
+                        bot, user_id, activation_text(period, period_days),
+                        reply_markup=subscription_success_keyboard()
+                    )
+            elif status in ('expired', 'cancelled'):
+                update_invoice_status(invoice_id, status, expected='active')
+            else:
+                open_count += 1
+
+    logger.info(f"Сверка инвойсов: проверено {len(invoices)}, открыто {open_count}")
+    return open_count
+
+async def sweep_stale_invoices():
+    """Фоновая очистка: отмена брошенных инвойсов и архивирование закрытых"""
+    while True:
+        try:
+            await sweep_once()
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки инвойсов: {e}")
+        if await supervisor.sleep(INVOICE_SWEEP_INTERVAL):
+            return
+
+async def sweep_once():
+    """Один проход очистки, возвращает (отменено, в архиве)"""
+    stale = get_stale_invoices(INVOICE_EXPIRY_HOURS)
+    expired = 0
+    if stale:
+        # Отмена в CryptoBot с ограничением числа одновременных запросов.
+        # Если счет успели оплатить, отмена не пройдет и его подхватит сверка
+        semaphore = asyncio.Semaphore(INVOICE_CANCEL_CONCURRENCY)
+
+        async def expire(invoice_id):
+            async with semaphore:
+                return await cancel_invoice(invoice_id, local_status='expired')
+
+        results = await asyncio.gather(*(expire(invoice_id) for invoice_id in stale))
+        expired = sum(1 for ok in results if ok)
+        logger.info(f"Очистка инвойсов: устаревших {len(stale)}, истекло {expired}")
+
+    archived = archive_invoices(INVOICE_ARCHIVE_DAYS)
+    return expired, archived
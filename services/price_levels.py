@@ -0,0 +1,126 @@
+# services/price_levels.py
+
+import heapq
+from database import get_active_price_alerts
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Ограничение на количество активных уровней у одного пользователя
+MAX_ALERTS_PER_USER = 10
+
+
+class PriceLevelIndex:
+    """Индекс ценовых уровней по парам (symbol, quote): две кучи на пару (выше/ниже цены)
+
+    Новая цена извлекает только пересеченные уровни за O(k log n),
+    остальные уровни не просматриваются.
+    """
+
+    def __init__(self):
+        self._above = {}   # (symbol, quote) -> min-куча (target, alert_id): срабатывает при price >= target
+        self._below = {}   # (symbol, quote) -> max-куча (-target, alert_id): срабатывает при price <= target
+        self._alerts = {}  # alert_id -> (user_id, (symbol, quote), target, direction)
+        self._live = {}    # (symbol, quote) -> число ожидающих уровней пары
+        self._dead = 0     # удаленные уровни, которые еще лежат в кучах
+        self.max_id = 0    # наибольший загруженный ID (для догрузки новых уровней из БД)
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def load(self, rows):
+        """Перестроить индекс из строк (id, user_id, symbol, quote, target_price, direction)"""
+        self._above.clear()
+        self._below.clear()
+        self._alerts.clear()
+        self._live.clear()
+        self._dead = 0
+        self.max_id = 0
+        for alert_id, user_id, symbol, quote, target, direction in rows:
+            self.max_id = max(self.max_id, alert_id)
+            pair = (symbol, quote)
+            self._alerts[alert_id] = (user_id, pair, target, direction)
+            self._live[pair] = self._live.get(pair, 0) + 1
+            heap = self._above if direction == 'above' else self._below
+            key = target if direction == 'above' else -target
+            heap.setdefault(pair, []).append((key, alert_id))
+        for heap in (*self._above.values(), *self._below.values()):
+            heapq.heapify(heap)
+
+    def add(self, alert_id, user_id, symbol, quote, target, direction):
+        """Добавить уровень в индекс (повторное добавление того же ID ничего не меняет)"""
+        if alert_id in self._alerts:
+            return
+        self.max_id = max(self.max_id, alert_id)
+        pair = (symbol, quote)
+        self._alerts[alert_id] = (user_id, pair, target, direction)
+        self._live[pair] = self._live.get(pair, 0) + 1
+        if direction == 'above':
+            heapq.heappush(self._above.setdefault(pair, []), (target, alert_id))
+        else:
+            heapq.heappush(self._below.setdefault(pair, []), (-target, alert_id))
+
+    def remove(self, alert_id):
+        """Удалить уровень (ленивое удаление: запись в куче пропускается при извлечении)"""
+        alert = self._alerts.pop(alert_id, None)
+        if alert is not None:
+            self._release(alert[1])
+            self._dead += 1
+            if self._dead > 1000 and self._dead > len(self._alerts):
+                self._compact()
+
+    def pairs(self):
+        """Пары (symbol, quote), для которых есть ожидающие уровни (без просмотра самих уровней)"""
+        return self._live.keys()
+
+    def _release(self, pair):
+        count = self._live[pair] - 1
+        if count:
+            self._live[pair] = count
+        else:
+            del self._live[pair]
+
+    def pop_crossed(self, pair, price):
+        """Извлечь все уровни пары (symbol, quote), пересеченные ценой price"""
+        crossed = []
+        above = self._above.get(pair)
+        while above and above[0][0] <= price:
+            _, alert_id = heapq.heappop(above)
+            self._take(alert_id, crossed)
+        below = self._below.get(pair)
+        while below and -below[0][0] >= price:
+            _, alert_id = heapq.heappop(below)
+            self._take(alert_id, crossed)
+        return crossed
+
+    def _take(self, alert_id, crossed):
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            self._dead -= 1
+            return
+        user_id, pair, target, direction = alert
+        self._release(pair)
+        crossed.append((alert_id, user_id, target, direction))
+
+    def _compact(self):
+        """Убрать из куч удаленные уровни"""
+        for heaps in (self._above, self._below):
+            for pair, heap in heaps.items():
+                heaps[pair] = [item for item in heap if item[1] in self._alerts]
+                heapq.heapify(heaps[pair])
+        self._dead = 0
+
+
+# Общий индекс для обработчиков и фоновой задачи
+price_levels = PriceLevelIndex()
+
+
+def load_price_levels(shard=None):
+    """Загрузить активные уровни из БД в индекс (все или одного шарда)"""
+    price_levels.load(get_active_price_alerts(shard))
+    logger.info(f"Загружено ценовых уровней: {len(price_levels)}")
+
+def sync_price_levels(shard=None):
+    """Догрузить уровни, добавленные в БД после последней загрузки (например, другой репликой)"""
+    for row in get_active_price_alerts(shard, after_id=price_levels.max_id):
+        price_levels.add(*row)
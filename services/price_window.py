@@ -0,0 +1,75 @@
+# services/price_window.py
+
+from collections import deque
+
+# Доступные длины окна в минутах (совпадают с кнопками в window_settings_keyboard)
+WINDOW_MINUTES = (15, 30, 60, 240)
+
+
+class SlidingWindow:
+    """Скользящее окно цен с монотонными очередями для min/max (O(1) амортизированно)"""
+
+    __slots__ = ("span", "_min", "_max")
+
+    def __init__(self, span_seconds):
+        self.span = span_seconds
+        self._min = deque()  # (ts, price), цены строго возрастают
+        self._max = deque()  # (ts, price), цены строго убывают
+
+    def push(self, ts, price):
+        """Добавить новую цену и выбросить точки старше окна"""
+        while self._min and self._min[-1][1] >= price:
+            self._min.pop()
+        self._min.append((ts, price))
+        while self._max and self._max[-1][1] <= price:
+            self._max.pop()
+        self._max.append((ts, price))
+
+        border = ts - self.span
+        while self._min[0][0] < border:
+            self._min.popleft()
+        while self._max[0][0] < border:
+            self._max.popleft()
+
+    @property
+    def low(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def high(self):
+        return self._max[0][1] if self._max else None
+
+    def change(self, price):
+        """Максимальное движение цены внутри окна: (опорная цена, изменение в %)"""
+        low, high = self.low, self.high
+        if not low or not high:
+            return None, 0.0
+        rise = (price - low) / low * 100
+        drop = (high - price) / high * 100
+        if rise >= drop:
+            return low, rise
+        return high, drop
+
+
+class PriceWindows:
+    """Окна цен по каждому символу для всех длин из WINDOW_MINUTES"""
+
+    def __init__(self, minutes=WINDOW_MINUTES):
+        self.minutes = tuple(minutes)
+        self._windows = {}  # symbol -> {minutes: SlidingWindow}
+
+    def push(self, symbol, ts, price):
+        """Обновить все окна символа новой ценой (один раз за тик)"""
+        windows = self._windows.get(symbol)
+        if windows is None:
+            windows = {m: SlidingWindow(m * 60) for m in self.minutes}
+            self._windows[symbol] = windows
+        for window in windows.values():
+            window.push(ts, price)
+
+    def get(self, symbol, minutes):
+        """Получить окно символа заданной длины или None"""
+        windows = self._windows.get(symbol)
+        if windows is None:
+            return None
+        return windows.get(minutes)
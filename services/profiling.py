@@ -0,0 +1,202 @@
+# services/profiling.py
+#
+# Профилирование по запросу администратора без перезапуска: следующие N тиков
+# проверки цен или N секунд работы процесса бота. Профилировщики cProfile
+# (точное время функций, файл pstats) и сэмплирующий (стеки потока event loop
+# раз в несколько миллисекунд, файл collapsed-stack для flamegraph).
+# Пока профилирование не запрошено, тик проверяет только одну переменную.
+
+import asyncio
+import cProfile
+import html
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from config import PROFILE_DIR
+from services import events
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PROFILER_KINDS = ("cprofile", "sample")
+
+# Запрос профилирования тиков сбрасывается, если за это время не начался ни один тик
+# (например, реплика потеряла лидерство): иначе он навсегда занял бы процесс
+TICK_REQUEST_TIMEOUT = 600
+
+# Запрошенное профилирование тиков: [профилировщик, осталось тиков, notify, метка отчета, срок]
+_tick_request = None
+# Идет профилирование по времени (в потоке может работать только один cProfile)
+_timed_running = False
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик: поток раз в interval снимает стек потока event loop"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = None
+        self._thread = None
+
+    def _run(self, stop):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def resume(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def pause(self):
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, path):
+        path += ".collapsed"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def top(self, limit):
+        """Функции с наибольшим собственным временем: [(функция, доля выборок)]"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(name, f"{count * 100 / total:.1f}%") for name, count in leaves.most_common(limit)]
+
+
+class CProfiler:
+    """cProfile для потока event loop (в замер попадают и другие задачи, работавшие в это время)"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def resume(self):
+        self.profile.enable()
+
+    def pause(self):
+        self.profile.disable()
+
+    def save(self, path):
+        path += ".prof"
+        self.profile.dump_stats(path)
+        return path
+
+    def top(self, limit):
+        """Функции с наибольшим собственным временем: [(функция, время)]"""
+        stats = pstats.Stats(self.profile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [
+            (f"{func} ({os.path.basename(filename)}:{line})", f"{tottime:.3f} с / {ncalls} выз.")
+            for (filename, line, func), (_, ncalls, tottime, _, _) in rows
+        ]
+
+
+def create_profiler(kind):
+    if kind not in PROFILER_KINDS:
+        raise ValueError(f"Неизвестный профилировщик: {kind}")
+    return CProfiler() if kind == "cprofile" else StackSampler()
+
+def _report(profiler, target, limit=10):
+    """Сохранить результат в PROFILE_DIR и вернуть краткую сводку для администратора"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{target}-{type(profiler).__name__.lower()}-{time.strftime('%Y%m%d-%H%M%S')}"
+    path = profiler.save(os.path.join(PROFILE_DIR, name))
+    logger.info(f"Профиль {target} сохранен: {path}")
+    lines = [f"🔬 <b>Профиль: {target}</b>", f"Файл: <code>{path}</code>\n"]
+    # В именах встречаются <module>, <lambda>, <built-in method ...>
+    lines += [f"<code>{html.escape(func)}</code> — {value}" for func, value in profiler.top(limit)]
+    return "\n".join(lines)
+
+async def _notify(notify, text):
+    try:
+        await notify(text)
+    except Exception as e:
+        logger.error(f"❌ Не удалось отправить результат профилирования: {e}")
+
+def is_busy():
+    global _tick_request
+    if _tick_request is not None and time.time() > _tick_request[4]:
+        logger.warning(f"Запрос профилирования тиков ({_tick_request[3]}) сброшен: тики в процессе не идут")
+        _tick_request = None
+    return _tick_request is not None or _timed_running
+
+def profile_ticks(count, kind, notify, target="ticks"):
+    """Профилировать следующие count тиков проверки цен, результат передать в notify(text)
+
+    Возвращает False, если в процессе уже идет профилирование.
+    """
+    global _tick_request
+    if is_busy():
+        return False
+    _tick_request = [create_profiler(kind), count, notify, target, time.time() + TICK_REQUEST_TIMEOUT]
+    logger.info(f"Запрошено профилирование {count} тиков ({kind}, {target})")
+    return True
+
+def subscribe_tick_requests(notify, target="ticks", runs_ticks=None):
+    """Принимать запросы /profile_ticks (событие profile_ticks) в процессе, где идут тики
+
+    runs_ticks() - идут ли тики в процессе сейчас: реплика без лидерства запрос отклоняет.
+    """
+    async def on_profile_ticks(ticks, kind):
+        if runs_ticks is not None and not runs_ticks():
+            await _notify(notify, "ℹ️ Тики проверки цен сейчас идут на другой реплике (лидере)")
+        elif not profile_ticks(ticks, kind, notify, target):
+            await _notify(notify, "⏳ Профилирование уже идет, дождитесь результата")
+
+    events.subscribe("profile_ticks", on_profile_ticks)
+
+def begin_tick():
+    """Начало тика: профилировщик, если профилирование запрошено (иначе None)"""
+    if _tick_request is None:
+        return None
+    _tick_request[4] = time.time() + TICK_REQUEST_TIMEOUT
+    profiler = _tick_request[0]
+    profiler.resume()
+    return profiler
+
+async def end_tick(profiler):
+    """Конец профилируемого тика: после последнего из запрошенных - отчет"""
+    global _tick_request
+    profiler.pause()
+    request = _tick_request
+    if request is None:
+        return
+    request[1] -= 1
+    if request[1] <= 0:
+        _tick_request = None
+        await _notify(request[2], _report(profiler, request[3]))
+
+async def profile_for(seconds, kind, notify):
+    """Профилировать работу процесса (обработку обновлений) в течение seconds секунд
+
+    Возвращает False, если в процессе уже идет профилирование.
+    """
+    global _timed_running
+    if is_busy():
+        return False
+    profiler = create_profiler(kind)
+    _timed_running = True
+    logger.info(f"Профилирование процесса на {seconds} с ({kind})")
+    profiler.resume()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.pause()
+        _timed_running = False
+    await _notify(notify, _report(profiler, "updates"))
+    return True
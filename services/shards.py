@@ -0,0 +1,191 @@
+# services/shards.py
+#
+# Шардированная проверка цен. Координатор (процесс воркера) раз в тик
+# запрашивает снимок цен по всем нужным парам и рассылает его шардам.
+# Шард - отдельный процесс со своим клиентом Bot API, он отвечает за
+# пользователей с user_id % N == index: проверяет условия и отправляет
+# уведомления. Окна и индикаторы считаются по парам, каждый шард получает
+# все снимки, поэтому их история у шардов одинаковая.
+
+import asyncio
+import multiprocessing
+import queue
+import time
+from config import ADMIN_ID, SHARD_TIMEOUT
+from database import get_tracked_pairs
+from services import events, supervisor, profiling
+from services.notifications import (
+    load_user_tracking, evaluate_tick, fetch_prices, subscribe_events
+)
+from services.fanout import safe_send
+from services.http import close_session
+from services.price_levels import load_price_levels, sync_price_levels
+from services.telegram import create_bot
+from utils.logger import get_logger
+from utils.metrics import PRICE_TICK_SECONDS
+
+logger = get_logger(__name__)
+
+# Пауза между тиками (как у check_price_changes)
+TICK_INTERVAL = 180
+# События, которые пересылаются шардам
+SHARD_EVENTS = ("price_alert_added", "price_alert_removed", "settings_changed", "profile_ticks", events.RESYNC)
+
+
+async def _join(process, timeout):
+    """process.join(timeout) в потоке: ожидание зависшего шарда не останавливает event loop"""
+    await asyncio.get_running_loop().run_in_executor(None, process.join, timeout)
+
+async def _terminate(process, timeout=5):
+    """Остановить процесс шарда: SIGTERM, а если он не завершился за timeout секунд - SIGKILL"""
+    process.terminate()
+    await _join(process, timeout)
+    if process.is_alive():
+        logger.warning(f"Процесс {process.name} не завершился по SIGTERM, SIGKILL")
+        process.kill()
+        await _join(process, timeout)
+
+
+def run_shard(index, count, inbox, outbox):
+    """Точка входа процесса-шарда"""
+    asyncio.run(_shard_main(index, count, inbox, outbox))
+
+async def _shard_main(index, count, inbox, outbox):
+    shard = (index, count)
+    bot = create_bot()
+    load_price_levels(shard)
+    subscribe_events(shard)
+
+    async def notify(text):
+        await safe_send(bot, ADMIN_ID, text)
+
+    profiling.subscribe_tick_requests(notify, f"ticks-shard-{index}")
+    loop = asyncio.get_running_loop()
+    outbox.put(("ready", index, time.time()))
+    logger.info(f"Шард {index}/{count} запущен")
+
+    try:
+        while True:
+            message = await loop.run_in_executor(None, inbox.get)
+            kind = message[0]
+            if kind == "stop":
+                break
+            try:
+                if kind == "tick":
+                    _, ts, prices = message
+                    sync_price_levels(shard)
+                    profiler = profiling.begin_tick()
+                    try:
+                        await evaluate_tick(bot, prices, ts, load_user_tracking(shard))
+                    finally:
+                        if profiler is not None:
+                            await profiling.end_tick(profiler)
+                    outbox.put(("done", index, time.time()))
+                elif kind == "event":
+                    _, event_type, data = message
+                    await events.dispatch(event_type, data)
+            except Exception as e:
+                logger.error(f"❌ Ошибка в шарде {index}: {e}")
+    finally:
+        await close_session()
+        await bot.session.close()
+        logger.info(f"Шард {index}/{count} остановлен")
+
+
+class ShardCoordinator:
+    """Запуск шардов, рассылка снимков цен и событий, перезапуск упавших шардов"""
+
+    def __init__(self, count):
+        self.count = count
+        self._context = multiprocessing.get_context("spawn")
+        self._outbox = self._context.Queue()
+        self._shards = {}  # index -> [process, inbox, last_seen]
+        self._subscriptions = []
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+        # События от обработчиков уходят шарду, который владеет пользователем
+        for event_type in SHARD_EVENTS:
+            handler = lambda event_type=event_type, **data: self.route(event_type, data)
+            events.subscribe(event_type, handler)
+            self._subscriptions.append((event_type, handler))
+
+    def _spawn(self, index):
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=run_shard, args=(index, self.count, inbox, self._outbox),
+            name=f"shard-{index}", daemon=True
+        )
+        process.start()
+        self._shards[index] = [process, inbox, time.time()]
+
+    def shard_of(self, user_id):
+        return user_id % self.count
+
+    def route(self, event_type, data):
+        """Переслать событие шарду пользователя (или всем, если пользователь не указан)"""
+        user_id = data.get("user_id")
+        targets = self._shards.values() if user_id is None else [self._shards[self.shard_of(user_id)]]
+        for _, inbox, _ in targets:
+            inbox.put(("event", event_type, data))
+
+    def broadcast_tick(self, ts, prices):
+        for _, inbox, _ in self._shards.values():
+            inbox.put(("tick", ts, prices))
+
+    async def check_health(self):
+        """Учесть подтверждения шардов и перезапустить упавшие или зависшие"""
+        while True:
+            try:
+                _, index, ts = self._outbox.get_nowait()
+            except queue.Empty:
+                break
+            if index in self._shards:
+                self._shards[index][2] = ts
+
+        now = time.time()
+        for index, (process, _, last_seen) in list(self._shards.items()):
+            if process.is_alive() and now - last_seen < SHARD_TIMEOUT:
+                continue
+            reason = "завис" if process.is_alive() else f"упал (код {process.exitcode})"
+            logger.error(f"❌ Шард {index} {reason}, перезапуск")
+            await _terminate(process)
+            # Новый шард загрузит свои уровни из БД, история окон начнется заново
+            self._spawn(index)
+
+    async def stop(self):
+        for event_type, handler in self._subscriptions:
+            events.unsubscribe(event_type, handler)
+        self._subscriptions.clear()
+        for process, inbox, _ in self._shards.values():
+            inbox.put(("stop",))
+        processes = [process for process, _, _ in self._shards.values()]
+        # Шарды завершают текущий тик параллельно, общий срок - 10 с
+        await asyncio.gather(*(_join(process, 10) for process in processes))
+        await asyncio.gather(*(_terminate(process) for process in processes if process.is_alive()))
+
+
+async def run_sharded_poller(count):
+    """Фоновая задача координатора: снимок цен раз в тик для всех шардов"""
+    coordinator = ShardCoordinator(count)
+    coordinator.start()
+    logger.info(f"Проверка цен распределена по {count} шардам")
+    try:
+        while True:
+            started_at = time.perf_counter()
+            profiler = profiling.begin_tick()
+            try:
+                await coordinator.check_health()
+                prices = await fetch_prices(get_tracked_pairs())
+                coordinator.broadcast_tick(time.time(), prices)
+            except Exception as e:
+                logger.error(f"❌ Ошибка координатора шардов: {e}")
+            # Проверка условий идет в процессах шардов, здесь - получение и рассылка снимка
+            PRICE_TICK_SECONDS.observe(value=time.perf_counter() - started_at)
+            if profiler is not None:
+                await profiling.end_tick(profiler)
+            if await supervisor.sleep(TICK_INTERVAL):
+                return
+    finally:
+        await coordinator.stop()
@@ -0,0 +1,102 @@
+# services/snapshot.py
+#
+# Снимок кэшей процесса бота для быстрого старта после перезапуска: последние
+# цены (кэш в памяти), проверенные активные подписки и file_id загруженных
+# медиа. Пишется при штатной остановке, загружается до начала приема
+# обновлений. Формат - заголовок SNAPSHOT_HEADER и три блока записей
+# фиксированной длины, файл читается через mmap без разбора текста.
+
+import mmap
+import os
+import struct
+import time
+from config import SNAPSHOT_PATH, SNAPSHOT_MAX_AGE
+from database import get_active_subscribers, restore_active_subscribers
+from services import media
+from services.crypto_api import price_cache
+from services.storage import MemoryPriceCache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SNAPSHOT_MAGIC = b"CWTSNAP1"
+# Сигнатура, время записи, id бота (file_id действительны только для него), число записей в блоках
+SNAPSHOT_HEADER = struct.Struct("<8sdqIII")
+# Символ, котировка, цена, время получения
+PRICE_RECORD = struct.Struct("<16s8sdd")
+# user_id, окончание подписки, время проверки в БД
+SUBSCRIBER_RECORD = struct.Struct("<qdd")
+# Ключ файла (services.media), file_id
+MEDIA_RECORD = struct.Struct("<128s192s")
+
+
+def _fits(*values_and_sizes):
+    return all(len(value) <= size for value, size in values_and_sizes)
+
+def _decode(value):
+    return value.rstrip(b"\0").decode()
+
+def write_snapshot(bot_id, path=SNAPSHOT_PATH):
+    """Записать снимок кэшей (атомарно: во временный файл, затем замена)"""
+    if not path:
+        return
+    prices = []
+    if isinstance(price_cache, MemoryPriceCache):
+        for (symbol, quote), (price, updated_at) in price_cache.items().items():
+            symbol, quote = symbol.encode(), quote.encode()
+            if _fits((symbol, 16), (quote, 8)):
+                prices.append(PRICE_RECORD.pack(symbol, quote, price, updated_at))
+    subscribers = [
+        SUBSCRIBER_RECORD.pack(user_id, end, checked_at)
+        for user_id, (end, checked_at) in get_active_subscribers().items()
+    ]
+    files = []
+    for key, file_id in media.file_ids.items():
+        key, file_id = key.encode(), file_id.encode()
+        if _fits((key, 128), (file_id, 192)):
+            files.append(MEDIA_RECORD.pack(key, file_id))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, time.time(), bot_id, len(prices), len(subscribers), len(files)))
+        f.write(b"".join(prices + subscribers + files))
+    os.replace(tmp_path, path)
+    logger.info(f"Снимок кэшей записан: цен {len(prices)}, подписок {len(subscribers)}, файлов {len(files)}")
+
+def load_snapshot(bot_id, path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE):
+    """Загрузить снимок кэшей, если он есть, записан этим ботом и не старше max_age секунд"""
+    if not path or not os.path.exists(path) or os.path.getsize(path) < SNAPSHOT_HEADER.size:
+        return False
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, created_at, snapshot_bot_id, price_count, subscriber_count, file_count = SNAPSHOT_HEADER.unpack_from(data)
+        size = (SNAPSHOT_HEADER.size + price_count * PRICE_RECORD.size
+                + subscriber_count * SUBSCRIBER_RECORD.size + file_count * MEDIA_RECORD.size)
+        if magic != SNAPSHOT_MAGIC or len(data) != size:
+            logger.warning(f"Снимок кэшей {path} поврежден или другой версии - пропущен")
+            return False
+        age = time.time() - created_at
+        if age > max_age or snapshot_bot_id != bot_id:
+            logger.info(f"Снимок кэшей {path} пропущен: возраст {age:.0f} с, бот {snapshot_bot_id}")
+            return False
+
+        offset = SNAPSHOT_HEADER.size
+        prices = {}
+        for _ in range(price_count):
+            symbol, quote, price, updated_at = PRICE_RECORD.unpack_from(data, offset)
+            prices[(_decode(symbol), _decode(quote))] = (price, updated_at)
+            offset += PRICE_RECORD.size
+        subscribers = {}
+        for _ in range(subscriber_count):
+            user_id, end, checked_at = SUBSCRIBER_RECORD.unpack_from(data, offset)
+            subscribers[user_id] = (end, checked_at)
+            offset += SUBSCRIBER_RECORD.size
+        for _ in range(file_count):
+            key, file_id = MEDIA_RECORD.unpack_from(data, offset)
+            media.file_ids.setdefault(_decode(key), _decode(file_id))
+            offset += MEDIA_RECORD.size
+
+    if isinstance(price_cache, MemoryPriceCache):
+        price_cache.restore(prices)
+    restore_active_subscribers(subscribers)
+    logger.info(f"Загружен снимок кэшей ({age:.0f} с): цен {price_count}, подписок {subscriber_count}, файлов {file_count}")
+    return True
@@ -0,0 +1,150 @@
+# services/storage.py
+#
+# Общее состояние реплик: хранилище FSM и кэш последних цен.
+# STATE_BACKEND=memory - в памяти процесса (одна реплика, по умолчанию),
+# sqlite - в общей БД, redis - в Redis (REDIS_URL). Клиент Redis можно
+# подменить локальным сервером или fakeredis, передав его в конструктор.
+
+import time
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from config import STATE_BACKEND, REDIS_URL, PRICE_CACHE_TTL
+from database import (
+    get_fsm_record, set_fsm_state, set_fsm_data,
+    get_cached_prices, set_cached_prices
+)
+from utils.logger import get_logger
+
+try:
+    from redis.asyncio import Redis
+    from aiogram.fsm.storage.redis import RedisStorage
+except ImportError:  # redis не установлен: доступны только memory и sqlite
+    Redis = RedisStorage = None
+
+logger = get_logger(__name__)
+
+
+def _storage_key(key: StorageKey):
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class SqliteStorage(BaseStorage):
+    """Хранилище FSM в общей БД SQLite (запасной вариант без Redis)"""
+
+    async def set_state(self, key: StorageKey, state=None):
+        set_fsm_state(_storage_key(key), state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey):
+        return get_fsm_record(_storage_key(key))[0]
+
+    async def set_data(self, key: StorageKey, data):
+        set_fsm_data(_storage_key(key), data)
+
+    async def get_data(self, key: StorageKey):
+        return get_fsm_record(_storage_key(key))[1]
+
+    async def close(self):
+        pass
+
+
+class MemoryPriceCache:
+    """Кэш цен в памяти процесса"""
+
+    def __init__(self, ttl=PRICE_CACHE_TTL):
+        self.ttl = ttl
+        self._prices = {}  # (symbol, quote) -> (price, updated_at)
+
+    async def get_many(self, pairs):
+        deadline = time.time() - self.ttl
+        result = {}
+        for pair in pairs:
+            cached = self._prices.get(pair)
+            if cached and cached[1] >= deadline:
+                result[pair] = cached[0]
+        return result
+
+    async def set_many(self, prices):
+        now = time.time()
+        for pair, price in prices.items():
+            self._prices[pair] = (price, now)
+
+    def items(self):
+        """Все цены {(symbol, quote): (price, updated_at)} (для снимка)"""
+        return dict(self._prices)
+
+    def restore(self, prices):
+        """Загрузить цены из снимка, не затирая более свежие"""
+        for pair, (price, updated_at) in prices.items():
+            cached = self._prices.get(pair)
+            if cached is None or cached[1] < updated_at:
+                self._prices[pair] = (price, updated_at)
+
+
+class SqlitePriceCache:
+    """Кэш цен в общей БД: чтение одним запросом, запись одной транзакцией"""
+
+    def __init__(self, ttl=PRICE_CACHE_TTL):
+        self.ttl = ttl
+
+    async def get_many(self, pairs):
+        return get_cached_prices(pairs, self.ttl)
+
+    async def set_many(self, prices):
+        set_cached_prices(prices)
+
+
+class RedisPriceCache:
+    """Кэш цен в Redis: чтение одним MGET, запись одним конвейером (pipeline)"""
+
+    def __init__(self, redis, ttl=PRICE_CACHE_TTL, prefix="price"):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, pair):
+        return f"{self.prefix}:{pair[0]}:{pair[1]}"
+
+    async def get_many(self, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return {}
+        values = await self.redis.mget([self._key(pair) for pair in pairs])
+        return {pair: float(value) for pair, value in zip(pairs, values) if value is not None}
+
+    async def set_many(self, prices):
+        if not prices:
+            return
+        # Истечение ключа в Redis заменяет проверку возраста
+        pipe = self.redis.pipeline(transaction=False)
+        for pair, price in prices.items():
+            pipe.set(self._key(pair), price, ex=self.ttl)
+        await pipe.execute()
+
+
+_redis = None
+
+def _get_redis():
+    global _redis
+    if Redis is None:
+        raise ValueError("Для STATE_BACKEND=redis установите пакет redis")
+    if _redis is None:
+        _redis = Redis.from_url(REDIS_URL)
+    return _redis
+
+
+def create_fsm_storage(backend=STATE_BACKEND):
+    """Хранилище FSM для Dispatcher"""
+    if backend == "redis":
+        return RedisStorage(redis=_get_redis())
+    if backend == "sqlite":
+        return SqliteStorage()
+    return MemoryStorage()
+
+def create_price_cache(backend=STATE_BACKEND):
+    """Кэш последних цен"""
+    if backend == "redis":
+        return RedisPriceCache(_get_redis())
+    if backend == "sqlite":
+        return SqlitePriceCache()
+    return MemoryPriceCache()
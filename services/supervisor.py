@@ -0,0 +1,154 @@
+# services/supervisor.py
+#
+# Управление фоновыми задачами: у каждой задачи есть имя, политика
+# перезапуска и состояние. Остановка идет по порядку: сигнал задачам
+# завершить текущую итерацию, ожидание, отмена оставшихся, затем
+# обработчики остановки (HTTP-пул, сессия бота, хранилища).
+
+import asyncio
+import contextvars
+import time
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Политики перезапуска задачи после завершения
+RESTART_ALWAYS = "always"          # после ошибки и после обычного выхода
+RESTART_ON_FAILURE = "on-failure"  # только после ошибки
+RESTART_NEVER = "never"
+
+# Событие остановки супервизора, под которым выполняется текущая задача
+_stopping = contextvars.ContextVar("supervisor_stopping", default=None)
+
+
+async def sleep(seconds):
+    """Пауза в цикле фоновой задачи, прерываемая остановкой.
+
+    Возвращает True, если началась остановка и цикл пора завершить.
+    """
+    stopping = _stopping.get()
+    if stopping is None:
+        await asyncio.sleep(seconds)
+        return False
+    try:
+        await asyncio.wait_for(stopping.wait(), seconds)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class Job:
+    """Зарегистрированная фоновая задача и ее состояние"""
+
+    def __init__(self, name, factory, restart, max_backoff):
+        self.name = name
+        self.factory = factory
+        self.restart = restart
+        self.max_backoff = max_backoff
+        self.task = None
+        self.state = "pending"
+        self.restarts = 0
+        self.last_error = None
+        self.started_at = None
+
+    def health(self):
+        return {
+            "state": self.state,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "uptime": round(time.time() - self.started_at, 1) if self.started_at and self.state == "running" else 0,
+        }
+
+
+class TaskSupervisor:
+    """Запуск, перезапуск и упорядоченная остановка фоновых задач"""
+
+    def __init__(self, name="main"):
+        self.name = name
+        self._jobs = {}
+        self._shutdown_hooks = []
+        self._health_sources = []
+        self._stopping = asyncio.Event()
+
+    def add(self, name, factory, restart=RESTART_ALWAYS, max_backoff=60):
+        """Зарегистрировать задачу: factory() возвращает корутину задачи"""
+        job = self._jobs[name] = Job(name, factory, restart, max_backoff)
+        return job
+
+    def on_shutdown(self, callback):
+        """Вызвать callback (функцию или корутину) после остановки задач, в порядке регистрации"""
+        self._shutdown_hooks.append(callback)
+
+    def start(self):
+        for job in self._jobs.values():
+            if job.task is None:
+                job.task = asyncio.create_task(self._run(job), name=f"{self.name}:{job.name}")
+
+    async def _run(self, job):
+        _stopping.set(self._stopping)
+        backoff = 1
+        while not self._stopping.is_set():
+            job.state = "running"
+            job.started_at = time.time()
+            try:
+                await job.factory()
+                failed = False
+            except asyncio.CancelledError:
+                job.state = "stopped"
+                raise
+            except Exception as e:
+                failed = True
+                job.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"❌ Задача {job.name} упала: {job.last_error}")
+
+            if self._stopping.is_set():
+                break
+            if job.restart == RESTART_NEVER or (job.restart == RESTART_ON_FAILURE and not failed):
+                job.state = "failed" if failed else "finished"
+                return
+            # Перезапуск с экспоненциальной паузой, сброс после долгой нормальной работы
+            if time.time() - job.started_at > job.max_backoff:
+                backoff = 1
+            job.state = "restarting"
+            job.restarts += 1
+            logger.warning(f"Перезапуск задачи {job.name} через {backoff} с")
+            if await sleep(backoff):
+                break
+            backoff = min(backoff * 2, job.max_backoff)
+        job.state = "stopped"
+
+    def add_health_source(self, source):
+        """Учитывать в health() задачи, запущенные вне супервизора (source() -> {имя: состояние})"""
+        self._health_sources.append(source)
+
+    def health(self):
+        """Состояние задач: {имя: {state, restarts, last_error, uptime}}"""
+        health = {name: job.health() for name, job in self._jobs.items()}
+        for source in self._health_sources:
+            health.update(source())
+        return health
+
+    async def shutdown(self, timeout=30):
+        """Остановить задачи (дав завершить текущую итерацию) и выполнить обработчики остановки"""
+        self._stopping.set()
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        if tasks:
+            logger.info(f"Остановка задач ({self.name}): ожидание до {timeout} с")
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                logger.warning(f"Задача {task.get_name()} не завершилась вовремя, отмена")
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for callback in self._shutdown_hooks:
+            try:
+                result = callback()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"❌ Ошибка при остановке ({self.name}): {e}")
+        logger.info(f"Задачи остановлены ({self.name})")
+
+
+# Общий супервизор процесса
+supervisor = TaskSupervisor()
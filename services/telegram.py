@@ -0,0 +1,27 @@
+# services/telegram.py
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.enums import ParseMode
+from config import TELEGRAM_TOKEN, TELEGRAM_API_URL, TELEGRAM_TIMEOUT
+from middlewares.telegram_metrics import TelegramMetricsMiddleware
+from services.chaos import setup_bot_chaos
+
+
+def create_bot():
+    """Клиент Bot API (общий для процесса бота и воркера)"""
+    # Свой адрес Bot API - локальный сервер или тестовая заглушка
+    api = TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION
+    session = AiohttpSession(api=api, timeout=TELEGRAM_TIMEOUT)
+
+    bot = Bot(
+        token=TELEGRAM_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    bot.session.middleware(TelegramMetricsMiddleware())
+    # Отказы Bot API для экспериментов (CHAOS_CONFIG) - после метрик, чтобы они их учитывали
+    setup_bot_chaos(bot)
+    return bot
@@ -0,0 +1,65 @@
+# services/telegram_webhook.py
+
+import asyncio
+import signal
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import (
+    TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT, TELEGRAM_SHUTDOWN_TIMEOUT,
+    UPDATE_CONCURRENCY_LIMIT
+)
+from middlewares.concurrency import ConcurrencyLimitMiddleware
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def create_telegram_app(bot: Bot, dp: Dispatcher):
+    """Приложение aiohttp, принимающее обновления Telegram по вебхуку"""
+    app = web.Application()
+    # Проверка заголовка X-Telegram-Bot-Api-Secret-Token выполняется aiogram
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=TELEGRAM_WEBHOOK_SECRET or None
+    ).register(app, path=TELEGRAM_WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(bot: Bot, dp: Dispatcher, limiter: ConcurrencyLimitMiddleware):
+    """Режим вебхука: сервер обновлений до SIGTERM/SIGINT с мягкой остановкой"""
+    runner = web.AppRunner(create_telegram_app(bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Вебхук Telegram слушает {TELEGRAM_WEBHOOK_HOST}:{TELEGRAM_WEBHOOK_PORT}{TELEGRAM_WEBHOOK_PATH}")
+
+    # Регистрация вебхука идемпотентна, реплики за балансировщиком могут делать ее одновременно.
+    # Без TELEGRAM_WEBHOOK_URL вебхук регистрируется вручную (или не нужен при локальной проверке)
+    if TELEGRAM_WEBHOOK_URL:
+        await bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET or None,
+            max_connections=UPDATE_CONCURRENCY_LIMIT,
+            allowed_updates=dp.resolve_used_update_types()
+        )
+        logger.info("Вебхук Telegram зарегистрирован")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        # Сначала перестаем принимать запросы, затем дожидаемся обновлений в работе.
+        # Вебхук не удаляется: остальные реплики продолжают принимать обновления
+        logger.info("Остановка вебхука Telegram...")
+        await site.stop()
+        await limiter.wait_idle(TELEGRAM_SHUTDOWN_TIMEOUT)
+        await runner.cleanup()
+        logger.info("Вебхук Telegram остановлен")
@@ -0,0 +1,176 @@
+# tools/fake_bot_api.py
+#
+# Заглушка Telegram Bot API для локальной проверки режима вебхука.
+#
+# 1. Запустить заглушку:
+#      python tools/fake_bot_api.py serve --port 8090
+# 2. Запустить бота против нее:
+#      BOT_MODE=webhook TELEGRAM_API_URL=http://127.0.0.1:8090 python bot.py
+# 3. Отправить боту обновления (как это делает Telegram):
+#      python tools/fake_bot_api.py push --text /start --count 50 --concurrency 20
+#
+# Заглушка отвечает на любой метод Bot API и печатает вызовы бота. Для нагрузочного
+# теста она может добавлять задержку (--latency-ms) и отвечать 429 на долю
+# отправок (--rate-429); счетчики вызовов - GET /stats.
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (  # noqa: E402
+    TELEGRAM_WEBHOOK_PORT, TELEGRAM_WEBHOOK_PATH, TELEGRAM_WEBHOOK_SECRET
+)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+_message_ids = itertools.count(1)
+
+
+def fake_message(chat_id, text=None):
+    """Сообщение в формате Bot API для ответов на send*/edit*"""
+    message = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": int(chat_id or 0), "type": "private"},
+        "from": BOT_USER,
+    }
+    if text:
+        message["text"] = text
+    return message
+
+
+def fake_result(method, params):
+    """Минимальный корректный результат для метода Bot API"""
+    method = method.lower()
+    if method == "getme":
+        return BOT_USER
+    if method == "getupdates":
+        return []
+    if method == "getwebhookinfo":
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+    if method.startswith("send") or (method.startswith("edit") and params.get("chat_id")):
+        return fake_message(params.get("chat_id"), params.get("text") or params.get("caption"))
+    return True
+
+
+class BotApiStub:
+    """Поведение заглушки: задержка, доля ответов 429 и счетчики вызовов по методам"""
+
+    def __init__(self, latency=0.0, rate_429=0.0, retry_after=1, verbose=True, seed=42):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.verbose = verbose
+        self.calls = Counter()
+        self.throttled = Counter()
+        # Время (perf_counter) первого запроса по методам - для замера старта бота
+        self.first_seen = {}
+        self._random = random.Random(seed)
+
+    async def handle(self, request: web.Request):
+        method = request.match_info["method"]
+        self.first_seen.setdefault(method, time.perf_counter())
+        params = dict(await request.post())
+        if self.verbose:
+            print(f"{time.strftime('%H:%M:%S')} {method} {json.dumps(params, ensure_ascii=False, default=str)[:200]}")
+        if method.lower() == "getupdates":
+            # Имитация long polling без обновлений
+            await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+        elif self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.lower().startswith("send") and self._random.random() < self.rate_429:
+            self.throttled[method] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        self.calls[method] += 1
+        return web.json_response({"ok": True, "result": fake_result(method, params)})
+
+    async def stats(self, request: web.Request):
+        return web.json_response({"calls": self.calls, "throttled": self.throttled})
+
+
+def create_app(stub):
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", stub.handle)
+    app.router.add_get("/stats", stub.stats)
+    return app
+
+
+def build_update(update_id, user_id, text):
+    """Обновление с текстовым сообщением от пользователя"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def push(url, secret, text, count, concurrency, user_id):
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    statuses = {}
+
+    async with aiohttp.ClientSession() as session:
+        async def send(i):
+            async with semaphore:
+                update = build_update(int(time.time() * 1000) + i, user_id + i, text)
+                async with session.post(url, json=update, headers=headers) as resp:
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(count)))
+        elapsed = time.perf_counter() - started
+
+    print(f"Отправлено {count} обновлений за {elapsed:.2f} с, ответы: {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Запустить заглушку Bot API")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8090)
+    serve_parser.add_argument("--latency-ms", type=float, default=0, help="задержка ответа на каждый метод")
+    serve_parser.add_argument("--rate-429", type=float, default=0, help="доля отправок с ответом 429 (0..1)")
+    serve_parser.add_argument("--retry-after", type=int, default=1)
+    serve_parser.add_argument("--quiet", action="store_true", help="не печатать вызовы")
+
+    push_parser = commands.add_parser("push", help="Отправить обновления на вебхук бота")
+    push_parser.add_argument("--url", default=f"http://127.0.0.1:{TELEGRAM_WEBHOOK_PORT}{TELEGRAM_WEBHOOK_PATH}")
+    push_parser.add_argument("--secret", default=TELEGRAM_WEBHOOK_SECRET)
+    push_parser.add_argument("--text", default="/start")
+    push_parser.add_argument("--count", type=int, default=1)
+    push_parser.add_argument("--concurrency", type=int, default=10)
+    push_parser.add_argument("--user-id", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        stub = BotApiStub(args.latency_ms / 1000, args.rate_429, args.retry_after, verbose=not args.quiet)
+        web.run_app(create_app(stub), host=args.host, port=args.port)
+    else:
+        asyncio.run(push(args.url, args.secret, args.text, args.count, args.concurrency, args.user_id))
+
+
+if __name__ == "__main__":
+    main()
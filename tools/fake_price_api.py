@@ -0,0 +1,103 @@
+# tools/fake_price_api.py
+#
+# Заглушка API CryptoCompare со сценарием движения цен (для нагрузочного теста).
+#
+#   python tools/fake_price_api.py --port 8091 --script spike
+#   CRYPTOCOMPARE_API_URL=http://127.0.0.1:8091/data python worker.py
+#
+# Каждый запрос pricemulti - следующий шаг сценария (один тик бота). Запросы
+# price и pricemultifull отдают текущие цены без сдвига.
+#   random - случайное блуждание (σ = 0.5% за шаг)
+#   trend  - рост на 0.3% за шаг
+#   spike  - как random, но каждый 10-й шаг скачок на ±5% (массовые уведомления)
+
+import argparse
+import random
+
+from aiohttp import web
+
+SCRIPTS = ("random", "trend", "spike")
+START_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "BNB": 550.0, "SOL": 150.0, "XRP": 0.5}
+# Курс котировки к USD
+QUOTE_RATES = {"USD": 1.0, "USDT": 1.0, "EUR": 0.92, "RUB": 90.0}
+
+
+class PricePaths:
+    """Цены валют по шагам сценария"""
+
+    def __init__(self, script="random", seed=42):
+        if script not in SCRIPTS:
+            raise ValueError(f"Неизвестный сценарий: {script}")
+        self.script = script
+        self.step_count = 0
+        self.prices = dict(START_PRICES)
+        self._random = random.Random(seed)
+
+    def price(self, symbol, quote="USD"):
+        # Неизвестные валюты получают стабильную цену от имени
+        usd = self.prices.setdefault(symbol, float(sum(map(ord, symbol))))
+        return usd * QUOTE_RATES.get(quote, 1.0)
+
+    def step(self):
+        self.step_count += 1
+        for symbol, price in self.prices.items():
+            if self.script == "trend":
+                change = 0.003
+            elif self.script == "spike" and self.step_count % 10 == 0:
+                change = self._random.choice((-0.05, 0.05))
+            else:
+                change = self._random.gauss(0, 0.005)
+            self.prices[symbol] = price * (1 + change)
+
+
+def _split(value):
+    return [item for item in (value or "").split(",") if item]
+
+
+def create_app(paths):
+    """Приложение aiohttp с методами price, pricemulti и pricemultifull"""
+
+    async def price(request):
+        symbol = request.query.get("fsym", "")
+        return web.json_response({quote: paths.price(symbol, quote) for quote in _split(request.query.get("tsyms"))})
+
+    async def pricemulti(request):
+        paths.step()
+        quotes = _split(request.query.get("tsyms"))
+        return web.json_response({
+            symbol: {quote: paths.price(symbol, quote) for quote in quotes}
+            for symbol in _split(request.query.get("fsyms"))
+        })
+
+    async def pricemultifull(request):
+        quotes = _split(request.query.get("tsyms"))
+        raw = {}
+        for symbol in _split(request.query.get("fsyms")):
+            raw[symbol] = {}
+            for quote in quotes:
+                current = paths.price(symbol, quote)
+                raw[symbol][quote] = {
+                    "PRICE": current, "CHANGEPCT24HOUR": 0.0,
+                    "HIGH24HOUR": current * 1.02, "LOW24HOUR": current * 0.98,
+                }
+        return web.json_response({"RAW": raw})
+
+    app = web.Application()
+    app.router.add_get("/data/price", price)
+    app.router.add_get("/data/pricemulti", pricemulti)
+    app.router.add_get("/data/pricemultifull", pricemultifull)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка API CryptoCompare")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--script", choices=SCRIPTS, default="random")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    web.run_app(create_app(PricePaths(args.script, args.seed)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
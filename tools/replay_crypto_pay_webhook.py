@@ -0,0 +1,81 @@
+# tools/replay_crypto_pay_webhook.py
+#
+# Локальная проверка вебхука Crypto Pay: подписывает и отправляет
+# обновление invoice_paid на запущенный бот.
+#
+# Примеры:
+#   python tools/replay_crypto_pay_webhook.py --invoice-id 123
+#   python tools/replay_crypto_pay_webhook.py --payload saved_update.json --repeat 3
+#   python tools/replay_crypto_pay_webhook.py --invoice-id 123 --bad-signature
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.payment_webhook import sign_body, SIGNATURE_HEADER  # noqa: E402
+from config import (  # noqa: E402
+    CRYPTO_BOT_TOKEN, CRYPTO_PAY_WEBHOOK_PORT, CRYPTO_PAY_WEBHOOK_PATH
+)
+
+
+def build_update(invoice_id, amount, asset):
+    """Обновление invoice_paid в формате Crypto Pay"""
+    now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+    return {
+        "update_id": int(time.time()),
+        "update_type": "invoice_paid",
+        "request_date": now,
+        "payload": {
+            "invoice_id": invoice_id,
+            "status": "paid",
+            "asset": asset,
+            "amount": str(amount),
+            "paid_at": now,
+        },
+    }
+
+
+async def replay(url, body, signature, repeat):
+    async with aiohttp.ClientSession() as session:
+        for attempt in range(1, repeat + 1):
+            async with session.post(
+                url, data=body,
+                headers={SIGNATURE_HEADER: signature, "Content-Type": "application/json"},
+            ) as resp:
+                print(f"[{attempt}] HTTP {resp.status}: {await resp.text()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повтор подписанного вебхука Crypto Pay")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{CRYPTO_PAY_WEBHOOK_PORT or 8081}{CRYPTO_PAY_WEBHOOK_PATH}")
+    parser.add_argument("--payload", help="JSON-файл с готовым обновлением")
+    parser.add_argument("--invoice-id", type=int, help="ID инвойса для синтетического invoice_paid")
+    parser.add_argument("--amount", default="1.0")
+    parser.add_argument("--asset", default="USDT")
+    parser.add_argument("--repeat", type=int, default=1, help="Сколько раз отправить (проверка идемпотентности)")
+    parser.add_argument("--bad-signature", action="store_true", help="Отправить с неверной подписью")
+    args = parser.parse_args()
+
+    if args.payload:
+        with open(args.payload, "rb") as f:
+            body = f.read()
+    elif args.invoice_id is not None:
+        body = json.dumps(build_update(args.invoice_id, args.amount, args.asset)).encode()
+    else:
+        parser.error("нужен --payload или --invoice-id")
+
+    if not CRYPTO_BOT_TOKEN:
+        parser.error("CRYPTO_BOT_TOKEN не задан")
+    signature = "0" * 64 if args.bad_signature else sign_body(body, CRYPTO_BOT_TOKEN)
+    asyncio.run(replay(args.url, body, signature, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
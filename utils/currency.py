@@ -0,0 +1,17 @@
+# utils/currency.py
+
+# Поддерживаемые валюты котировки
+QUOTE_CURRENCIES = ('USD', 'EUR', 'RUB', 'USDT')
+DEFAULT_QUOTE = 'USD'
+
+# Знак валюты перед суммой
+_PREFIX_SIGNS = {'USD': '$', 'EUR': '€'}
+# Знак валюты после суммы
+_SUFFIX_SIGNS = {'RUB': '₽', 'USDT': 'USDT'}
+
+
+def format_price(value, quote=DEFAULT_QUOTE):
+    """Цена с символом валюты котировки: $1.00, €1.00, 1.00 ₽, 1.00 USDT"""
+    if quote in _PREFIX_SIGNS:
+        return f"{_PREFIX_SIGNS[quote]}{value:.2f}"
+    return f"{value:.2f} {_SUFFIX_SIGNS.get(quote, quote)}"
@@ -1,21 +1,128 @@
 # utils/logger.py
+#
+# Записи из event loop только кладутся в очередь (QueueHandler), а в файл
+# и stderr их пишет отдельный поток (QueueListener): медленный диск не
+# задерживает тик и обработчики. Файл лога открывается при первой записи,
+# импорт модуля не трогает файловую систему.
 
+import atexit
+import json
 import logging
+import multiprocessing
 import os
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_LEVEL, LOG_FORMAT, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE
 
-if not os.path.exists("logs"):
-    os.makedirs("logs")
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.FileHandler("logs/bot.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+
+class JsonFormatter(logging.Formatter):
+    """Запись в одну строку JSON (для сборщиков логов)"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Очередь записей без блокировки: при переполнении запись отбрасывается"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogSampler:
+    """Ограничение частоты однотипных сообщений горячего пути (строки на пользователя за тик)
+
+    allow(key) разрешает не больше одного сообщения с ключом key за interval
+    секунд. Проверка делается до форматирования, поэтому пропущенные
+    сообщения ничего не стоят.
+    """
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self._last = {}
+
+    def allow(self, key=""):
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[key] = now
+        return True
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """Файл с ротацией, который создается при первой записи (в потоке QueueListener), а не при импорте"""
+
+    def __init__(self, path, max_bytes, backup_count):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+def process_log_path(path):
+    """Свой файл для процесса: RotatingFileHandler ротирует файл безопасно только в одном процессе
+
+    Роль процесса - имя процесса multiprocessing (shard-0) или запущенного скрипта (worker):
+    logs/bot.log -> logs/bot.log у бота, logs/bot-worker.log у воркера, logs/bot-shard-0.log у шарда.
+    """
+    role = multiprocessing.current_process().name
+    if role == "MainProcess":
+        role = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "main"
+    stem, ext = os.path.splitext(path)
+    if os.path.basename(stem) == role:
+        return path
+    return f"{stem}-{role}{ext}"
+
+def _queue_handler(*handlers):
+    """Обработчик-очередь, записи из которой пишет в handlers отдельный поток"""
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Дописать оставшиеся в очереди записи при выходе
+    atexit.register(listener.stop)
+    return DroppingQueueHandler(log_queue)
+
+def _setup():
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(LazyRotatingFileHandler(process_log_path(LOG_FILE), LOG_MAX_BYTES, LOG_BACKUP_COUNT))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler(*handlers))
+
+_setup()
 
 def get_logger(name):
     logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    return logger
+
+def get_file_logger(name, path, max_bytes, backup_count=3):
+    """Отдельный журнал в свой файл с ротацией (сообщения без префикса, мимо общего лога)"""
+    logger = logging.getLogger(name)
+    logger.propagate = False
     logger.setLevel(logging.INFO)
+    logger.addHandler(_queue_handler(LazyRotatingFileHandler(path, max_bytes, backup_count)))
     return logger
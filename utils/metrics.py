@@ -0,0 +1,171 @@
+# utils/metrics.py
+#
+# Метрики в формате Prometheus без внешних зависимостей. Запись - словарь
+# по кортежу значений меток, без блокировок (один event loop на процесс),
+# поэтому ее можно вызывать на горячем пути.
+
+from bisect import bisect_left
+
+# Все метрики процесса в порядке объявления
+REGISTRY = []
+
+# Границы гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def samples(self):
+        return []
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Счетчик, который только растет"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, *labels, value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def series(self):
+        """{кортеж меток: значение}"""
+        return dict(self._values)
+
+    def samples(self):
+        return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Текущее значение; с callback значение вычисляется при чтении метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+        self.callback = callback
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+    def samples(self):
+        values = self._values
+        if self.callback is not None:
+            # callback возвращает число (без меток) или {кортеж меток: число}
+            try:
+                result = self.callback()
+            except Exception:
+                # Недоступный источник (например, БД) не должен ломать остальные метрики
+                return []
+            values = result if isinstance(result, dict) else {(): result}
+        return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # метки -> [счетчики корзин (+Inf последняя), сумма, количество]
+
+    def observe(self, *labels, value):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def series(self):
+        """{кортеж меток: (количество, сумма)}"""
+        return {key: (state[2], state[1]) for key, state in self._values.items()}
+
+    def quantile(self, q, *labels):
+        """Оценка квантиля q: верхняя граница корзины, в которую он попал"""
+        state = self._values.get(labels)
+        if state is None:
+            return None
+        rank = q * state[2]
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), state[0]):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+
+    def samples(self):
+        lines = []
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def render_metrics():
+    """Все метрики в текстовом формате Prometheus"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Метрики бота
+PRICE_TICK_SECONDS = Histogram(
+    "price_tick_seconds", "Длительность тика проверки цен",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 180)
+)
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "upstream_request_seconds", "Задержка запросов к внешним API", ("provider", "endpoint")
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total", "Запросы к внешним API по статусу ответа", ("provider", "endpoint", "status")
+)
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    "telegram_request_seconds", "Задержка запросов к Bot API", ("method",)
+)
+TELEGRAM_REQUESTS = Counter(
+    "telegram_requests_total", "Запросы к Bot API по результату (ok, error, retry_after)", ("method", "result")
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Время работы функций database.py с БД", ("function",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+HANDLER_SECONDS = Histogram(
+    "handler_seconds", "Время обработки обновления по обработчикам", ("handler",)
+)
+HANDLER_SPAN_SECONDS = Histogram(
+    "handler_span_seconds", "Время обработки обновления в БД, HTTP и Bot API", ("handler", "kind")
+)
+CHAOS_FAULTS = Counter(
+    "chaos_faults_total", "Отказы, внесенные слоем CHAOS_CONFIG", ("provider", "fault")
+)
@@ -0,0 +1,62 @@
+# utils/tracing.py
+#
+# Легкая трассировка обработки обновления: трасса живет в ContextVar,
+# а замеры БД, HTTP и Bot API (database._connect, services.http,
+# middlewares.telegram_metrics) добавляют в нее свои интервалы.
+# Вне обработки обновления (фоновые задачи) трассы нет и запись ничего не стоит.
+
+import contextvars
+import time
+
+_current = contextvars.ContextVar("trace", default=None)
+
+# Сколько отдельных интервалов хранить в трассе (рассылка дает тысячи отправок)
+MAX_SPANS = 100
+
+
+class Trace:
+    """Трасса одного обновления: обработчик, общее время и интервалы по видам"""
+
+    def __init__(self, update_id):
+        self.update_id = update_id
+        self.handler = "unhandled"
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        self.totals = {}   # вид (db, http, telegram) -> суммарное время
+        self.spans = []    # (вид, имя, время) в порядке завершения
+
+    def add(self, kind, name, seconds):
+        self.totals[kind] = self.totals.get(kind, 0.0) + seconds
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((kind, name, seconds))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started_at
+        return self.duration
+
+    def to_dict(self):
+        return {
+            "update_id": self.update_id,
+            "handler": self.handler,
+            "duration": round(self.duration, 4),
+            "totals": {kind: round(seconds, 4) for kind, seconds in self.totals.items()},
+            "spans": [[kind, name, round(seconds, 4)] for kind, name, seconds in self.spans],
+        }
+
+
+def start_trace(update_id):
+    """Начать трассу в текущем контексте, вернуть (трасса, токен для end_trace)"""
+    trace = Trace(update_id)
+    return trace, _current.set(trace)
+
+def end_trace(token):
+    _current.reset(token)
+
+def current_trace():
+    return _current.get()
+
+def add_span(kind, name, seconds):
+    """Записать интервал в текущую трассу (если она есть)"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(kind, name, seconds)
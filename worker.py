@@ -0,0 +1,53 @@
+# worker.py
+#
+# Процесс фоновых задач: опрос цен, проверка условий и отправка уведомлений,
+# ежедневные сводки, сверка и очистка инвойсов. Обновления Telegram обрабатывает
+# bot.py, запущенный с RUN_BACKGROUND_TASKS=0. Процессы делят БД SQLite,
+# об изменениях в кэшах воркер узнает через Unix-сокет WORKER_SOCKET_PATH.
+
+import asyncio
+import signal
+import sys
+from config import WORKER_SOCKET_PATH, BACKGROUND_SHUTDOWN_TIMEOUT, METRICS_PORT
+from database import init_db
+from services.background import start_background_tasks
+from services.events import start_event_server
+from services.http import close_session
+from services.monitoring import start_metrics_server
+from services.supervisor import supervisor
+from services.telegram import create_bot
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+async def main():
+    try:
+        init_db()
+        bot = create_bot()
+        
+        server = await start_event_server(WORKER_SOCKET_PATH)
+        await start_background_tasks(bot)
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server()
+            supervisor.on_shutdown(metrics_runner.cleanup)
+        logger.info("Воркер запущен")
+        
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        
+        logger.info("Остановка воркера...")
+        # Сначала перестаем принимать события, затем останавливаем задачи и закрываем соединения
+        server.close()
+        supervisor.on_shutdown(close_session)
+        supervisor.on_shutdown(bot.session.close)
+        await supervisor.shutdown(BACKGROUND_SHUTDOWN_TIMEOUT)
+        
+    except Exception as e:
+        logger.error(f"Критическая ошибка воркера: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())